@@ -210,6 +210,23 @@ class TestLogFilter(unittest.TestCase):
 
         self.assertEqual(expected_matched_lines, matched_lines)
 
+    def test_field_filter_does_not_format_log(self) -> None:
+        """Test filtering on a metadata field doesn't format a lazy log."""
+        logs = self._create_logs([
+            ('planet', dict(extra_metadata_fields={'planet': 'Jupiter'})),
+        ])
+        record = logs.records[0]
+        log = LogLine(record, formatter=lambda record: record.getMessage())
+        log.update_metadata()
+
+        log_filter = LogFilter(regex=re.compile('Jup'), field='planet')
+        self.assertTrue(log_filter.matches(log))
+        self.assertFalse(log.is_formatted())
+
+        log_filter = LogFilter(regex=re.compile('planet'))
+        self.assertTrue(log_filter.matches(log))
+        self.assertTrue(log.is_formatted())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,104 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for pw_console.log_search"""
+
+import logging
+import re
+import sys
+import unittest
+from typing import List
+from unittest.mock import MagicMock
+
+from pw_console.log_filter import LogFilter
+from pw_console.log_line import LogLine
+from pw_console.log_search import LogSearch
+
+_PYTHON_3_8 = sys.version_info >= (
+    3,
+    8,
+)
+
+
+def _create_logs(messages: List[str]) -> List[LogLine]:
+    logs = []
+    for message in messages:
+        record = logging.makeLogRecord(
+            dict(name='log_search.test', levelname='DEBUG', msg=message))
+        record.message = record.getMessage()
+        logs.append(LogLine(record, message, message))
+    return logs
+
+
+if _PYTHON_3_8:
+    from unittest import IsolatedAsyncioTestCase  # type: ignore # pylint: disable=no-name-in-module
+
+    class TestLogSearch(IsolatedAsyncioTestCase):  # pylint: disable=undefined-variable
+        """Tests for LogSearch."""
+        async def _batches(self, search: LogSearch) -> List[List[int]]:
+            return [batch async for batch in search.matches()]
+
+        async def test_batches_from_newest_to_oldest(self) -> None:
+            logs = _create_logs([f'Log {i}' for i in range(10)])
+            search = LogSearch(logs, [LogFilter(re.compile(r'[02468]$'))],
+                               batch_size=3)
+
+            self.assertEqual([[8], [4, 6], [2], [0]], await
+                             self._batches(search))
+
+        async def test_all_filters_must_match(self) -> None:
+            logs = _create_logs(
+                ['Log some item', 'Log another item', 'Some exception'])
+            search = LogSearch(logs, [
+                LogFilter(re.compile('item')),
+                LogFilter(re.compile('another'), invert=True),
+            ])
+
+            self.assertEqual([[0]], await self._batches(search))
+
+        async def test_start_and_stop(self) -> None:
+            logs = _create_logs([f'Log {i}' for i in range(10)])
+            search = LogSearch(logs, [LogFilter(re.compile('Log'))],
+                               start=2,
+                               stop=5,
+                               batch_size=2)
+
+            self.assertEqual([[3, 4], [2]], await self._batches(search))
+
+        async def test_logs_are_copied(self) -> None:
+            logs = _create_logs(['a', 'b'])
+            search = LogSearch(logs, [LogFilter(re.compile('.'))])
+            logs.clear()
+
+            self.assertEqual([[0, 1]], await self._batches(search))
+            self.assertEqual(['a', 'b'],
+                             [log.ansi_stripped_log for log in search.logs])
+
+        async def test_cancel(self) -> None:
+            logs = _create_logs(['a', 'b'])
+            search = LogSearch(logs, [LogFilter(re.compile('.'))])
+            search.cancel()
+
+            self.assertEqual([], await self._batches(search))
+
+        async def test_error_is_raised(self) -> None:
+            regex = MagicMock()
+            regex.search.side_effect = ValueError('bad filter')
+            search = LogSearch(_create_logs(['a']), [LogFilter(regex)])
+
+            with self.assertRaisesRegex(ValueError, 'bad filter'):
+                await self._batches(search)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,17 +13,31 @@
 # the License.
 """Tests for pw_console.log_store"""
 
+import asyncio
 import logging
+import sys
+import threading
+from typing import List
 import unittest
+from unittest import mock
 from unittest.mock import MagicMock
 
+from pw_console.log_line import LogLine
 from pw_console.log_store import LogStore
 from pw_console.console_prefs import ConsolePrefs
+import pw_console.text_formatting
 
+_PYTHON_3_8 = sys.version_info >= (
+    3,
+    8,
+)
 
-def _create_log_store():
-    log_store = LogStore(prefs=ConsolePrefs(
-        project_file=False, project_user_file=False, user_file=False))
+
+def _create_log_store(lazy_formatting: bool = False):
+    log_store = LogStore(prefs=ConsolePrefs(project_file=False,
+                                            project_user_file=False,
+                                            user_file=False),
+                         lazy_formatting=lazy_formatting)
 
     assert not log_store.table.prefs.show_python_file
     viewer = MagicMock()
@@ -59,6 +73,40 @@ class TestLogStore(unittest.TestCase):
         log_store.clear_logs()
         self.assertEqual(0, log_store.get_total_count())
 
+    def test_max_history_size(self) -> None:
+        log_store, _viewer = _create_log_store()
+        log_store.max_history_size = 3
+        test_log = logging.getLogger('log_store.test')
+        with self.assertLogs(test_log, level='DEBUG') as _log_context:
+            test_log.addHandler(log_store)
+            for i in range(3):
+                test_log.debug('Test log %s', i)
+
+        full_byte_size = log_store.byte_size
+        self.assertGreater(full_byte_size, 0)
+
+        with self.assertLogs(test_log, level='DEBUG') as _log_context:
+            test_log.addHandler(log_store)
+            for i in range(3, 5):
+                test_log.debug('Test log %s', i)
+
+        # The oldest logs are removed, but absolute indices keep counting.
+        self.assertEqual(3, log_store.get_total_count())
+        self.assertEqual(['Test log 2', 'Test log 3', 'Test log 4'],
+                         [log.record.message for log in log_store.logs])
+        self.assertEqual(2, log_store.logs.first_index)
+        self.assertEqual('Test log 4', log_store.logs.get(4).record.message)
+        self.assertEqual(full_byte_size, log_store.byte_size)
+
+        log_store.max_history_size = 1
+        self.assertEqual(['Test log 4'],
+                         [log.record.message for log in log_store.logs])
+        self.assertEqual(full_byte_size // 3, log_store.byte_size)
+
+        log_store.clear_logs()
+        self.assertEqual(0, log_store.byte_size)
+        self.assertEqual(5, log_store.logs.first_index)
+
     def test_channel_counts_and_prefix_width(self) -> None:
         """Test logger names and prefix width calculations."""
         log_store, _viewer = _create_log_store()
@@ -130,6 +178,154 @@ class TestLogStore(unittest.TestCase):
             log_store.render_table_header(),
         )
 
+    def test_lazy_formatting(self) -> None:
+        eager_log_store, _viewer = _create_log_store()
+        lazy_log_store, _viewer = _create_log_store(lazy_formatting=True)
+        test_log = logging.getLogger('log_store.test')
+
+        with self.assertLogs(test_log, level='DEBUG') as _log_context:
+            test_log.addHandler(eager_log_store)
+            test_log.addHandler(lazy_log_store)
+            test_log.info('Test log %s', 1)
+            test_log.warning('■msg♦Tokenized message■module♦MOD1■file♦a.cc')
+            test_log.debug('Test log %s',
+                           2,
+                           extra=dict(extra_metadata_fields={
+                               'planet': 'Jupiter',
+                           }))
+            test_log.removeHandler(eager_log_store)
+            test_log.removeHandler(lazy_log_store)
+
+        # Metadata is parsed when the logs arrive, but they are not formatted.
+        self.assertFalse(any(log.is_formatted()
+                             for log in lazy_log_store.logs))
+        self.assertEqual(
+            [log.metadata.fields for log in eager_log_store.logs],
+            [log.metadata.fields for log in lazy_log_store.logs],
+        )
+        self.assertEqual(eager_log_store.render_table_header(),
+                         lazy_log_store.render_table_header())
+        self.assertEqual(eager_log_store.byte_size, lazy_log_store.byte_size)
+
+        for eager_log, lazy_log in zip(eager_log_store.logs,
+                                       lazy_log_store.logs):
+            self.assertEqual(eager_log.ansi_stripped_log,
+                             lazy_log.ansi_stripped_log)
+            self.assertTrue(lazy_log.is_formatted())
+            self.assertEqual(eager_log.formatted_log, lazy_log.formatted_log)
+            self.assertEqual(eager_log.get_fragments(),
+                             lazy_log.get_fragments())
+
+        # Sizes don't change when lazy logs are formatted.
+        lazy_log_store.max_history_size = 2
+        eager_log_store.max_history_size = 2
+        self.assertEqual(eager_log_store.byte_size, lazy_log_store.byte_size)
+
+    def test_lazy_formatting_table_row(self) -> None:
+        eager_log_store, _viewer = _create_log_store()
+        lazy_log_store, _viewer = _create_log_store(lazy_formatting=True)
+        test_log = logging.getLogger('log_store.test')
+
+        with self.assertLogs(test_log, level='DEBUG') as _log_context:
+            test_log.addHandler(eager_log_store)
+            test_log.addHandler(lazy_log_store)
+            test_log.info('■msg♦Tokenized message■module♦MOD1')
+            test_log.removeHandler(eager_log_store)
+            test_log.removeHandler(lazy_log_store)
+
+        self.assertEqual(
+            eager_log_store.table.formatted_row(eager_log_store.logs[0]),
+            lazy_log_store.table.formatted_row(lazy_log_store.logs[0]))
+
+    def test_lazy_formatting_read_while_formatting(self) -> None:
+        """Test reading a line while another thread formats it."""
+        log = LogLine(record=logging.makeLogRecord({'msg': 'Hello'}),
+                      formatter=lambda record: f'\x1b[1m{record.msg}\x1b[0m')
+        strip_ansi = pw_console.text_formatting.strip_ansi
+        read_while_formatting: List[str] = []
+        reading = threading.Event()
+
+        def read_line_and_strip_ansi(text: str) -> str:
+            # Read the line between formatting and stripping the text, as
+            # another thread could.
+            if not reading.is_set():
+                reading.set()
+                read_while_formatting.append(log.formatted_log)
+            return strip_ansi(text)
+
+        with mock.patch('pw_console.text_formatting.strip_ansi',
+                        side_effect=read_line_and_strip_ansi):
+            self.assertEqual(log.ansi_stripped_log, 'Hello')
+
+        self.assertEqual(read_while_formatting, ['\x1b[1mHello\x1b[0m'])
+        self.assertEqual(log.formatted_log, '\x1b[1mHello\x1b[0m')
+
+
+if _PYTHON_3_8:
+    from unittest import IsolatedAsyncioTestCase  # type: ignore # pylint: disable=no-name-in-module
+
+    class TestLogStoreDelivery(IsolatedAsyncioTestCase):  # pylint: disable=undefined-variable
+        """Tests for batched delivery of new logs to viewers."""
+        def setUp(self) -> None:
+            self.log_store, self.viewer = _create_log_store()
+            self.test_log = logging.getLogger('log_store.delivery_test')
+            self.test_log.propagate = False
+            self.test_log.setLevel(logging.DEBUG)
+            self.test_log.addHandler(self.log_store)
+
+        def tearDown(self) -> None:
+            self.test_log.removeHandler(self.log_store)
+
+        async def test_batched_delivery(self) -> None:
+            delivery_task = asyncio.create_task(
+                self.log_store.deliver_logs_forever(
+                    max_updates_per_second=1000))
+            await asyncio.sleep(0)
+
+            for i in range(100):
+                self.test_log.debug('Test log %s', i)
+
+            # Logs are only stored until the delivery task runs.
+            self.viewer.new_logs_arrived.assert_not_called()
+            await asyncio.sleep(0.01)
+            self.viewer.new_logs_arrived.assert_called_once_with(100)
+
+            self.test_log.debug('Test log')
+            await asyncio.sleep(0.01)
+            self.viewer.new_logs_arrived.assert_called_with(101)
+            self.assertEqual(self.viewer.new_logs_arrived.call_count, 2)
+
+            delivery_task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await delivery_task
+
+            # Viewers are notified directly after the task stops.
+            self.viewer.new_logs_arrived.reset_mock()
+            self.test_log.debug('Test log')
+            self.viewer.new_logs_arrived.assert_called_once_with(102)
+
+        async def test_batched_delivery_from_thread(self) -> None:
+            delivery_task = asyncio.create_task(
+                self.log_store.deliver_logs_forever(
+                    max_updates_per_second=1000))
+            await asyncio.sleep(0)
+
+            def log_forever() -> None:
+                for i in range(1000):
+                    self.test_log.debug('Test log %s', i)
+
+            thread = threading.Thread(target=log_forever)
+            thread.start()
+            while thread.is_alive():
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0.01)
+
+            # Every log is delivered with fewer updates than logs.
+            self.viewer.new_logs_arrived.assert_called_with(1000)
+            self.assertLess(self.viewer.new_logs_arrived.call_count, 1000)
+
+            delivery_task.cancel()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -365,6 +365,55 @@ class TestLogView(unittest.TestCase):
         # Log index should be None
         self.assertEqual(result.log_index, None)
 
+    def test_new_logs_filtered_after_history_is_full(self) -> None:
+        """Test filtering new logs when the oldest logs are being removed."""
+        log_view, _log_pane = self._create_log_view_with_logs(log_count=10)
+        log_view.log_store.max_history_size = 10
+
+        self.assertTrue(log_view.new_search('Test log 1', interactive=False))
+        log_view.install_new_filter()
+
+        test_log = logging.getLogger('log_view.test')
+        with self.assertLogs(test_log, level='DEBUG') as _log_context:
+            test_log.addHandler(log_view.log_store)
+            for i in range(10, 20):
+                test_log.debug('Test log %s', i)
+
+        self.assertEqual(10, log_view.log_store.get_total_count())
+        self.assertEqual(
+            [f'Test log {i}' for i in range(10, 20)],
+            [log.record.message for log in log_view.filtered_logs])
+
+    def test_new_logs_searched_while_logs_are_removed(self) -> None:
+        """Test searching new logs while another thread adds logs."""
+        log_view, _log_pane = self._create_log_view_with_logs(log_count=10)
+        log_store = log_view.log_store
+        log_store.max_history_size = 10
+
+        def add_logs(start: int) -> None:
+            for i in range(start, start + 5):
+                # pylint: disable=protected-access
+                log_store._append_log(
+                    logging.makeLogRecord({'msg': f'Test log {i}'}))
+
+        # Add logs without notifying the LogView, removing the oldest ones.
+        add_logs(10)
+
+        searched = []
+
+        def matches(log) -> bool:
+            # Add more logs while the new logs are searched, as another thread
+            # could.
+            if not searched:
+                add_logs(15)
+            searched.append(log.record.message)
+            return False
+
+        log_view.search_filter = MagicMock(matches=matches)
+        log_view.new_logs_arrived(end_index=15)
+
+        self.assertEqual([f'Test log {i}' for i in range(10, 15)], searched)
+
     def test_visual_select(self) -> None:
         """Test log line selection."""
         log_view, log_pane = self._create_log_view_with_logs(log_count=100)
@@ -862,6 +862,13 @@ class ConsoleApp:
         if test_mode:
             background_log_task = asyncio.create_task(self.log_forever())
 
+        # Notify log panes of new logs from this event loop, so threads that
+        # log don't wait for filtering, searching, and redraws.
+        log_delivery_tasks = [
+            asyncio.create_task(log_store.deliver_logs_forever())
+            for log_store in self._log_stores()
+        ]
+
         # Repl pane has focus by default, if it's hidden switch focus to another
         # visible pane.
         if not self.repl_pane.show_pane:
@@ -873,6 +880,17 @@ class ConsoleApp:
         finally:
             if test_mode:
                 background_log_task.cancel()
+            for task in log_delivery_tasks:
+                task.cancel()
+
+    def _log_stores(self) -> List[LogStore]:
+        """Return the LogStores shown in log panes without duplicates."""
+        log_stores: List[LogStore] = []
+        for pane in self.window_manager.active_panes():
+            if (isinstance(pane, LogPane)
+                    and pane.log_view.log_store not in log_stores):
+                log_stores.append(pane.log_view.log_store)
+        return log_stores
 
     async def log_forever(self):
         """Test mode async log generator coroutine that runs forever."""
@@ -88,21 +88,30 @@ class LogFilter:
     def pattern(self):
         return self.regex.pattern
 
+    def field_text(self, log: LogLine) -> str:
+        """Returns the text of the log field this filter searches."""
+        if not self.field:
+            return log.ansi_stripped_log
+        if self.field == 'lvl':
+            return log.record.levelname
+        if self.field == 'time':
+            # Formatting the record sets its asctime.
+            log.ensure_formatted()
+            return log.record.asctime
+
+        # Only use the formatted log text if the field is missing, so searching
+        # metadata fields doesn't format lazily formatted logs.
+        fields = None
+        if hasattr(log.record, 'extra_metadata_fields'):  # type: ignore
+            fields = log.record.extra_metadata_fields  # type: ignore
+        elif hasattr(log, 'metadata') and hasattr(log.metadata, 'fields'):
+            fields = log.metadata.fields
+        if fields is not None and self.field in fields:
+            return fields[self.field]
+        return log.ansi_stripped_log
+
     def matches(self, log: LogLine):
-        field = log.ansi_stripped_log
-        if self.field:
-            if hasattr(log, 'metadata') and hasattr(log.metadata, 'fields'):
-                field = log.metadata.fields.get(self.field,
-                                                log.ansi_stripped_log)
-            if hasattr(log.record, 'extra_metadata_fields'):  # type: ignore
-                field = log.record.extra_metadata_fields.get(  # type: ignore
-                    self.field, log.ansi_stripped_log)
-            if self.field == 'lvl':
-                field = log.record.levelname
-            elif self.field == 'time':
-                field = log.record.asctime
-
-        match = self.regex.search(field)
+        match = self.regex.search(self.field_text(log))
 
         if self.invert:
             return not match
@@ -14,25 +14,115 @@
 """LogLine storage class."""
 
 import logging
-from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 
 from prompt_toolkit.formatted_text import ANSI, StyleAndTextTuples
 
 from pw_log_tokenized import FormatStringWithMetadata
+import pw_console.text_formatting
 
 
-@dataclass
 class LogLine:
-    """Class to hold a single log event."""
-    record: logging.LogRecord
-    formatted_log: str
-    ansi_stripped_log: str
-
-    def __post_init__(self):
-        self.metadata = None
-        self.fragment_cache = None
+    """Class to hold a single log event.
+
+    A LogLine is either created with its formatted text or with a formatter
+    function. With a formatter, the record is not formatted until the text is
+    first accessed, for example when the line is rendered, searched, or
+    exported.
+    """
+    # LogStore may hold a million LogLines, so avoid a __dict__ per instance.
+    __slots__ = (
+        'record',
+        'metadata',
+        'fragment_cache',
+        '_formatted_log',
+        '_ansi_stripped_log',
+        '_formatter',
+    )
+
+    def __init__(
+        self,
+        record: logging.LogRecord,
+        formatted_log: Optional[str] = None,
+        ansi_stripped_log: Optional[str] = None,
+        formatter: Optional[Callable[[logging.LogRecord], str]] = None,
+    ) -> None:
+        if formatted_log is None and formatter is None:
+            raise ValueError('LogLine requires formatted_log or a formatter')
+
+        self.record = record
+        self.metadata: Optional[FormatStringWithMetadata] = None
+        self.fragment_cache: Optional[StyleAndTextTuples] = None
+        self._formatted_log = formatted_log
+        self._ansi_stripped_log = ansi_stripped_log
+        self._formatter = formatter
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}(record={self.record!r}, '
+                f'formatted={self.is_formatted()})')
+
+    @property
+    def formatted_log(self) -> str:
+        """The log text including ANSI escape sequences."""
+        if self._formatted_log is None:
+            return self._format()
+        return self._formatted_log
+
+    @property
+    def ansi_stripped_log(self) -> str:
+        """The log text with ANSI escape sequences removed."""
+        if self._formatted_log is None:
+            self._format()
+        if self._ansi_stripped_log is None:
+            self._ansi_stripped_log = pw_console.text_formatting.strip_ansi(
+                self._formatted_log)
+        return self._ansi_stripped_log
+
+    def is_formatted(self) -> bool:
+        """Returns True if the log record has been formatted."""
+        return self._formatted_log is not None
+
+    def ensure_formatted(self) -> None:
+        """Formats the log record if it has not been formatted yet.
+
+        Formatting sets LogRecord attributes such as asctime, so call this
+        before reading them.
+        """
+        if self._formatted_log is None:
+            self._format()
+
+    def _format(self) -> str:
+        # Lines may be formatted by the UI thread and a search thread at the
+        # same time. Build the text in local variables and set _formatted_log
+        # last, so other threads never see a partially formatted line. If two
+        # threads format the line at once, both produce the same text.
+        formatter = self._formatter
+        if formatter is None:
+            raise ValueError('LogLine was created without a formatter')
+
+        formatted_log = formatter(self.record)
+
+        # The stripped text keeps the raw metadata string, as when a LogStore
+        # formats logs as they arrive.
+        ansi_stripped_log = self._ansi_stripped_log
+        if ansi_stripped_log is None:
+            ansi_stripped_log = pw_console.text_formatting.strip_ansi(
+                formatted_log)
+
+        if self.metadata is not None:
+            formatted_log = self._replace_metadata(formatted_log)
+
+        self._ansi_stripped_log = ansi_stripped_log
+        self._formatted_log = formatted_log
+        return formatted_log
+
+    def _replace_metadata(self, formatted_log: str) -> str:
+        assert self.metadata is not None
+        formatted_log = formatted_log.replace(self.metadata.raw_string,
+                                              self.metadata.message)
+        # Remove any trailing line breaks.
+        return formatted_log.rstrip()
 
     def time(self):
         """Return a datetime object for the log record."""
@@ -43,10 +133,9 @@ class LogLine:
 
         # 1. Parse any metadata from the message itself.
         self.metadata = FormatStringWithMetadata(str(self.record.message))
-        self.formatted_log = self.formatted_log.replace(
-            self.metadata.raw_string, self.metadata.message)
-        # Remove any trailing line breaks.
-        self.formatted_log = self.formatted_log.rstrip()
+        # Unformatted lines are updated when they are formatted.
+        if self._formatted_log is not None:
+            self._formatted_log = self._replace_metadata(self._formatted_log)
 
         # 2. Check for a metadata Dict[str, str] stored in the log record in the
         # `extra_metadata_fields` attribute. This should be set using the
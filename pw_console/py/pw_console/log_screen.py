@@ -17,7 +17,7 @@ from __future__ import annotations
 import collections
 import dataclasses
 import logging
-from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+from typing import Callable, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
 from prompt_toolkit.formatted_text import (
     to_formatted_text,
@@ -88,7 +88,7 @@ class ScreenLine:
     fragments: StyleAndTextTuples
 
     # Log index reference for this screen line. This is the index to where the
-    # log message resides in the parent LogStore.logs deque. It is set to None
+    # log message resides in the parent LogStore.logs buffer. It is set to None
     # if this is an empty ScreenLine. If a log message requires line wrapping
     # then each resulting ScreenLine instance will have the same log_index
     # value.
@@ -126,7 +126,7 @@ class LogScreen:
     It is responsible for moving the cursor_position, prepending and appending
     log lines as the user moves the cursor."""
     # Callable functions to retrieve logs and display formatting.
-    get_log_source: Callable[[], Tuple[int, collections.deque[LogLine]]]
+    get_log_source: Callable[[], Tuple[int, Sequence[LogLine]]]
     get_line_wrapping: Callable[[], bool]
     get_log_formatter: Callable[[], Optional[Callable[[LogLine],
                                                       StyleAndTextTuples]]]
@@ -0,0 +1,137 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Searches log lines with LogFilters in a background thread."""
+
+from __future__ import annotations
+import asyncio
+import threading
+from typing import (AsyncIterator, Iterable, List, Optional, Sequence,
+                    TYPE_CHECKING)
+
+if TYPE_CHECKING:
+    from pw_console.log_filter import LogFilter
+    from pw_console.log_line import LogLine
+
+# Number of log lines checked before publishing matches to the UI.
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _filter_batch(logs: Sequence[LogLine], positions: Iterable[int],
+                  log_filter: LogFilter) -> List[int]:
+    """Returns the positions of the logs that match one LogFilter."""
+    field_text = log_filter.field_text
+    search = log_filter.regex.search
+
+    if log_filter.invert:
+        return [i for i in positions if not search(field_text(logs[i]))]
+    return [i for i in positions if search(field_text(logs[i]))]
+
+
+class LogSearch:
+    """Finds the log lines that match all of a set of LogFilters.
+
+    The logs are copied when the LogSearch is created, so later changes to the
+    log source do not affect the search. Logs are checked in a background
+    thread in batches, from the newest to the oldest. For each batch, every
+    filter is evaluated only on the lines that matched the previous filters.
+
+    Example:
+
+    .. code-block:: python
+
+        search = LogSearch(log_store.logs, [log_filter])
+        async for positions in search.matches():
+            matched_logs = [search.logs[i] for i in positions]
+    """
+    def __init__(self,
+                 logs: Iterable[LogLine],
+                 filters: Iterable[LogFilter],
+                 start: int = 0,
+                 stop: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        """Copies the logs to search.
+
+        Args:
+          logs: log lines to search
+          filters: a log must match all of these filters
+          start: position of the first log to search
+          stop: position after the last log to search; defaults to the end
+          batch_size: number of logs to check per published batch
+        """
+        self.logs: List[LogLine] = list(logs)
+        self.filters = list(filters)
+        self.start = max(start, 0)
+        self.stop = len(self.logs) if stop is None else min(
+            stop, len(self.logs))
+        self.batch_size = batch_size
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stops the search after the current batch."""
+        self._cancelled.set()
+
+    async def matches(self) -> AsyncIterator[List[int]]:
+        """Yields the ascending positions of matches for each batch.
+
+        Batches are yielded from the newest logs to the oldest, so the positions
+        in each batch are lower than those in the previous batch. Stopping the
+        iteration cancels the search.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        thread = threading.Thread(target=self._search,
+                                  args=(loop, queue),
+                                  name='pw_console log search',
+                                  daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                if isinstance(batch, BaseException):
+                    raise batch
+
+                yield batch
+        finally:
+            self.cancel()
+
+    def _search(self, loop: asyncio.AbstractEventLoop,
+                queue: asyncio.Queue) -> None:
+        """Checks the logs in batches; runs in the search thread."""
+        def publish(item) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:  # The event loop is closed.
+                self.cancel()
+
+        try:
+            for batch_stop in range(self.stop, self.start, -self.batch_size):
+                if self._cancelled.is_set():
+                    break
+
+                positions: Iterable[int] = range(
+                    max(batch_stop - self.batch_size, self.start), batch_stop)
+                for log_filter in self.filters:
+                    positions = _filter_batch(self.logs, positions, log_filter)
+
+                matched = list(positions)
+                if matched:
+                    publish(matched)
+        except Exception as error:  # pylint: disable=broad-except
+            publish(error)
+
+        publish(None)
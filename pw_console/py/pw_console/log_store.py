@@ -14,9 +14,8 @@
 """LogStore saves logs and acts as a Python logging handler."""
 
 from __future__ import annotations
-import collections
+import asyncio
 import logging
-import sys
 from datetime import datetime
 from typing import Dict, List, Optional, TYPE_CHECKING
 
@@ -24,12 +23,29 @@ import pw_cli.color
 
 from pw_console.console_prefs import ConsolePrefs
 from pw_console.log_line import LogLine
+from pw_console.ring_buffer import RingBuffer
 import pw_console.text_formatting
 from pw_console.widgets.table import TableView
 
 if TYPE_CHECKING:
     from pw_console.log_view import LogView
 
+# Approximate memory used by a LogLine, its LogRecord, its metadata, and the
+# timestamp and level prefixes of the formatted log strings. Measured with
+# tracemalloc for a typical log message.
+_LOG_LINE_OVERHEAD_BYTES = 1024
+
+# Default maximum number of times per second that deliver_logs_forever()
+# notifies LogViews of new logs. This matches the LogView redraw rate.
+DEFAULT_LOG_UPDATES_PER_SECOND = 20.0
+
+
+def _estimated_size(log: LogLine) -> int:
+    # Formatted logs store the message twice: with and without ANSI escape
+    # sequences. The estimate only uses the message so that it does not change
+    # when a lazily formatted log is formatted.
+    return _LOG_LINE_OVERHEAD_BYTES + 2 * len(log.record.message)
+
 
 class LogStore(logging.Handler):
     """Pigweed Console logging handler.
@@ -76,8 +92,15 @@ class LogStore(logging.Handler):
 
         console.setup_python_logging()
         console.embed()
+
+    Formatting every log as it arrives can slow down the logging thread when
+    there are thousands of logs per second. With ``lazy_formatting=True``, only
+    the log metadata is parsed when a log arrives. Each log is formatted when
+    it is first rendered, searched, or exported.
     """
-    def __init__(self, prefs: Optional[ConsolePrefs] = None):
+    def __init__(self,
+                 prefs: Optional[ConsolePrefs] = None,
+                 lazy_formatting: bool = False):
         """Initializes the LogStore instance."""
 
         # ConsolePrefs may not be passed on init. For example, if the user is
@@ -87,16 +110,14 @@ class LogStore(logging.Handler):
                                  project_user_file=False,
                                  user_file=False)
         self.prefs = prefs
-        # Log storage deque for fast addition and deletion from the beginning
-        # and end of the iterable.
-        self.logs: collections.deque = collections.deque()
+        self.lazy_formatting = lazy_formatting
+        # Log storage with constant time indexing. Only the most recent
+        # max_history_size log lines are kept in memory.
+        self.logs: RingBuffer[LogLine] = RingBuffer(maxlen=1000000)
 
         # Estimate of the logs in memory.
         self.byte_size: int = 0
 
-        # Only allow this many log lines in memory.
-        self.max_history_size: int = 1000000
-
         # Counts of logs per python logger name
         self.channel_counts: Dict[str, int] = {}
         # Widths of each logger prefix string. For example: the character length
@@ -113,11 +134,27 @@ class LogStore(logging.Handler):
         # List of viewers that should be notified on new log line arrival.
         self.registered_viewers: List['LogView'] = []
 
+        # Batched delivery state for deliver_logs_forever(). While it runs,
+        # emit() only wakes it instead of notifying viewers directly.
+        self._delivery_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._delivery_event: Optional[asyncio.Event] = None
+        self._delivery_pending = False
+
         super().__init__()
 
         # Set formatting after logging.Handler init.
         self.set_formatting()
 
+    @property
+    def max_history_size(self) -> int:
+        """The maximum number of log lines to keep in memory."""
+        return self.logs.maxlen
+
+    @max_history_size.setter
+    def max_history_size(self, max_history_size: int) -> None:
+        self.logs.maxlen = max_history_size
+        self.byte_size = sum(_estimated_size(log) for log in self.logs)
+
     def set_prefs(self, prefs: ConsolePrefs) -> None:
         """Set the ConsolePrefs for this LogStore."""
         self.prefs = prefs
@@ -145,7 +182,7 @@ class LogStore(logging.Handler):
 
     def clear_logs(self):
         """Erase all stored pane lines."""
-        self.logs = collections.deque()
+        self.logs.clear()
         self.byte_size = 0
         self.channel_counts = {}
         self.channel_formatted_prefix_widths = {}
@@ -203,15 +240,19 @@ class LogStore(logging.Handler):
 
     def _append_log(self, record: logging.LogRecord):
         """Add a new log event."""
-        # Format incoming log line.
-        formatted_log = self.format(record)
-        ansi_stripped_log = pw_console.text_formatting.strip_ansi(
-            formatted_log)
-        # Save this log.
-        self.logs.append(
-            LogLine(record=record,
-                    formatted_log=formatted_log,
-                    ansi_stripped_log=ansi_stripped_log))
+        if self.lazy_formatting:
+            # Only the message is needed to parse metadata. The formatter is
+            # called when the log text is first used.
+            record.message = record.getMessage()
+            log = LogLine(record=record, formatter=self.format)
+        else:
+            # Format incoming log line.
+            formatted_log = self.format(record)
+            ansi_stripped_log = pw_console.text_formatting.strip_ansi(
+                formatted_log)
+            log = LogLine(record=record,
+                          formatted_log=formatted_log,
+                          ansi_stripped_log=ansi_stripped_log)
         # Increment this logger count
         self.channel_counts[record.name] = self.channel_counts.get(
             record.name, 0) + 1
@@ -222,16 +263,17 @@ class LogStore(logging.Handler):
         self.channel_formatted_prefix_widths[record.name] = 0
 
         # Parse metadata fields
-        self.logs[-1].update_metadata()
+        log.update_metadata()
 
         # Check for bigger column widths.
-        self.table.update_metadata_column_widths(self.logs[-1])
+        self.table.update_metadata_column_widths(log)
 
-        # Update estimated byte_size.
-        self.byte_size += sys.getsizeof(self.logs[-1])
-        # If the total log lines is > max_history_size, delete the oldest line.
-        if self.get_total_count() > self.max_history_size:
-            self.byte_size -= sys.getsizeof(self.logs.popleft())
+        # Save this log. If there are already max_history_size log lines, the
+        # oldest line is removed.
+        self.byte_size += _estimated_size(log)
+        removed_log = self.logs.append(log)
+        if removed_log is not None:
+            self.byte_size -= _estimated_size(removed_log)
 
     def emit(self, record) -> None:
         """Process a new log record.
@@ -241,9 +283,63 @@ class LogStore(logging.Handler):
         the parent class with thread safety and filters applied.
         """
         self._append_log(record)
-        # Notify viewers of new logs
+
+        loop = self._delivery_loop
+        if loop is None:
+            self._notify_viewers()
+            return
+
+        # Wake deliver_logs_forever() once for any number of new logs.
+        if not self._delivery_pending:
+            self._delivery_pending = True
+            try:
+                loop.call_soon_threadsafe(self._wake_delivery)
+            except RuntimeError:  # The event loop is closed.
+                self._delivery_loop = None
+                self._notify_viewers()
+
+    def _notify_viewers(self) -> None:
+        """Notify viewers of all logs added so far."""
+        end_index = self.logs.end_index
         for viewer in self.registered_viewers:
-            viewer.new_logs_arrived()
+            viewer.new_logs_arrived(end_index)
+
+    def _wake_delivery(self) -> None:
+        if self._delivery_event is not None:
+            self._delivery_event.set()
+
+    async def deliver_logs_forever(
+        self,
+        max_updates_per_second: float = DEFAULT_LOG_UPDATES_PER_SECOND
+    ) -> None:
+        """Notifies viewers of new logs in batches from this event loop.
+
+        By default, emit() notifies every viewer of every log, which filters
+        and searches the log on the thread that logged it. While this coroutine
+        runs, emit() only stores the log. Viewers are notified here of all logs
+        that arrived since the last update, at most max_updates_per_second
+        times per second. Run this as a task in the UI event loop and cancel it
+        to return to notifying viewers from emit().
+        """
+        self._delivery_event = asyncio.Event()
+        self._delivery_loop = asyncio.get_running_loop()
+        interval = 1 / max_updates_per_second
+
+        try:
+            while True:
+                await self._delivery_event.wait()
+                self._delivery_event.clear()
+                # Clear the flag before reading the new logs, so logs that
+                # arrive during this update wake the next one.
+                self._delivery_pending = False
+                self._notify_viewers()
+                await asyncio.sleep(interval)
+        finally:
+            self._delivery_loop = None
+            self._delivery_event = None
+            self._delivery_pending = False
+            # Deliver any logs that arrived since the last update.
+            self._notify_viewers()
 
     def render_table_header(self):
         """Get pre-formatted table header."""
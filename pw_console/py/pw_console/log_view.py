@@ -24,7 +24,8 @@ import operator
 from pathlib import Path
 import re
 import time
-from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+from typing import (Callable, Dict, List, Optional, Sequence, Tuple,
+                    TYPE_CHECKING)
 
 from prompt_toolkit.data_structures import Point
 from prompt_toolkit.formatted_text import StyleAndTextTuples
@@ -37,7 +38,9 @@ from pw_console.log_filter import (
     preprocess_search_regex,
 )
 from pw_console.log_screen import ScreenLine, LogScreen
+from pw_console.log_search import LogSearch
 from pw_console.log_store import LogStore
+from pw_console.ring_buffer import RingBuffer
 from pw_console.text_formatting import remove_formatting
 
 if TYPE_CHECKING:
@@ -283,6 +286,7 @@ class LogView:
 
         if interactive:
             # Start count historical search matches task.
+            self._cancel_task(self.search_match_count_task)
             self.search_match_count_task = asyncio.create_task(
                 self.count_search_matches())
 
@@ -302,6 +306,19 @@ class LogView:
                 sorted(self.search_matched_lines.keys()))
         }
 
+    def _save_search_matched_lines(self, log_indexes: List[int]) -> None:
+        """Save a batch of matched log_indexes."""
+        self.search_matched_lines = {
+            log_index: match_number
+            for match_number, log_index in enumerate(
+                sorted(self.search_matched_lines.keys() | set(log_indexes)))
+        }
+
+    @staticmethod
+    def _cancel_task(task: Optional[asyncio.Task]) -> None:
+        if task and not task.done():
+            task.cancel()
+
     def disable_search_highlighting(self):
         self.log_pane.log_view.search_highlight = False
 
@@ -311,13 +328,15 @@ class LogView:
             self.toggle_follow()
 
         # Reset filtered logs.
+        self._cancel_task(self.filter_existing_logs_task)
         self.filtered_logs.clear()
         # Reset scrollback start
         self._scrollback_start_index = 0
 
-        # Start filtering existing log lines.
+        # Start filtering existing log lines. Logs after the last one seen by
+        # new_logs_arrived() are filtered as they arrive.
         self.filter_existing_logs_task = asyncio.create_task(
-            self.filter_past_logs())
+            self.filter_past_logs(self._last_log_store_index))
 
         # Reset existing search
         self.clear_search()
@@ -353,8 +372,8 @@ class LogView:
         self.search_highlight = False
         self._reset_log_screen_on_next_render = True
 
-    def _get_log_lines(self) -> Tuple[int, collections.deque[LogLine]]:
-        logs = self.log_store.logs
+    def _get_log_lines(self) -> Tuple[int, Sequence[LogLine]]:
+        logs: Sequence[LogLine] = self.log_store.logs
         if self.filtering_on:
             logs = self.filtered_logs
         return self._scrollback_start_index, logs
@@ -393,6 +412,7 @@ class LogView:
         self.filtering_on = False
         self.filters: 'collections.OrderedDict[str, re.Pattern]' = (
             collections.OrderedDict())
+        self._cancel_task(self.filter_existing_logs_task)
         self.filtered_logs.clear()
         # Reset scrollback start
         self._scrollback_start_index = 0
@@ -405,33 +425,46 @@ class LogView:
         if self.filtering_on and self.filter_existing_logs_task:
             await self.filter_existing_logs_task
 
-        starting_index = self.get_last_log_index()
-        ending_index, logs = self._get_log_lines()
+        start_index, logs = self._get_log_lines()
+        if not self.search_filter:
+            return
+
+        # Log store indexes shift down as the oldest logs are removed, so track
+        # how many logs have been removed since the search started.
+        def removed_logs() -> int:
+            if isinstance(logs, RingBuffer):
+                return logs.first_index
+            return 0
 
-        # From the end of the log store to the beginning.
-        for i in range(starting_index, ending_index - 1, -1):
-            # Is this log a match?
-            if self.search_filter.matches(logs[i]):
-                self.save_search_matched_line(i)
-            # Pause every 100 lines or so
-            if i % 100 == 0:
-                await asyncio.sleep(.1)
-
-    async def filter_past_logs(self):
-        """Filter past log lines."""
-        starting_index = self.log_store.get_last_log_index()
-        ending_index = -1
-
-        # From the end of the log store to the beginning.
-        for i in range(starting_index, ending_index, -1):
-            # Is this log a match?
-            if self.filter_scan(self.log_store.logs[i]):
-                # Add to the beginning of the deque.
-                self.filtered_logs.appendleft(self.log_store.logs[i])
-            # TODO(tonymd): Tune these values.
-            # Pause every 100 lines or so
-            if i % 100 == 0:
-                await asyncio.sleep(.1)
+        removed_before_search = removed_logs()
+
+        # Search from the end of the logs to the beginning in the background.
+        search = LogSearch(logs, [self.search_filter], start=start_index)
+        async for log_indexes in search.matches():
+            removed = removed_logs() - removed_before_search
+            self._save_search_matched_lines(
+                [i - removed for i in log_indexes if i >= removed])
+            self.log_pane.application.redraw_ui()
+
+    async def filter_past_logs(self,
+                               end_log_store_index: Optional[int] = None):
+        """Filter past log lines in the background.
+
+        Args:
+          end_log_store_index: Absolute log store index after the last log to
+            filter. Defaults to the end of the log store.
+        """
+        logs = self.log_store.logs
+        stop = None
+        if end_log_store_index is not None:
+            stop = end_log_store_index - logs.first_index
+
+        search = LogSearch(logs, list(self.filters.values()), stop=stop)
+        # Matches are found from the end of the log store to the beginning.
+        async for log_indexes in search.matches():
+            self.filtered_logs.extendleft(search.logs[i]
+                                          for i in reversed(log_indexes))
+            self.log_pane.application.redraw_ui()
 
     def set_log_pane(self, log_pane: 'LogPane'):
         """Set the parent LogPane instance."""
@@ -500,7 +533,7 @@ class LogView:
             return True
         return False
 
-    def new_logs_arrived(self):
+    def new_logs_arrived(self, end_index: Optional[int] = None):
         """Check newly arrived log messages.
 
         Depending on where log statements occur ``new_logs_arrived`` may be in a
@@ -508,20 +541,41 @@ class LogView:
         ``emit()`` function. In this case the log handler is the LogStore
         instance ``self.log_store``. This function should not redraw the screen
         or scroll.
+
+        Args:
+          end_index: absolute LogStore index after the last new log; defaults
+            to the end of the LogStore
         """
-        latest_total = self.log_store.get_total_count()
+        logs = self.log_store.logs
+        # Other threads may add logs and remove the oldest ones at any time, so
+        # copy the new logs while holding the LogStore's lock. They are
+        # filtered and searched after the lock is released. Use absolute log
+        # indices, which do not change when the oldest logs are removed from
+        # the LogStore. Logs removed before they were scanned are skipped.
+        self.log_store.acquire()
+        try:
+            first_index = logs.first_index
+            new_logs_start = max(self._last_log_store_index, first_index)
+            latest_total = logs.end_index if end_index is None else end_index
+            new_logs = logs[new_logs_start - first_index:latest_total -
+                            first_index]
+        finally:
+            self.log_store.release()
+
+        if not new_logs:
+            return
 
         if self.filtering_on:
             # Scan newly arived log lines
-            for i in range(self._last_log_store_index, latest_total):
-                if self.filter_scan(self.log_store.logs[i]):
-                    self.filtered_logs.append(self.log_store.logs[i])
+            for log in new_logs:
+                if self.filter_scan(log):
+                    self.filtered_logs.append(log)
 
         if self.search_filter:
             last_matched_log: Optional[int] = None
             # Scan newly arived log lines
-            for i in range(self._last_log_store_index, latest_total):
-                if self.search_filter.matches(self.log_store.logs[i]):
+            for i, log in enumerate(new_logs, new_logs_start - first_index):
+                if self.search_filter.matches(log):
                     self.save_search_matched_line(i)
                     last_matched_log = i
             if last_matched_log and self.follow_search_match:
@@ -0,0 +1,129 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Fixed capacity ring buffer with constant time random access."""
+
+import itertools
+from typing import Iterator, List, Optional, Sequence, TypeVar, overload
+
+T = TypeVar('T')
+
+
+class RingBuffer(Sequence[T]):
+    """Stores the most recent maxlen items in a list used as a ring.
+
+    Unlike collections.deque, indexing takes constant time anywhere in the
+    buffer. Items are indexed two ways:
+
+    - Positions, as with a list: 0 is the oldest item still stored and -1 the
+      newest. Positions shift down by one when the oldest item is removed.
+    - Absolute indices, which count every item ever appended. An item's
+      absolute index never changes, so it can be used to track which items
+      have been seen. Items that were removed can no longer be accessed.
+    """
+    def __init__(self, maxlen: int) -> None:
+        if maxlen < 1:
+            raise ValueError('RingBuffer maxlen must be at least 1')
+
+        self._maxlen = maxlen
+        self._items: List[T] = []
+        self._start = 0  # Position of the oldest item in self._items.
+        self._first_index = 0  # Absolute index of the oldest item.
+
+    @property
+    def maxlen(self) -> int:
+        """The maximum number of items to store."""
+        return self._maxlen
+
+    @maxlen.setter
+    def maxlen(self, maxlen: int) -> None:
+        """Changes the capacity, removing the oldest items if necessary."""
+        if maxlen < 1:
+            raise ValueError('RingBuffer maxlen must be at least 1')
+
+        removed = max(len(self) - maxlen, 0)
+        self._items = list(itertools.islice(self, removed, None))
+        self._start = 0
+        self._first_index += removed
+        self._maxlen = maxlen
+
+    @property
+    def first_index(self) -> int:
+        """Absolute index of the oldest stored item."""
+        return self._first_index
+
+    @property
+    def end_index(self) -> int:
+        """Absolute index the next appended item will have."""
+        return self._first_index + len(self._items)
+
+    def append(self, item: T) -> Optional[T]:
+        """Adds an item; returns the oldest item if it was removed."""
+        if len(self._items) < self._maxlen:
+            self._items.append(item)
+            return None
+
+        removed = self._items[self._start]
+        self._items[self._start] = item
+        self._start = (self._start + 1) % self._maxlen
+        self._first_index += 1
+        return removed
+
+    def get(self, index: int) -> T:
+        """Returns an item by its absolute index."""
+        if not self._first_index <= index < self.end_index:
+            raise IndexError(f'Item {index} is not in the RingBuffer '
+                             f'[{self._first_index}, {self.end_index})')
+
+        return self._items[(self._start + index - self._first_index) %
+                           len(self._items)]
+
+    def clear(self) -> None:
+        """Removes all items. Absolute indices continue from end_index."""
+        self._first_index = self.end_index
+        self._items = []
+        self._start = 0
+
+    @overload
+    def __getitem__(self, position: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[T]:
+        ...
+
+    def __getitem__(self, position):
+        """Returns an item by its position, where 0 is the oldest item."""
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        size = len(self._items)
+        if position < 0:
+            position += size
+
+        if not 0 <= position < size:
+            raise IndexError('RingBuffer index out of range')
+
+        return self._items[(self._start + position) % size]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[T]:
+        return itertools.chain(
+            itertools.islice(self._items, self._start, None),
+            itertools.islice(self._items, self._start))
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}(maxlen={self._maxlen}, '
+                f'first_index={self._first_index}, len={len(self)})')
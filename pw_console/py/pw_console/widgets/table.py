@@ -15,6 +15,7 @@
 
 import collections
 import copy
+from typing import Set
 
 from prompt_toolkit.formatted_text import StyleAndTextTuples
 
@@ -36,6 +37,7 @@ class TableView:
         self.set_prefs(prefs)
         self.column_widths: collections.OrderedDict = collections.OrderedDict()
         self._header_fragment_cache = None
+        self._measured_level_names: Set[str] = set()
 
         # Assume common defaults here before recalculating in set_formatting().
         self._default_time_width: int = 17
@@ -96,27 +98,38 @@ class TableView:
 
     def update_metadata_column_widths(self, log: LogLine):
         """Calculate the max widths for each metadata field."""
+        column_widths = self.column_widths
+        widths_changed = False
         for field_name, value in log.metadata.fields.items():
-            value_string = str(value)
-
             # Get width of formatted numbers
-            if isinstance(value, float):
-                value_string = TableView.FLOAT_FORMAT % value
+            if isinstance(value, str):
+                width = len(value)
+            elif isinstance(value, float):
+                width = len(TableView.FLOAT_FORMAT % value)
             elif isinstance(value, int):
-                value_string = TableView.INT_FORMAT % value
-
-            current_width = self.column_widths.get(field_name, 0)
-            if len(value_string) > current_width:
-                self.column_widths[field_name] = len(value_string)
-
-        # Update log level character width.
-        ansi_stripped_level = pw_console.text_formatting.strip_ansi(
-            log.record.levelname)
-        if len(ansi_stripped_level) > self.column_widths['level']:
-            self.column_widths['level'] = len(ansi_stripped_level)
-
-        self.column_width_prefix_total = self._width_of_justified_fields()
-        self._update_table_header()
+                width = len(TableView.INT_FORMAT % value)
+            else:
+                width = len(str(value))
+
+            if width > column_widths.get(field_name, 0):
+                column_widths[field_name] = width
+                widths_changed = True
+
+        # Update log level character width. Each level name only needs to be
+        # measured once.
+        levelname = log.record.levelname
+        if levelname not in self._measured_level_names:
+            self._measured_level_names.add(levelname)
+            level_width = len(pw_console.text_formatting.strip_ansi(levelname))
+            if level_width > column_widths['level']:
+                column_widths['level'] = level_width
+                widths_changed = True
+
+        # Most logs don't widen any columns, so only recalculate the totals
+        # and header when needed.
+        if widths_changed:
+            self.column_width_prefix_total = self._width_of_justified_fields()
+            self._update_table_header()
 
     def _update_table_header(self):
         default_style = 'bold'
@@ -142,6 +155,9 @@ class TableView:
 
     def formatted_header(self):
         """Get pre-formatted table header."""
+        # Rebuild the header in case column preferences changed. This runs
+        # once per render rather than once per log.
+        self._update_table_header()
         return self._header_fragment_cache
 
     def formatted_row(self, log: LogLine) -> StyleAndTextTuples:
@@ -154,6 +170,9 @@ class TableView:
 
         table_fragments: StyleAndTextTuples = []
 
+        # Formatting the record sets its asctime.
+        log.ensure_formatted()
+
         # NOTE: To preseve ANSI formatting on log level use:
         # table_fragments.extend(
         #     ANSI(log.record.levelname.ljust(
@@ -0,0 +1,100 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for pw_console.ring_buffer"""
+
+import unittest
+
+from pw_console.ring_buffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Tests for RingBuffer."""
+    def test_append_until_full(self) -> None:
+        ring: RingBuffer[int] = RingBuffer(maxlen=3)
+        self.assertEqual(0, len(ring))
+
+        for i in range(3):
+            self.assertIsNone(ring.append(i))
+
+        self.assertEqual([0, 1, 2], list(ring))
+        self.assertEqual(0, ring.first_index)
+        self.assertEqual(3, ring.end_index)
+
+    def test_append_removes_oldest(self) -> None:
+        ring: RingBuffer[int] = RingBuffer(maxlen=3)
+        removed = [ring.append(i) for i in range(8)]
+
+        self.assertEqual([None, None, None, 0, 1, 2, 3, 4], removed)
+        self.assertEqual([5, 6, 7], list(ring))
+        self.assertEqual([5, 6, 7], [ring[i] for i in range(3)])
+        self.assertEqual([7, 6, 5], [ring[i] for i in range(-1, -4, -1)])
+        self.assertEqual([6, 7], ring[1:])
+        self.assertEqual([7, 6, 5], list(reversed(ring)))
+
+    def test_absolute_indices(self) -> None:
+        ring: RingBuffer[str] = RingBuffer(maxlen=2)
+        for char in 'abcde':
+            ring.append(char)
+
+        self.assertEqual(3, ring.first_index)
+        self.assertEqual(5, ring.end_index)
+        self.assertEqual('d', ring.get(3))
+        self.assertEqual('e', ring.get(4))
+
+        for removed_or_future in (2, 5):
+            with self.assertRaises(IndexError):
+                ring.get(removed_or_future)
+
+    def test_index_out_of_range(self) -> None:
+        ring: RingBuffer[int] = RingBuffer(maxlen=4)
+        ring.append(1)
+
+        for position in (1, -2):
+            with self.assertRaises(IndexError):
+                ring[position]  # pylint: disable=pointless-statement
+
+    def test_clear_continues_absolute_indices(self) -> None:
+        ring: RingBuffer[int] = RingBuffer(maxlen=2)
+        for i in range(3):
+            ring.append(i)
+
+        ring.clear()
+        self.assertEqual(0, len(ring))
+        self.assertEqual(3, ring.first_index)
+
+        ring.append(10)
+        self.assertEqual(10, ring.get(3))
+
+    def test_change_maxlen(self) -> None:
+        ring: RingBuffer[int] = RingBuffer(maxlen=4)
+        for i in range(6):
+            ring.append(i)
+
+        ring.maxlen = 2
+        self.assertEqual([4, 5], list(ring))
+        self.assertEqual(4, ring.first_index)
+
+        ring.maxlen = 3
+        ring.append(6)
+        self.assertEqual([4, 5, 6], list(ring))
+        self.assertEqual(4, ring.append(7))
+        self.assertEqual(5, ring.first_index)
+
+    def test_invalid_maxlen(self) -> None:
+        with self.assertRaises(ValueError):
+            RingBuffer(maxlen=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -236,5 +236,32 @@ class TextDumpTest(unittest.TestCase):
         self.assertEqual(str(cpu_state_info), expected_dump)
 
 
+class ProcessTest(unittest.TestCase):
+    """Tests the snapshot and decoded CPU state entry points."""
+    def test_process_cpu_state(self):
+        cpu_state_proto = cpu_state_pb2.ArmV7mCpuState()
+        cpu_state_proto.pc = 0xd2603058
+        cpu_state_info = exception_analyzer.CortexMExceptionAnalyzer(
+            cpu_state_proto)
+        self.assertEqual(exception_analyzer.process_cpu_state(cpu_state_proto),
+                         f'{cpu_state_info}\n')
+
+    def test_process_cpu_state_none(self):
+        self.assertEqual(exception_analyzer.process_cpu_state(None), '')
+
+    def test_process_snapshot_matches_cpu_state(self):
+        snapshot = cpu_state_pb2.SnapshotCpuStateOverlay()
+        snapshot.armv7m_cpu_state.pc = 0xd2603058
+        self.assertEqual(
+            exception_analyzer.process_snapshot(snapshot.SerializeToString()),
+            exception_analyzer.process_cpu_state(snapshot.armv7m_cpu_state))
+
+    def test_process_snapshot_without_cpu_state(self):
+        snapshot = cpu_state_pb2.SnapshotCpuStateOverlay()
+        self.assertEqual(
+            exception_analyzer.process_snapshot(snapshot.SerializeToString()),
+            '')
+
+
 if __name__ == '__main__':
     unittest.main()
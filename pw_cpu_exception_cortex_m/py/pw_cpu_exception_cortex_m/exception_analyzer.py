@@ -177,9 +177,18 @@ def process_snapshot(
     snapshot = cpu_state_pb2.SnapshotCpuStateOverlay()
     snapshot.ParseFromString(serialized_snapshot)
 
-    if snapshot.HasField('armv7m_cpu_state'):
-        state_analyzer = CortexMExceptionAnalyzer(snapshot.armv7m_cpu_state,
-                                                  symbolizer)
-        return f'{state_analyzer}\n'
+    return process_cpu_state(
+        snapshot.armv7m_cpu_state
+        if snapshot.HasField('armv7m_cpu_state') else None, symbolizer)
 
-    return ''
+
+def process_cpu_state(
+        cpu_state: Optional[cpu_state_pb2.ArmV7mCpuState],
+        symbolizer: Optional[pw_symbolizer.Symbolizer] = None) -> str:
+    """Returns the stringified result of a decoded ArmV7mCpuState message run
+    through a CortexMExceptionAnalyzer.
+    """
+    if cpu_state is None:
+        return ''
+
+    return f'{CortexMExceptionAnalyzer(cpu_state, symbolizer)}\n'
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Compares bulk HDLC decoding to the byte-by-byte state machine.
+
+Example:
+
+  python decode_benchmark.py --frames 20000 --payload-size 256
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Iterator
+
+from pw_hdlc import encode
+from pw_hdlc.decode import FrameDecoder
+
+
+def _stream(frames: int, payload_size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    return b''.join(
+        encode.ui_frame(rng.randint(0, 127),
+                        bytes(rng.getrandbits(8) for _ in range(payload_size)))
+        for _ in range(frames))
+
+
+def _chunks(data: bytes, read_size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), read_size):
+        yield data[i:i + read_size]
+
+
+def _bulk(data: bytes, read_size: int) -> int:
+    decoder = FrameDecoder()
+    return sum(1 for chunk in _chunks(data, read_size)
+               for _ in decoder.process(chunk))
+
+
+def _state_machine(data: bytes, read_size: int) -> int:
+    """Decodes the way FrameDecoder did before bulk decoding was added."""
+    # pylint: disable=protected-access
+    decoder = FrameDecoder()
+    count = 0
+    for chunk in _chunks(data, read_size):
+        for byte in chunk:
+            if decoder._process_byte(byte):
+                count += 1
+    return count
+
+
+def _time(name: str, function: Callable[[bytes, int], int], data: bytes,
+          read_size: int, frames: int) -> float:
+    start = time.perf_counter()
+    decoded = function(data, read_size)
+    elapsed = time.perf_counter() - start
+
+    assert decoded == frames, f'{name} decoded {decoded} of {frames} frames'
+    print(f'{name:>14}: {elapsed:8.3f} s '
+          f'{len(data) / elapsed / 1e6:8.2f} MB/s '
+          f'{frames / elapsed:10.0f} frames/s')
+    return elapsed
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--payload-size', type=int, default=128)
+    parser.add_argument('--read-size',
+                        type=int,
+                        default=4096,
+                        help='Bytes passed to each process() call')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main(frames: int, payload_size: int, read_size: int, seed: int) -> None:
+    data = _stream(frames, payload_size, seed)
+    print(f'Decoding {frames} frames ({len(data)} B) in {read_size} B reads')
+
+    state_machine = _time('state machine', _state_machine, data, read_size,
+                          frames)
+    bulk = _time('bulk', _bulk, data, read_size, frames)
+    print(f'Speedup: {state_machine / bulk:.1f}x')
+
+
+if __name__ == '__main__':
+    main(**vars(_parse_args()))
@@ -14,6 +14,7 @@
 # the License.
 """Contains the Python decoder tests and generates C++ decoder tests."""
 
+import random
 from typing import Iterator, List, NamedTuple, Tuple, Union
 import unittest
 
@@ -365,6 +366,18 @@ def _cpp_test(ctx: Context) -> Iterator[str]:
 }}"""
 
 
+def _decode_with_state_machine(data: bytes) -> List[Frame]:
+    """Decodes data by running every byte through the state machine."""
+    decoder = FrameDecoder()
+    # pylint: disable=protected-access
+    frames = [decoder._process_byte(byte) for byte in data]
+    return [frame for frame in frames if frame]
+
+
+def _frame_fields(frames: List[Frame]) -> List[Tuple[bytes, bytes, str]]:
+    return [(f.raw_encoded, f.raw_decoded, f.status.name) for f in frames]
+
+
 def _define_py_test(ctx: Context) -> PyTest:
     data, expected_frames = ctx.test_case
 
@@ -383,6 +396,10 @@ def _define_py_test(ctx: Context) -> PyTest:
         self.assertEqual(expected_frames,
                          decoded_frames,
                          msg=f'{ctx.group} (byte-by-byte): {data!r}')
+        # Bulk decoding matches the state machine exactly
+        self.assertEqual(_frame_fields(_decode_with_state_machine(data)),
+                         _frame_fields(list(FrameDecoder().process(data))),
+                         msg=f'{ctx.group} (state machine): {data!r}')
 
     return test
 
@@ -451,6 +468,66 @@ def _ts_test(ctx: Context) -> Iterator[str]:
 # Class that tests all cases in TEST_CASES.
 DecoderTest = _TESTS.python_tests('DecoderTest', _define_py_test)
 
+
+class BulkDecodeTest(unittest.TestCase):
+    """Compares bulk decoding to the byte-by-byte state machine."""
+    def setUp(self) -> None:
+        self._rng = random.Random(0x7E)
+
+    def _random_stream(self) -> bytes:
+        chunks = []
+        for _ in range(self._rng.randint(1, 20)):
+            choice = self._rng.random()
+            if choice < 0.6:
+                payload = bytes(
+                    self._rng.choice(b'\x7e\x7d\x5d\x5eabc')
+                    for _ in range(self._rng.randint(0, 12)))
+                chunks.append(
+                    _encode(self._rng.randint(0, 300),
+                            self._rng.randint(0, 255), payload))
+            else:
+                chunks.append(
+                    bytes(
+                        self._rng.choice(b'\x7e\x7d\x5d\x5e\x00\x01')
+                        for _ in range(self._rng.randint(1, 8))))
+        return b''.join(chunks)
+
+    def test_matches_state_machine(self) -> None:
+        for _ in range(500):
+            data = self._random_stream()
+            expected = _frame_fields(_decode_with_state_machine(data))
+
+            self.assertEqual(expected,
+                             _frame_fields(list(FrameDecoder().process(data))),
+                             msg=repr(data))
+
+    def test_matches_state_machine_with_random_splits(self) -> None:
+        for _ in range(500):
+            data = self._random_stream()
+            expected = _frame_fields(_decode_with_state_machine(data))
+
+            decoder = FrameDecoder()
+            frames: List[Frame] = []
+            pos = 0
+            while pos < len(data):
+                end = pos + self._rng.randint(1, 16)
+                frames += decoder.process(data[pos:end])
+                pos = end
+
+            self.assertEqual(expected, _frame_fields(frames), msg=repr(data))
+
+    def test_accepts_bytearray_and_memoryview(self) -> None:
+        data = _encode(1, 2, b'\x7e\x7d') * 2
+        expected = _frame_fields(list(FrameDecoder().process(data)))
+
+        self.assertEqual(
+            expected,
+            _frame_fields(list(FrameDecoder().process(bytearray(data)))))
+        self.assertEqual(
+            expected,
+            _frame_fields(list(FrameDecoder().process(memoryview(data)))))
+
+
 if __name__ == '__main__':
     args = parse_test_generation_args()
     if args.generate_cc_test:
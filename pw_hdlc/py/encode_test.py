@@ -16,6 +16,7 @@
 
 import unittest
 
+from pw_hdlc import decode
 from pw_hdlc import encode
 from pw_hdlc import protocol
 from pw_hdlc.protocol import frame_check_sequence as _fcs
@@ -57,5 +58,36 @@ class TestEncodeUIFrame(unittest.TestCase):
             _fcs(b'\x7d\x03A\x7e\x7dBC') + FLAG)
 
 
+class TestFrameEncoder(unittest.TestCase):
+    """Tests encoding frames with a FrameEncoder."""
+    def setUp(self) -> None:
+        self._encoder = encode.FrameEncoder()
+
+    def test_ui_frame_matches_function(self):
+        for address, data in [(0, b''), (0x1a, b'A'), (128, b'123456789'),
+                              (0x3e, b'\x7d'), (0x3e, b'A\x7e\x7dBC'),
+                              (2**64 - 1, b'\x7e' * 10)]:
+            self.assertEqual(self._encoder.ui_frame(address, data),
+                             encode.ui_frame(address, data))
+
+    def test_ui_frames_empty(self):
+        self.assertEqual(self._encoder.ui_frames([]), b'')
+
+    def test_ui_frames_matches_function(self):
+        frames = [(0, b'A'), (0x3e, b'\x7d\x7e'), (0, b''), (128, b'xyz'),
+                  (0x3e, b'')]
+        self.assertEqual(
+            self._encoder.ui_frames(frames), b''.join(
+                encode.ui_frame(address, data) for address, data in frames))
+
+    def test_ui_frames_decode(self):
+        frames = [(address, bytes(range(address))) for address in range(200)]
+        decoded = list(decode.FrameDecoder().process(
+            self._encoder.ui_frames(frames)))
+
+        self.assertEqual([(f.address, f.data) for f in decoded], frames)
+        self.assertTrue(all(f.ok() for f in decoded))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -25,6 +25,9 @@ _LOG = logging.getLogger('pw_hdlc')
 NO_ADDRESS = -1
 _MIN_FRAME_SIZE = 6  # 1 B address + 1 B control + 4 B CRC-32
 
+_FLAG_BYTE = bytes([protocol.FLAG])
+_ESCAPE_BYTE = bytes([protocol.ESCAPE])
+
 
 class FrameStatus(enum.Enum):
     """Indicates that an error occurred."""
@@ -105,6 +108,33 @@ def _check_frame(frame_data: bytes) -> FrameStatus:
     return FrameStatus.OK
 
 
+_ESCAPED_FLAG = bytes([protocol.ESCAPE, protocol.escape(protocol.FLAG)])
+_ESCAPED_ESCAPE = bytes([protocol.ESCAPE, protocol.escape(protocol.ESCAPE)])
+
+
+def _unescape(data: bytes) -> Optional[bytes]:
+    """Unescapes the contents of a frame in a single pass.
+
+    Returns None if the data contains an invalid or incomplete escape sequence.
+    These frames are left to the byte-by-byte state machine.
+    """
+    escapes = data.count(protocol.ESCAPE)
+    if not escapes:
+        return data
+
+    # Since neither escaped byte is itself an escape, these sequences never
+    # overlap. If they account for every escape, all escapes are valid.
+    escaped_flags = data.count(_ESCAPED_FLAG)
+    if escapes != escaped_flags + data.count(_ESCAPED_ESCAPE):
+        return None
+
+    # Unescape flags first so that 7d 5d 5e decodes to 7d 5e, not 7e.
+    if escaped_flags:
+        data = data.replace(_ESCAPED_FLAG, _FLAG_BYTE)
+
+    return data.replace(_ESCAPED_ESCAPE, _ESCAPE_BYTE)
+
+
 class FrameDecoder:
     """Decodes one or more HDLC frames from a stream of data."""
     def __init__(self):
@@ -118,10 +148,50 @@ class FrameDecoder:
         The ok() method on Frame indicates whether it is valid or represents a
         frame parsing error.
 
+        Complete frames are located with bytes.find() and unescaped in bulk.
+        The byte-by-byte state machine is only used to finish a frame started
+        in a previous call, for the partial frame at the end of the data, and
+        for frames with invalid escapes.
+
         Yields:
           Frames, which may be valid (frame.ok()) or corrupt (!frame.ok())
         """
-        for byte in data:
+        data = bytes(data)
+        pos = 0
+
+        while pos < len(data):
+            if not self._at_frame_start():
+                frame = self._process_byte(data[pos])
+                pos += 1
+                if frame:
+                    yield frame
+                continue
+
+            end = data.find(_FLAG_BYTE, pos)
+            if end == -1:  # Partial frame; decode it byte by byte.
+                break
+
+            segment = data[pos:end]
+            decoded = _unescape(segment)
+            if decoded is None:  # Let the state machine handle the error.
+                for byte in data[pos:end + 1]:
+                    frame = self._process_byte(byte)
+                    if frame:
+                        yield frame
+                pos = end + 1
+                continue
+
+            pos = end + 1
+
+            if not self._raw_data and not segment:
+                self._raw_data.append(protocol.FLAG)
+                continue
+
+            raw_encoded = b''.join([self._raw_data, segment, _FLAG_BYTE])
+            self._raw_data.clear()
+            yield Frame(raw_encoded, decoded, _check_frame(decoded))
+
+        for byte in data[pos:]:
             frame = self._process_byte(byte)
             if frame:
                 yield frame
@@ -136,6 +206,11 @@ class FrameDecoder:
                              frame.status.value, len(frame.raw_encoded))
                 _LOG.debug('Discarded data: %s', frame.raw_encoded)
 
+    def _at_frame_start(self) -> bool:
+        """True if no frame data has been received since the last flag."""
+        return (self._state is _State.FRAME and not self._decoded_data
+                and len(self._raw_data) <= 1)
+
     def _finish_frame(self, status: FrameStatus) -> Frame:
         frame = Frame(bytes(self._raw_data), bytes(self._decoded_data), status)
         self._raw_data.clear()
@@ -13,10 +13,15 @@
 # the License.
 """The encode module supports encoding HDLC frames."""
 
+from typing import Dict, Iterable, Tuple
+import zlib
+
 from pw_hdlc import protocol
 
 _ESCAPE_BYTE = bytes([protocol.ESCAPE])
 _FLAG_BYTE = bytes([protocol.FLAG])
+_ESCAPED_ESCAPE = b'\x7d\x5d'
+_ESCAPED_FLAG = b'\x7d\x5e'
 
 
 def ui_frame(address: int, data: bytes) -> bytes:
@@ -27,3 +32,56 @@ def ui_frame(address: int, data: bytes) -> bytes:
     frame = frame.replace(_ESCAPE_BYTE, b'\x7d\x5d')
     frame = frame.replace(_FLAG_BYTE, b'\x7d\x5e')
     return b''.join([_FLAG_BYTE, frame, _FLAG_BYTE])
+
+
+def _escape(data: bytes) -> bytes:
+    return data.replace(_ESCAPE_BYTE,
+                        _ESCAPED_ESCAPE).replace(_FLAG_BYTE, _ESCAPED_FLAG)
+
+
+class FrameEncoder:
+    """Encodes HDLC UI-frames, optionally many at once into one buffer.
+
+    The output is identical to calling ui_frame() for each frame and joining
+    the results. The escaped address and control bytes and their CRC-32 are
+    computed once per address and cached. The frame check sequence is computed
+    incrementally over the payload, so frames are never concatenated before
+    escaping.
+    """
+    def __init__(self) -> None:
+        # Address -> (escaped address and control fields, CRC-32 of fields)
+        self._headers: Dict[int, Tuple[bytes, int]] = {}
+
+    def ui_frame(self, address: int, data: bytes) -> bytes:
+        """Encodes an HDLC UI-frame with a CRC-32 frame check sequence."""
+        buffer = bytearray()
+        self._append_ui_frame(buffer, address, data)
+        return bytes(buffer)
+
+    def ui_frames(self, frames: Iterable[Tuple[int, bytes]]) -> bytes:
+        """Encodes (address, data) tuples as consecutive HDLC UI-frames."""
+        buffer = bytearray()
+        for address, data in frames:
+            self._append_ui_frame(buffer, address, data)
+        return bytes(buffer)
+
+    def _header(self, address: int) -> Tuple[bytes, int]:
+        try:
+            return self._headers[address]
+        except KeyError:
+            header = protocol.encode_address(
+                address) + protocol.UFrameControl.unnumbered_information().data
+            self._headers[address] = result = (_escape(header),
+                                               zlib.crc32(header))
+            return result
+
+    def _append_ui_frame(self, buffer: bytearray, address: int,
+                         data: bytes) -> None:
+        header, header_crc = self._header(address)
+        fcs = zlib.crc32(data, header_crc).to_bytes(4, 'little')
+
+        buffer += _FLAG_BYTE
+        buffer += header
+        buffer += _escape(data)
+        buffer += _escape(fcs)
+        buffer += _FLAG_BYTE
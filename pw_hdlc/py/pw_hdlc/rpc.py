@@ -13,21 +13,26 @@
 # the License.
 """Utilities for using HDLC with pw_rpc."""
 
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import contextlib
+from dataclasses import dataclass, field
 import io
 import logging
 from queue import SimpleQueue
+import selectors
 import sys
 import threading
 import time
 import socket
 import subprocess
-from typing import (Any, BinaryIO, Callable, Dict, Iterable, List, NoReturn,
-                    Optional, Sequence, Union)
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List,
+                    NoReturn, Optional, Sequence, Union)
 
 from pw_protobuf_compiler import python_protos
 import pw_rpc
-from pw_rpc import callback_client
+from pw_rpc import asyncio_client, callback_client
+from pw_status import Status
 
 from pw_hdlc.decode import Frame, FrameDecoder
 from pw_hdlc import encode
@@ -54,14 +59,77 @@ def channel_output(writer: Callable[[bytes], Any],
 
         return lambda data: slow_write(encode.ui_frame(address, data))
 
+    encoder = encode.FrameEncoder()
+
     def write_hdlc(data: bytes):
-        frame = encode.ui_frame(address, data)
+        frame = encoder.ui_frame(address, data)
         _LOG.log(_VERBOSE, 'Write %2d B: %s', len(frame), frame)
         writer(frame)
 
     return write_hdlc
 
 
+class BatchedChannelOutput:
+    """A channel output that can flush many RPC packets with one write.
+
+    Packets are encoded and written immediately, like channel_output(), unless
+    a batch is open. Packets sent while a batch is open, from any thread, are
+    held until the outermost batch closes. They are then encoded into one
+    buffer and passed to a single writer() call.
+
+    .. code-block:: python
+
+      output = BatchedChannelOutput(serial_device.write)
+      client = HdlcRpcClient(..., [pw_rpc.Channel(1, output)])
+
+      with output.batch():
+          for message in messages:
+              call.send(message)
+    """
+    def __init__(self,
+                 writer: Callable[[bytes], Any],
+                 address: int = DEFAULT_ADDRESS) -> None:
+        self._writer = writer
+        self._address = address
+        self._encoder = encode.FrameEncoder()
+        self._lock = threading.Lock()
+        self._batch_depth = 0
+        self._pending: List[bytes] = []
+
+    def __call__(self, packet: bytes) -> None:
+        with self._lock:
+            if self._batch_depth:
+                self._pending.append(packet)
+                return
+
+        self._write(self._encoder.ui_frame(self._address, packet))
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Holds packets sent within the block and writes them at once."""
+        with self._lock:
+            self._batch_depth += 1
+
+        try:
+            yield
+        finally:
+            packets: List[bytes] = []
+
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    packets, self._pending = self._pending, []
+
+            if packets:
+                self._write(
+                    self._encoder.ui_frames(
+                        (self._address, packet) for packet in packets))
+
+    def _write(self, frames: bytes) -> None:
+        _LOG.log(_VERBOSE, 'Write %2d B: %s', len(frames), frames)
+        self._writer(frames)
+
+
 def _handle_error(frame: Frame) -> None:
     _LOG.error('Failed to parse frame: %s', frame.status.value)
     _LOG.debug('%s', frame.data)
@@ -191,6 +259,511 @@ class HdlcRpcClient:
             _LOG.error('Packet not handled by RPC client: %s', packet)
 
 
+class AsyncHdlcRpcClient:
+    """An RPC client that reads and decodes HDLC frames in an asyncio loop.
+
+    Unlike HdlcRpcClient, no threads are used. Data is read from an
+    asyncio.StreamReader, and frames are decoded and passed to the pw_rpc
+    client directly in the event loop. One loop can drive the RPC clients for
+    many devices.
+
+    RPC callbacks are invoked from the event loop, so they must not block.
+    Blocking callback_client calls (e.g. calling a unary RPC directly) must not
+    be made from the event loop thread. Pass an asyncio_client.Impl as the
+    client_impl to await RPCs instead.
+    """
+    def __init__(self,
+                 reader: asyncio.StreamReader,
+                 paths_or_modules: PathsModulesOrProtoLibrary,
+                 channels: Iterable[pw_rpc.Channel],
+                 output: Callable[[bytes], Any] = write_to_file,
+                 client_impl: pw_rpc.client.ClientImpl = None,
+                 *,
+                 frame_handlers: Optional[FrameHandlers] = None,
+                 read_size: int = 4096) -> None:
+        """Creates an RPC client that reads from an asyncio.StreamReader.
+
+        Call start() or await run() to begin processing data.
+
+        Args:
+          reader: stream from which to read HDLC-encoded data
+          paths_or_modules: paths to .proto files or proto modules
+          channels: RPC channels to use for output
+          output: where to write "stdout" output from the device
+          client_impl: the pw_rpc ClientImpl; defaults to callback_client
+          frame_handlers: handlers for frames to other HDLC addresses
+          read_size: maximum number of bytes to request per read
+        """
+        if isinstance(paths_or_modules, python_protos.Library):
+            self.protos = paths_or_modules
+        else:
+            self.protos = python_protos.Library.from_paths(paths_or_modules)
+
+        if client_impl is None:
+            client_impl = callback_client.Impl()
+
+        self.client = pw_rpc.Client.from_modules(client_impl, channels,
+                                                 self.protos.modules())
+        self._asyncio_impl: Optional[asyncio_client.Impl] = (
+            client_impl
+            if isinstance(client_impl, asyncio_client.Impl) else None)
+
+        self._reader = reader
+        self._read_size = read_size
+        self._decoder = FrameDecoder()
+        self._task: Optional['asyncio.Task[None]'] = None
+        self._close_transport: Callable[[], Any] = lambda: None
+
+        self._frame_handlers: FrameHandlers = dict(frame_handlers or {})
+        self._frame_handlers[DEFAULT_ADDRESS] = self._handle_rpc_frame
+        self._frame_handlers[STDOUT_ADDRESS] = lambda frame: output(frame.data)
+
+    @classmethod
+    async def connect(cls,
+                      host: str,
+                      port: int,
+                      paths_or_modules: PathsModulesOrProtoLibrary,
+                      output: Callable[[bytes], Any] = write_to_file,
+                      client_impl: pw_rpc.client.ClientImpl = None,
+                      **kwargs) -> 'AsyncHdlcRpcClient':
+        """Connects to a socket and starts an AsyncHdlcRpcClient for it.
+
+        The client uses the default channels for the socket's writer.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        client = cls(reader, paths_or_modules, default_channels(writer.write),
+                     output, client_impl, **kwargs)
+        client._close_transport = writer.close
+        client.start()
+        return client
+
+    @classmethod
+    async def open_file(cls,
+                        file: BinaryIO,
+                        paths_or_modules: PathsModulesOrProtoLibrary,
+                        output: Callable[[bytes], Any] = write_to_file,
+                        client_impl: pw_rpc.client.ClientImpl = None,
+                        **kwargs) -> 'AsyncHdlcRpcClient':
+        """Starts an AsyncHdlcRpcClient that reads a file's descriptor.
+
+        This is used for serial ports (e.g. a pyserial Serial object), pipes,
+        and other character devices. Reads are done by the event loop from
+        file.fileno(); RPC packets are written with file.write(). close()
+        closes the file.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), file)
+
+        client = cls(reader, paths_or_modules, default_channels(file.write),
+                     output, client_impl, **kwargs)
+        client._close_transport = transport.close
+        client.start()
+        return client
+
+    def start(self) -> 'asyncio.Task[None]':
+        """Starts a task in the running event loop that processes data."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+        return self._task
+
+    async def run(self) -> None:
+        """Reads and processes data until the stream ends.
+
+        With an asyncio_client.Impl, frame processing pauses while any call's
+        response buffer is full, which stops reads from the device.
+        """
+        impl = self._asyncio_impl
+
+        while True:
+            data = await self._reader.read(self._read_size)
+            if not data:
+                _LOG.debug('HDLC RPC stream closed')
+                return
+
+            if impl is None:
+                self.process_data(data)
+                continue
+
+            _LOG.log(_VERBOSE, 'Read %2d B: %s', len(data), data)
+            for frame in self._decoder.process(data):
+                self._handle_frame(frame)
+
+                if impl.backpressured():
+                    await impl.wait_for_capacity()
+
+    def process_data(self, data: bytes) -> None:
+        """Decodes HDLC frames from data and dispatches them to handlers."""
+        _LOG.log(_VERBOSE, 'Read %2d B: %s', len(data), data)
+
+        for frame in self._decoder.process(data):
+            self._handle_frame(frame)
+
+    def _handle_frame(self, frame: Frame) -> None:
+        if not frame.ok():
+            _handle_error(frame)
+            return
+
+        try:
+            handler = self._frame_handlers[frame.address]
+        except KeyError:
+            _LOG.warning('Unhandled frame for address %d: %s', frame.address,
+                         frame)
+            return
+
+        try:
+            handler(frame)
+        except:  # pylint: disable=bare-except
+            _LOG.exception('Exception in HDLC frame handler')
+
+    async def close(self) -> None:
+        """Stops processing data and closes the connection, if any."""
+        self._close_transport()
+
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def rpcs(self, channel_id: int = None) -> Any:
+        """Returns object for accessing services on the specified channel."""
+        if channel_id is None:
+            return next(iter(self.client.channels())).rpcs
+
+        return self.client.channel(channel_id).rpcs
+
+    def _handle_rpc_frame(self, frame: Frame) -> None:
+        status = self.client.process_packet(frame.data)
+        if status is not Status.OK:
+            _LOG.error('Packet not handled by RPC client (%s): %s', status,
+                       frame.data)
+
+
+@dataclass
+class DeviceStats:
+    """Counters for a device connected to an HdlcRpcHub."""
+    bytes_read: int = 0
+    frames: int = 0
+    frame_errors: int = 0
+    unhandled_packets: int = 0
+    read_errors: int = 0
+    start_time: float = field(default_factory=time.monotonic)
+
+    def read_bytes_per_second(self) -> float:
+        """Average read throughput since the device was added."""
+        elapsed = time.monotonic() - self.start_time
+        return self.bytes_read / elapsed if elapsed > 0 else 0.0
+
+
+class HubDevice:
+    """The pw_rpc client and HDLC decoder for one device in an HdlcRpcHub."""
+
+    # Consecutive failed reads, other than OSErrors, before giving up.
+    max_read_errors = 10
+
+    def __init__(self,
+                 name: str,
+                 fileno: int,
+                 read: Callable[[], bytes],
+                 client: pw_rpc.Client,
+                 frame_handlers: FrameHandlers,
+                 close: Optional[Callable[[], Any]] = None) -> None:
+        self.name = name
+        self.client = client
+        self.stats = DeviceStats()
+
+        self._fileno = fileno
+        self._read = read
+        self._close = close
+        self._consecutive_read_errors = 0
+        self._decoder = FrameDecoder()
+        self._frame_handlers = frame_handlers
+        self._frame_handlers[DEFAULT_ADDRESS] = self._handle_rpc_frame
+
+    def fileno(self) -> int:
+        return self._fileno
+
+    def rpcs(self, channel_id: int = None) -> Any:
+        """Returns object for accessing services on the specified channel."""
+        if channel_id is None:
+            return next(iter(self.client.channels())).rpcs
+
+        return self.client.channel(channel_id).rpcs
+
+    def close(self) -> None:
+        """Closes the device's connection, if a close function was provided."""
+        if self._close is not None:
+            try:
+                self._close()
+            except OSError as exc:
+                _LOG.warning('%s: close failed: %s', self.name, exc)
+
+    def read_and_process(self) -> bool:
+        """Reads available data and handles it.
+
+        Returns False if the device should be removed: at EOF, if reading
+        raises an OSError (e.g. a USB serial device was unplugged), or after
+        max_read_errors consecutive failed reads.
+        """
+        try:
+            data = self._read()
+        except OSError as exc:
+            self.stats.read_errors += 1
+            _LOG.error('%s: read failed: %s', self.name, exc)
+            return False
+        except Exception as exc:  # pylint: disable=broad-except
+            self.stats.read_errors += 1
+            self._consecutive_read_errors += 1
+            if self._consecutive_read_errors >= self.max_read_errors:
+                _LOG.error('%s: read failed %d times in a row: %s', self.name,
+                           self._consecutive_read_errors, exc)
+                return False
+
+            _LOG.warning('%s: read failed: %s', self.name, exc)
+            return True
+
+        self._consecutive_read_errors = 0
+
+        if not data:
+            return False
+
+        _LOG.log(_VERBOSE, '%s: Read %2d B: %s', self.name, len(data), data)
+        self.stats.bytes_read += len(data)
+
+        for frame in self._decoder.process(data):
+            self.stats.frames += 1
+
+            if not frame.ok():
+                self.stats.frame_errors += 1
+                _LOG.error('%s: Failed to parse frame: %s', self.name,
+                           frame.status.value)
+                continue
+
+            try:
+                handler = self._frame_handlers[frame.address]
+            except KeyError:
+                _LOG.warning('%s: Unhandled frame for address %d: %s',
+                             self.name, frame.address, frame)
+                continue
+
+            try:
+                handler(frame)
+            except:  # pylint: disable=bare-except
+                _LOG.exception('%s: Exception in HDLC frame handler',
+                               self.name)
+
+        return True
+
+    def _handle_rpc_frame(self, frame: Frame) -> None:
+        status = self.client.process_packet(frame.data)
+        if status is not Status.OK:
+            self.stats.unhandled_packets += 1
+            _LOG.error('%s: Packet not handled by RPC client (%s): %s',
+                       self.name, status, frame.data)
+
+
+class HdlcRpcHub:
+    """Reads and handles HDLC RPC traffic for many devices in one thread.
+
+    Each device has its own FrameDecoder, pw_rpc.Client, and DeviceStats.
+    Readable devices are found with the selectors module (epoll on Linux), so
+    a single thread serves any number of serial ports and sockets.
+
+    Frame handlers and RPC callbacks run in the hub's thread and must not
+    block, since that would delay every device. Blocking callback_client calls
+    may be made from other threads. Devices may be added and removed from any
+    thread while the hub is running.
+
+    Devices are removed when their connection closes or reading from them
+    fails. The hub then closes them, if it was given a way to.
+    """
+    def __init__(self, read_size: int = 4096) -> None:
+        self.read_size = read_size
+
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._devices: Dict[str, HubDevice] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Writing to this socket wakes the hub thread.
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+
+    def add_device(self,
+                   name: str,
+                   fileno: int,
+                   read: Callable[[], bytes],
+                   write: Callable[[bytes], Any],
+                   paths_or_modules: PathsModulesOrProtoLibrary,
+                   output: Callable[[bytes], Any] = write_to_file,
+                   client_impl: pw_rpc.client.ClientImpl = None,
+                   *,
+                   channels: Optional[Iterable[pw_rpc.Channel]] = None,
+                   frame_handlers: Optional[FrameHandlers] = None,
+                   close: Optional[Callable[[], Any]] = None) -> HubDevice:
+        """Adds a device to the hub.
+
+        Args:
+          name: unique name for the device
+          fileno: file descriptor to wait on before reading
+          read: reads available data without blocking once fileno is readable;
+              returns b'' when the connection is closed
+          write: writes data to the device; used for the default channels
+          paths_or_modules: paths to .proto files, proto modules, or a
+              python_protos.Library, which can be shared between devices
+          output: where to write "stdout" output from the device
+          client_impl: the pw_rpc ClientImpl; defaults to callback_client
+          channels: RPC channels; defaults to default_channels(write)
+          frame_handlers: handlers for frames to other HDLC addresses
+          close: closes the device; called if the hub removes the device
+              because its connection closed or reading from it failed
+        """
+        if isinstance(paths_or_modules, python_protos.Library):
+            protos = paths_or_modules
+        else:
+            protos = python_protos.Library.from_paths(paths_or_modules)
+
+        if client_impl is None:
+            client_impl = callback_client.Impl()
+
+        if channels is None:
+            channels = default_channels(write)
+
+        handlers: FrameHandlers = dict(frame_handlers or {})
+        handlers[STDOUT_ADDRESS] = lambda frame: output(frame.data)
+
+        device = HubDevice(name,
+                           fileno,
+                           read,
+                           pw_rpc.Client.from_modules(client_impl, channels,
+                                                      protos.modules()),
+                           handlers,
+                           close=close)
+
+        with self._lock:
+            if name in self._devices:
+                raise ValueError(f'A device named {name!r} was already added')
+
+            self._devices[name] = device
+            self._selector.register(fileno, selectors.EVENT_READ, device)
+
+        # Not every selector sees changes made while it is waiting, so wake the
+        # hub thread to wait on the new device.
+        self._wake()
+        return device
+
+    def add_socket(self, name: str, sock: socket.socket,
+                   paths_or_modules: PathsModulesOrProtoLibrary,
+                   **kwargs) -> HubDevice:
+        """Adds a device connected through a socket."""
+        kwargs.setdefault('close', sock.close)
+        return self.add_device(name, sock.fileno(),
+                               lambda: sock.recv(self.read_size), sock.sendall,
+                               paths_or_modules, **kwargs)
+
+    def add_serial(self, name: str, serial_device: Any,
+                   paths_or_modules: PathsModulesOrProtoLibrary,
+                   **kwargs) -> HubDevice:
+        """Adds a device connected through a pyserial Serial object."""
+        def read() -> bytes:
+            return serial_device.read(
+                min(max(serial_device.in_waiting, 1), self.read_size))
+
+        kwargs.setdefault('close', serial_device.close)
+        return self.add_device(name, serial_device.fileno(), read,
+                               serial_device.write, paths_or_modules, **kwargs)
+
+    def remove_device(self, name: str) -> HubDevice:
+        """Stops reading from a device. Does not close its file or socket."""
+        with self._lock:
+            device = self._devices.pop(name)
+            self._selector.unregister(device.fileno())
+
+        return device
+
+    def device(self, name: str) -> HubDevice:
+        return self._devices[name]
+
+    def devices(self) -> List[HubDevice]:
+        with self._lock:
+            return list(self._devices.values())
+
+    def stats(self) -> Dict[str, DeviceStats]:
+        """Returns the DeviceStats for each device by name."""
+        with self._lock:
+            return {name: dev.stats for name, dev in self._devices.items()}
+
+    def start(self) -> None:
+        """Starts a daemon thread that serves the devices."""
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run,
+                                            name='HdlcRpcHub',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the hub thread. Devices remain registered."""
+        if self._thread is not None:
+            self._running = False
+            self._wake()
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+        self._selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def __enter__(self) -> 'HdlcRpcHub':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def poll(self, timeout: Optional[float] = None) -> int:
+        """Reads and handles data from readable devices.
+
+        Returns the number of devices that were read.
+        """
+        devices_read = 0
+
+        for key, _ in self._selector.select(timeout):
+            device: Optional[HubDevice] = key.data
+            if device is None:  # The wake socket
+                with contextlib.suppress(BlockingIOError):
+                    self._wake_reader.recv(4096)
+                continue
+
+            devices_read += 1
+            if not device.read_and_process():
+                _LOG.info('%s: Removing device', device.name)
+                try:
+                    self.remove_device(device.name)
+                except KeyError:  # Already removed by another thread
+                    continue
+
+                device.close()
+
+        return devices_read
+
+    def _wake(self) -> None:
+        with contextlib.suppress(BlockingIOError):
+            self._wake_writer.send(b'\0')
+
+    def _run(self) -> None:
+        while self._running:
+            self.poll()
+
+
 def _try_connect(port: int, attempts: int = 10) -> socket.socket:
     """Tries to connect to the specified port up to the given number of times.
 
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests the pw_hdlc.rpc module."""
+
+import asyncio
+import os
+import selectors
+import socket
+import threading
+from typing import List
+import unittest
+from unittest import mock
+
+from pw_protobuf_compiler import python_protos
+import pw_rpc
+from pw_rpc import asyncio_client, packets
+from pw_rpc.internal import packet_pb2
+from pw_status import Status
+
+from pw_hdlc import encode
+from pw_hdlc.decode import FrameDecoder
+from pw_hdlc.rpc import (AsyncHdlcRpcClient, BatchedChannelOutput,
+                         DEFAULT_ADDRESS, HdlcRpcHub, STDOUT_ADDRESS)
+
+_PROTO = """\
+syntax = "proto3";
+
+package pw.hdlc.test;
+
+message Number {
+  uint32 value = 1;
+}
+
+service TestService {
+  rpc Count(Number) returns (stream Number) {}
+}
+"""
+
+
+class BatchedChannelOutputTest(unittest.TestCase):
+    """Tests combining RPC packets into one write."""
+    def setUp(self) -> None:
+        self._writes: List[bytes] = []
+        self._output = BatchedChannelOutput(self._writes.append)
+
+    def test_writes_immediately_without_batch(self) -> None:
+        self._output(b'one')
+        self._output(b'two')
+
+        self.assertEqual(self._writes, [
+            encode.ui_frame(DEFAULT_ADDRESS, b'one'),
+            encode.ui_frame(DEFAULT_ADDRESS, b'two'),
+        ])
+
+    def test_batch_writes_once(self) -> None:
+        with self._output.batch():
+            self._output(b'one')
+            self._output(b'\x7e\x7d')
+            self._output(b'three')
+            self.assertEqual(self._writes, [])
+
+        self.assertEqual(self._writes, [
+            encode.ui_frame(DEFAULT_ADDRESS, b'one') +
+            encode.ui_frame(DEFAULT_ADDRESS, b'\x7e\x7d') +
+            encode.ui_frame(DEFAULT_ADDRESS, b'three')
+        ])
+
+    def test_nested_batches_write_at_outermost(self) -> None:
+        with self._output.batch():
+            self._output(b'one')
+            with self._output.batch():
+                self._output(b'two')
+            self.assertEqual(self._writes, [])
+
+        self.assertEqual(self._writes, [
+            encode.ui_frame(DEFAULT_ADDRESS, b'one') +
+            encode.ui_frame(DEFAULT_ADDRESS, b'two')
+        ])
+
+    def test_empty_batch_does_not_write(self) -> None:
+        with self._output.batch():
+            pass
+
+        self.assertEqual(self._writes, [])
+
+    def test_batch_writes_on_exception(self) -> None:
+        with self.assertRaises(ValueError):
+            with self._output.batch():
+                self._output(b'one')
+                raise ValueError
+
+        self.assertEqual(self._writes,
+                         [encode.ui_frame(DEFAULT_ADDRESS, b'one')])
+
+
+def _server_stream_frame(method, value: int) -> bytes:
+    packet = packet_pb2.RpcPacket(
+        type=packet_pb2.PacketType.SERVER_STREAM,
+        channel_id=1,
+        service_id=method.service.id,
+        method_id=method.id,
+        payload=method.response_type(value=value).SerializeToString())
+    return encode.ui_frame(DEFAULT_ADDRESS, packet.SerializeToString())
+
+
+class AsyncHdlcRpcClientTest(unittest.TestCase):
+    """Tests the asyncio HDLC RPC client."""
+    def setUp(self) -> None:
+        self._protos = python_protos.Library.from_strings(_PROTO)
+
+    def test_stream_reader(self) -> None:
+        output: List[bytes] = []
+        responses: List[int] = []
+
+        async def run() -> None:
+            reader = asyncio.StreamReader()
+            client = AsyncHdlcRpcClient(reader,
+                                        self._protos,
+                                        [pw_rpc.Channel(1, lambda _: None)],
+                                        output=output.append)
+            count = client.rpcs().pw.hdlc.test.TestService.Count
+            count.invoke(on_next=lambda _, res: responses.append(res.value))
+
+            method = count.method
+            reader.feed_data(b''.join(
+                _server_stream_frame(method, i)
+                for i in range(5)) + encode.ui_frame(STDOUT_ADDRESS, b'hello'))
+            reader.feed_eof()
+
+            await client.start()
+
+        asyncio.run(run())
+
+        self.assertEqual(responses, [0, 1, 2, 3, 4])
+        self.assertEqual(output[-1], b'hello')
+
+    def test_asyncio_client_backpressure(self) -> None:
+        impl = asyncio_client.Impl(max_buffered_responses=2)
+
+        async def run() -> None:
+            reader = asyncio.StreamReader()
+            client = AsyncHdlcRpcClient(reader,
+                                        self._protos,
+                                        [pw_rpc.Channel(1, lambda _: None)],
+                                        client_impl=impl)
+            count = client.rpcs().pw.hdlc.test.TestService.Count
+            call = count.invoke()
+
+            reader.feed_data(b''.join(
+                _server_stream_frame(count.method, i) for i in range(6)))
+            reader.feed_eof()
+            task = client.start()
+
+            await asyncio.sleep(0.01)
+            self.assertEqual(call.buffered_responses(), 2)
+            self.assertFalse(task.done())
+
+            values = [r.value async for r in call.get_responses(count=6)]
+            await asyncio.wait_for(task, timeout=5)
+
+            self.assertEqual(values, list(range(6)))
+            self.assertEqual(call.dropped_responses, 0)
+
+        asyncio.run(run())
+
+    def test_connect(self) -> None:
+        responses: List[int] = []
+
+        async def run() -> None:
+            requests: 'asyncio.Queue[bytes]' = asyncio.Queue()
+
+            async def serve(reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+                decoder = FrameDecoder()
+                while True:
+                    data = await reader.read(4096)
+                    if not data:
+                        return
+
+                    method = client.client.method(
+                        'pw.hdlc.test.TestService.Count')
+                    for frame in decoder.process(data):
+                        await requests.put(frame.data)
+                        for i in range(3):
+                            writer.write(_server_stream_frame(method, i))
+                        await writer.drain()
+
+            server = await asyncio.start_server(serve, 'localhost', 0)
+            port = server.sockets[0].getsockname()[1]
+
+            client = await AsyncHdlcRpcClient.connect('localhost', port,
+                                                      self._protos)
+            count = client.rpcs().pw.hdlc.test.TestService.Count
+            done = asyncio.Event()
+
+            def on_next(_, response) -> None:
+                responses.append(response.value)
+                if len(responses) == 3:
+                    done.set()
+
+            count.invoke(count.request(value=3), on_next=on_next)
+            request = packets.decode(await asyncio.wait_for(requests.get(),
+                                                            timeout=5))
+            await asyncio.wait_for(done.wait(), timeout=5)
+
+            self.assertEqual(request.method_id, count.method.id)
+            await client.close()
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(run())
+
+        self.assertEqual(responses[:3], [0, 1, 2])
+
+    def test_open_file(self) -> None:
+        output: List[bytes] = []
+
+        async def run() -> None:
+            read_fd, write_fd = os.pipe()
+            client = await AsyncHdlcRpcClient.open_file(os.fdopen(read_fd,
+                                                                  'rb',
+                                                                  buffering=0),
+                                                        self._protos,
+                                                        output=output.append)
+
+            os.write(write_fd, encode.ui_frame(STDOUT_ADDRESS, b'hello'))
+            os.close(write_fd)
+            await asyncio.wait_for(client.start(), timeout=5)
+            await client.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(output, [b'hello'])
+
+    def test_invalid_packet_is_logged(self) -> None:
+        async def run() -> None:
+            reader = asyncio.StreamReader()
+            client = AsyncHdlcRpcClient(reader, self._protos,
+                                        [pw_rpc.Channel(1, lambda _: None)])
+
+            with self.assertLogs('pw_hdlc.rpc', 'ERROR') as logs:
+                client.process_data(encode.ui_frame(DEFAULT_ADDRESS, b'\xff'))
+
+            self.assertIn(str(Status.DATA_LOSS), logs.output[0])
+
+        asyncio.run(run())
+
+
+class HdlcRpcHubTest(unittest.TestCase):
+    """Tests serving many devices from one thread."""
+    def setUp(self) -> None:
+        self._protos = python_protos.Library.from_strings(_PROTO)
+        self._hub = HdlcRpcHub()
+        self._sockets: List[socket.socket] = []
+        self._output: List[bytes] = []
+
+    def tearDown(self) -> None:
+        self._hub.close()
+        for sock in self._sockets:
+            sock.close()
+
+    def _add_devices(self, count: int) -> List[socket.socket]:
+        device_ends = []
+        for i in range(count):
+            hub_end, device_end = socket.socketpair()
+            self._sockets += [hub_end, device_end]
+            device_ends.append(device_end)
+            self._hub.add_socket(f'device{i}',
+                                 hub_end,
+                                 self._protos,
+                                 output=self._output.append)
+        return device_ends
+
+    def test_dispatches_to_each_device(self) -> None:
+        device_ends = self._add_devices(10)
+        responses: List[List[int]] = [[] for _ in device_ends]
+
+        for i, device in enumerate(self._hub.devices()):
+            count = device.rpcs().pw.hdlc.test.TestService.Count
+            count.invoke(
+                on_next=lambda _, res, i=i: responses[i].append(res.value))
+
+        method = self._hub.device('device0').client.method(
+            'pw.hdlc.test.TestService.Count')
+        for i, device_end in enumerate(device_ends):
+            device_end.sendall(b''.join(
+                _server_stream_frame(method, value) for value in range(i)))
+
+        while self._hub.poll(timeout=0):
+            pass
+
+        self.assertEqual(responses, [list(range(i)) for i in range(10)])
+
+        stats = self._hub.stats()
+        self.assertEqual([stats[f'device{i}'].frames for i in range(10)],
+                         list(range(10)))
+        self.assertEqual(
+            stats['device3'].bytes_read,
+            sum(len(_server_stream_frame(method, i)) for i in range(3)))
+
+    def test_requests_written_to_device(self) -> None:
+        device_end, = self._add_devices(1)
+        count = self._hub.device(
+            'device0').rpcs().pw.hdlc.test.TestService.Count
+        count.invoke(count.request(value=5))
+
+        frame, = FrameDecoder().process(device_end.recv(4096))
+        packet = packets.decode(frame.data)
+        self.assertEqual(packet.method_id, count.method.id)
+
+    def test_counts_frame_errors(self) -> None:
+        device_end, = self._add_devices(1)
+        device_end.sendall(b'~garbage~~~' +
+                           encode.ui_frame(STDOUT_ADDRESS, b''))
+
+        with self.assertLogs('pw_hdlc.rpc', 'ERROR'):
+            self._hub.poll(timeout=0)
+
+        stats = self._hub.device('device0').stats
+        self.assertEqual(stats.frame_errors, 2)
+        self.assertEqual(stats.frames, 3)
+        self.assertEqual(self._output, [b''])
+
+    def test_removes_closed_device(self) -> None:
+        device_end, = self._add_devices(1)
+        device_end.close()
+
+        self._hub.poll(timeout=0)
+        self.assertEqual(self._hub.devices(), [])
+        self.assertEqual(self._sockets[0].fileno(), -1)
+
+    def _add_failing_device(self, error: Exception) -> mock.Mock:
+        hub_end, device_end = socket.socketpair()
+        self._sockets += [hub_end, device_end]
+        device_end.sendall(b'data')  # Keep the device readable.
+
+        close = mock.Mock()
+        self._hub.add_device('failing',
+                             hub_end.fileno(),
+                             mock.Mock(side_effect=error),
+                             hub_end.sendall,
+                             self._protos,
+                             close=close)
+        return close
+
+    def test_removes_device_when_read_raises_os_error(self) -> None:
+        close = self._add_failing_device(OSError('device unplugged'))
+
+        with self.assertLogs('pw_hdlc.rpc', 'ERROR'):
+            self._hub.poll(timeout=0)
+
+        self.assertEqual(self._hub.devices(), [])
+        close.assert_called_once_with()
+        self.assertEqual(self._hub.poll(timeout=0), 0)
+
+    def test_removes_device_after_repeated_read_errors(self) -> None:
+        close = self._add_failing_device(ValueError('bad read'))
+        device = self._hub.device('failing')
+
+        with self.assertLogs('pw_hdlc.rpc', 'WARNING'):
+            for _ in range(device.max_read_errors - 1):
+                self.assertEqual(self._hub.poll(timeout=0), 1)
+
+        self.assertEqual(self._hub.devices(), [device])
+        close.assert_not_called()
+
+        with self.assertLogs('pw_hdlc.rpc', 'ERROR'):
+            self._hub.poll(timeout=0)
+
+        self.assertEqual(self._hub.devices(), [])
+        self.assertEqual(device.stats.read_errors, device.max_read_errors)
+        close.assert_called_once_with()
+
+    def test_thread(self) -> None:
+        device_end, = self._add_devices(1)
+        received = threading.Event()
+        count = self._hub.device(
+            'device0').rpcs().pw.hdlc.test.TestService.Count
+        count.invoke(on_next=lambda *_: received.set())
+
+        self._hub.start()
+        device_end.sendall(
+            _server_stream_frame(
+                self._hub.device('device0').client.method(
+                    'pw.hdlc.test.TestService.Count'), 1))
+
+        self.assertTrue(received.wait(timeout=5))
+        self._hub.stop()
+
+    def test_add_device_while_running(self) -> None:
+        # select() does not see file descriptors added while it waits.
+        self._hub.close()
+        with mock.patch.object(selectors, 'DefaultSelector',
+                               selectors.SelectSelector):
+            self._hub = HdlcRpcHub()
+        self._hub.start()
+
+        device_end, = self._add_devices(1)
+        received = threading.Event()
+        count = self._hub.device(
+            'device0').rpcs().pw.hdlc.test.TestService.Count
+        count.invoke(on_next=lambda *_: received.set())
+
+        device_end.sendall(
+            _server_stream_frame(
+                self._hub.device('device0').client.method(
+                    'pw.hdlc.test.TestService.Count'), 1))
+
+        self.assertTrue(received.wait(timeout=5))
+        self._hub.stop()
+
+    def test_duplicate_name(self) -> None:
+        self._add_devices(1)
+        with self.assertRaises(ValueError):
+            self._add_devices(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
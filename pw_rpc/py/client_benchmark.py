@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Measures server streaming packets processed per second by pw_rpc.Client.
+
+Example:
+
+  python client_benchmark.py --packets 100000 --payload-size 64
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+from pw_protobuf_compiler import python_protos
+from pw_rpc import callback_client, client, packets
+from pw_rpc.internal import packet_pb2
+
+_PROTO = """\
+syntax = "proto3";
+
+package pw.benchmark;
+
+message Payload {
+  bytes data = 1;
+}
+
+service Benchmark {
+  rpc Stream(Payload) returns (stream Payload) {}
+}
+"""
+
+
+def _setup() -> client.Client:
+    protos = python_protos.Library.from_strings(_PROTO)
+    return client.Client.from_modules(callback_client.Impl(),
+                                      [client.Channel(1, lambda _: None)],
+                                      protos.modules())
+
+
+def _server_stream_packets(rpc_client: client.Client, count: int,
+                           payload_size: int) -> List[bytes]:
+    method = rpc_client.method('pw.benchmark.Benchmark.Stream')
+    payload = method.response_type(data=b'?' * payload_size)
+    return [
+        packet_pb2.RpcPacket(
+            type=packet_pb2.PacketType.SERVER_STREAM,
+            channel_id=1,
+            service_id=method.service.id,
+            method_id=method.id,
+            payload=payload.SerializeToString()).SerializeToString()
+    ] * count
+
+
+def _time(name: str, rpc_client: client.Client, data: List[bytes],
+          setup: Callable[[client.Client], None]) -> None:
+    setup(rpc_client)
+    process_packet = rpc_client.process_packet
+
+    start = time.perf_counter()
+    for packet in data:
+        process_packet(packet)
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>30}: {len(data) / elapsed:10.0f} packets/s')
+
+
+def _pending(rpc_client: client.Client) -> None:
+    rpc_client.channel(1).rpcs.pw.benchmark.Benchmark.Stream.invoke(
+        on_next=lambda *_: None)
+
+
+def _pending_with_callback(rpc_client: client.Client) -> None:
+    _pending(rpc_client)
+    rpc_client.response_callback = lambda *_: None
+
+
+def _not_pending(unused_client: client.Client) -> None:
+    pass
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packets', type=int, default=50000)
+    parser.add_argument('--payload-size', type=int, default=32)
+    return parser.parse_args()
+
+
+def main(packets_to_process: int, payload_size: int) -> None:
+    for name, setup in [('pending call', _pending),
+                        ('pending call, response_callback',
+                         _pending_with_callback),
+                        ('no pending call (discarded)', _not_pending)]:
+        rpc_client = _setup()
+        data = _server_stream_packets(rpc_client, packets_to_process,
+                                      payload_size)
+        _time(name, rpc_client, data, setup)
+
+
+if __name__ == '__main__':
+    _ARGS = _parse_args()
+    main(_ARGS.packets, _ARGS.payload_size)
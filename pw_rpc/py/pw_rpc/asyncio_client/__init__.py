@@ -0,0 +1,75 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Defines an asyncio-based RPC ClientImpl to use with pw_rpc.Client.
+
+asyncio_client.Impl invokes RPCs from coroutines running in an asyncio event
+loop. No threads block while RPCs are outstanding, so one loop can drive many
+concurrent RPCs across many devices.
+
+Calling a unary or client streaming method returns an awaitable.
+
+.. code-block:: python
+
+  status, response = await client.channel(1).rpcs.MyServer.MyUnary(a=123)
+
+  status, response = await rpcs.MyService.MyClientStreaming(requests)
+
+Server and bidirectional streaming calls are async iterators over the
+responses.
+
+.. code-block:: python
+
+  call = rpcs.MyService.MyServerStreaming.invoke(Request(some_field=123))
+
+  async for response in call:
+      process(response)
+
+  print(call.status)
+
+  call = rpcs.MyService.MyBidirectionalStreaming.invoke()
+  call.send(some_field=123)
+
+  async for response in call.get_responses(count=1):
+      process(response)
+
+  status, unread_responses = await call.finish_and_wait()
+
+Each streaming call buffers at most max_buffered_responses unread responses.
+While a buffer is full, Impl.wait_for_capacity() does not return. Transports
+such as pw_hdlc.rpc.AsyncHdlcRpcClient await it between frames, so a slow
+consumer stops reads from the device instead of growing memory. Responses that
+arrive at a full buffer anyway (e.g. from a thread that ignores the
+backpressure) replace the oldest buffered response and are counted in
+call.dropped_responses.
+
+RPCs must be invoked from the event loop thread. Packets may be processed by
+pw_rpc.Client from any thread; responses are delivered to each call in its
+event loop.
+"""
+
+from pw_rpc.asyncio_client.call import (
+    Call,
+    UnaryCall,
+    ServerStreamingCall,
+    ClientStreamingCall,
+    BidirectionalStreamingCall,
+)
+from pw_rpc.asyncio_client.impl import DEFAULT_MAX_BUFFERED_RESPONSES, Impl
+from pw_rpc.callback_client.call import (
+    OptionalTimeout,
+    UseDefault,
+    UnaryResponse,
+    StreamResponse,
+)
+from pw_rpc.callback_client.errors import RpcError, RpcTimeout
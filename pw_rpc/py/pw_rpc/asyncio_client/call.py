@@ -0,0 +1,330 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Classes for handling ongoing asyncio RPC calls."""
+
+import asyncio
+import collections
+import logging
+from typing import (Any, AsyncIterator, Callable, Deque, Generator, Iterable,
+                    List, Optional, TYPE_CHECKING)
+
+from pw_status import Status
+from google.protobuf.message import Message
+
+from pw_rpc.callback_client.call import (OptionalTimeout, UseDefault,
+                                         UnaryResponse, StreamResponse)
+from pw_rpc.callback_client.errors import RpcError, RpcTimeout
+from pw_rpc.client import PendingRpc, PendingRpcs
+from pw_rpc.descriptors import Method
+
+if TYPE_CHECKING:
+    from pw_rpc.asyncio_client.impl import Impl
+
+_LOG = logging.getLogger(__package__)
+
+
+class Call:
+    """Represents an in-progress or completed RPC call.
+
+    Calls belong to the event loop in which they were invoked. Responses are
+    buffered until they are read, up to max_buffered_responses. While a call's
+    buffer is full, Impl.wait_for_capacity() blocks, so transports that await
+    it stop reading until the responses are consumed. If responses arrive
+    anyway, the oldest buffered response is dropped and dropped_responses is
+    incremented.
+    """
+    def __init__(self, impl: 'Impl', rpcs: PendingRpcs, rpc: PendingRpc,
+                 loop: asyncio.AbstractEventLoop,
+                 default_timeout_s: Optional[float],
+                 max_buffered_responses: int) -> None:
+        self._impl = impl
+        self._rpcs = rpcs
+        self._rpc = rpc
+        self._loop = loop
+        self.default_timeout_s = default_timeout_s
+
+        self.status: Optional[Status] = None
+        self.error: Optional[Status] = None
+        self.dropped_responses = 0
+
+        self._max_buffered_responses = max_buffered_responses
+        self._buffer: Deque[Any] = collections.deque()
+        self._last_response: Any = None
+        self._waiter: Optional[asyncio.Future] = None
+
+    def _invoke(self, request: Optional[Message], ignore_errors: bool) -> None:
+        """Calls the RPC. This must be called immediately after __init__."""
+        previous = self._rpcs.send_request(self._rpc,
+                                           request,
+                                           self,
+                                           ignore_errors=ignore_errors,
+                                           override_pending=True)
+
+        if previous is not None and not previous.completed():
+            previous._handle_error(Status.CANCELLED)  # pylint: disable=protected-access
+
+    @property
+    def method(self) -> Method:
+        return self._rpc.method
+
+    def completed(self) -> bool:
+        """True if the RPC call has completed, successfully or from an error."""
+        return self.status is not None or self.error is not None
+
+    def buffered_responses(self) -> int:
+        """Returns the number of responses received but not yet read."""
+        return len(self._buffer)
+
+    def cancel(self) -> bool:
+        """Cancels the RPC; returns whether the RPC was active."""
+        if self.completed():
+            return False
+
+        self.error = Status.CANCELLED
+        self._buffer.clear()
+        self._impl._release(self)  # pylint: disable=protected-access
+        self._wake()
+        return self._rpcs.send_cancel(self._rpc)
+
+    def _send_client_stream(self, request_proto: Optional[Message],
+                            request_fields: dict) -> None:
+        """Sends a client to the server in the client stream.
+
+        Sending a client stream packet on a closed RPC raises an exception.
+        """
+        self._check_errors()
+
+        if self.status is not None:
+            raise RpcError(self._rpc, Status.FAILED_PRECONDITION)
+
+        self._rpcs.send_client_stream(
+            self._rpc, self.method.get_request(request_proto, request_fields))
+
+    def _finish_client_stream(self, requests: Iterable[Message]) -> None:
+        for request in requests:
+            self._send_client_stream(request, {})
+
+        if not self.completed():
+            self._rpcs.send_client_stream_end(self._rpc)
+
+    def _resolve_timeout(self, timeout_s: OptionalTimeout) -> Optional[float]:
+        if timeout_s is UseDefault.VALUE:
+            return self.default_timeout_s
+        return timeout_s
+
+    async def _next_response(self, timeout_s: Optional[float]) -> Any:
+        """Returns the next buffered response; raises StopAsyncIteration."""
+        while not self._buffer:
+            self._check_errors()
+
+            if self.status is not None:
+                raise StopAsyncIteration
+
+            self._waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout_s)
+            except asyncio.TimeoutError:
+                raise RpcTimeout(self._rpc, timeout_s) from None
+            finally:
+                self._waiter = None
+
+        if len(self._buffer) == self._max_buffered_responses:
+            self._impl._release(self)  # pylint: disable=protected-access
+
+        return self._buffer.popleft()
+
+    async def _get_responses(self, timeout_s: OptionalTimeout,
+                             count: Optional[int]) -> AsyncIterator:
+        timeout = self._resolve_timeout(timeout_s)
+
+        while count is None or count > 0:
+            try:
+                yield await self._next_response(timeout)
+            except StopAsyncIteration:
+                return
+
+            if count is not None:
+                count -= 1
+
+    async def _unary_wait(self, timeout_s: OptionalTimeout) -> UnaryResponse:
+        """Waits until the RPC has completed."""
+        timeout = self._resolve_timeout(timeout_s)
+
+        while True:
+            try:
+                await self._next_response(timeout)
+            except StopAsyncIteration:
+                break
+
+        assert self.status is not None
+        return UnaryResponse(self.status, self._last_response)
+
+    async def _stream_wait(self, timeout_s: OptionalTimeout) -> StreamResponse:
+        """Waits until the RPC has completed; returns unread responses."""
+        timeout = self._resolve_timeout(timeout_s)
+        responses: List[Any] = []
+
+        while True:
+            try:
+                responses.append(await self._next_response(timeout))
+            except StopAsyncIteration:
+                break
+
+        assert self.status is not None
+        return StreamResponse(self.status, responses)
+
+    def _check_errors(self) -> None:
+        if self.error is not None:
+            raise RpcError(self._rpc, self.error)
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _deliver(self, function: Callable[..., None], arg: Any) -> None:
+        """Runs a handler in the call's event loop thread."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            function(arg)
+        else:
+            self._loop.call_soon_threadsafe(function, arg)
+
+    def _handle_response(self, response: Any) -> None:
+        if self.completed():
+            return
+
+        self._last_response = response
+
+        if len(self._buffer) == self._max_buffered_responses:
+            self._buffer.popleft()
+            self.dropped_responses += 1
+            _LOG.warning('%s dropped a response; %d dropped so far', self._rpc,
+                         self.dropped_responses)
+
+        self._buffer.append(response)
+
+        if len(self._buffer) == self._max_buffered_responses:
+            self._impl._hold(self)  # pylint: disable=protected-access
+
+        self._wake()
+
+    def _handle_completion(self, status: Status) -> None:
+        self.status = status
+        self._impl._release(self)  # pylint: disable=protected-access
+        self._wake()
+
+    def _handle_error(self, error: Status) -> None:
+        self.error = error
+        self._impl._release(self)  # pylint: disable=protected-access
+        self._wake()
+
+    def __enter__(self) -> 'Call':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.cancel()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.method})'
+
+
+class UnaryCall(Call):
+    """Tracks the state of a unary RPC call; await it to get the result."""
+    @property
+    def response(self) -> Any:
+        return self._last_response
+
+    async def wait(
+            self,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> UnaryResponse:
+        return await self._unary_wait(timeout_s)
+
+    def __await__(self) -> Generator[Any, None, UnaryResponse]:
+        return self.wait().__await__()
+
+
+class ServerStreamingCall(Call):
+    """Tracks the state of a server streaming RPC call.
+
+    Iterate over the call with async for to read responses as they arrive.
+    """
+    async def wait(
+            self,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> StreamResponse:
+        """Waits for the RPC to complete; returns the unread responses."""
+        return await self._stream_wait(timeout_s)
+
+    def get_responses(
+            self,
+            *,
+            count: int = None,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> AsyncIterator:
+        return self._get_responses(timeout_s, count)
+
+    def __aiter__(self) -> AsyncIterator:
+        return self.get_responses()
+
+
+class ClientStreamingCall(Call):
+    """Tracks the state of a client streaming RPC call."""
+    @property
+    def response(self) -> Any:
+        return self._last_response
+
+    def send(self,
+             _rpc_request_proto: Message = None,
+             **request_fields) -> None:
+        """Sends client stream request to the server."""
+        self._send_client_stream(_rpc_request_proto, request_fields)
+
+    async def finish_and_wait(
+            self,
+            requests: Iterable[Message] = (),
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> UnaryResponse:
+        """Ends the client stream and waits for the RPC to complete."""
+        self._finish_client_stream(requests)
+        return await self._unary_wait(timeout_s)
+
+
+class BidirectionalStreamingCall(Call):
+    """Tracks the state of a bidirectional streaming RPC call."""
+    def send(self,
+             _rpc_request_proto: Message = None,
+             **request_fields) -> None:
+        """Sends a message to the server in the client stream."""
+        self._send_client_stream(_rpc_request_proto, request_fields)
+
+    async def finish_and_wait(
+            self,
+            requests: Iterable[Message] = (),
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> StreamResponse:
+        """Ends the client stream and waits for the RPC to complete."""
+        self._finish_client_stream(requests)
+        return await self._stream_wait(timeout_s)
+
+    def get_responses(
+            self,
+            *,
+            count: int = None,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> AsyncIterator:
+        return self._get_responses(timeout_s, count)
+
+    def __aiter__(self) -> AsyncIterator:
+        return self.get_responses()
@@ -0,0 +1,321 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""The asyncio-based pw_rpc client implementation."""
+
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Type
+
+from pw_status import Status
+from google.protobuf.message import Message
+
+from pw_rpc import client
+from pw_rpc.client import PendingRpc, PendingRpcs
+from pw_rpc.descriptors import Channel, Method, Service
+from pw_rpc.callback_client.call import (UseDefault, OptionalTimeout,
+                                         UnaryResponse, StreamResponse)
+
+from pw_rpc.asyncio_client.call import (
+    Call,
+    UnaryCall,
+    ServerStreamingCall,
+    ClientStreamingCall,
+    BidirectionalStreamingCall,
+)
+
+_LOG = logging.getLogger(__package__)
+
+DEFAULT_MAX_BUFFERED_RESPONSES = 64
+
+
+class _MethodClient:
+    """A method that can be invoked for a particular channel."""
+    def __init__(self, client_impl: 'Impl', rpcs: PendingRpcs,
+                 channel: Channel, method: Method,
+                 default_timeout_s: Optional[float]) -> None:
+        self._impl = client_impl
+        self._rpcs = rpcs
+        self._rpc = PendingRpc(channel, method.service, method)
+        self.default_timeout_s: Optional[float] = default_timeout_s
+
+    @property
+    def channel(self) -> Channel:
+        return self._rpc.channel
+
+    @property
+    def method(self) -> Method:
+        return self._rpc.method
+
+    @property
+    def service(self) -> Service:
+        return self._rpc.service
+
+    @property
+    def request(self) -> type:
+        """Returns the request proto class."""
+        return self.method.request_type
+
+    @property
+    def response(self) -> type:
+        """Returns the response proto class."""
+        return self.method.response_type
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}({self.method.full_name}, '
+                f'channel={self.channel.id})')
+
+    def _start_call(self,
+                    call_type: Type[Call],
+                    request: Optional[Message],
+                    timeout_s: OptionalTimeout,
+                    max_buffered_responses: Optional[int],
+                    ignore_errors: bool = False) -> Any:
+        """Creates the Call object and invokes the RPC using it.
+
+        Calls must be started from the thread running the event loop.
+        """
+        if timeout_s is UseDefault.VALUE:
+            timeout_s = self.default_timeout_s
+
+        if max_buffered_responses is None:
+            max_buffered_responses = self._impl.max_buffered_responses
+
+        call = call_type(self._impl, self._rpcs, self._rpc,
+                         asyncio.get_running_loop(), timeout_s,
+                         max_buffered_responses)
+        call._invoke(request, ignore_errors)  # pylint: disable=protected-access
+        return call
+
+
+class _UnaryMethodClient(_MethodClient):
+    def invoke(self,
+               request: Message = None,
+               *,
+               request_args: Dict[str, Any] = None,
+               timeout_s: OptionalTimeout = UseDefault.VALUE) -> UnaryCall:
+        """Invokes the unary RPC and returns an awaitable call object."""
+        return self._start_call(UnaryCall,
+                                self.method.get_request(request, request_args),
+                                timeout_s, 1)
+
+    async def __call__(self,
+                       _rpc_request_proto: Message = None,
+                       *,
+                       pw_rpc_timeout_s: OptionalTimeout = UseDefault.VALUE,
+                       **request_fields) -> UnaryResponse:
+        """Invokes the RPC and waits for it to complete."""
+        return await self.invoke(
+            self.method.get_request(_rpc_request_proto,
+                                    request_fields)).wait(pw_rpc_timeout_s)
+
+
+class _ServerStreamingMethodClient(_MethodClient):
+    def invoke(self,
+               request: Message = None,
+               *,
+               request_args: Dict[str, Any] = None,
+               timeout_s: OptionalTimeout = UseDefault.VALUE,
+               max_buffered_responses: int = None) -> ServerStreamingCall:
+        """Invokes the server streaming RPC and returns a call object."""
+        return self._start_call(ServerStreamingCall,
+                                self.method.get_request(request, request_args),
+                                timeout_s, max_buffered_responses)
+
+    def open(self,
+             request: Message = None,
+             *,
+             request_args: Dict[str, Any] = None,
+             max_buffered_responses: int = None) -> ServerStreamingCall:
+        """Returns a call object for the RPC, even if the RPC cannot be invoked.
+
+        Can be used to listen for responses from an RPC server that may yet be
+        available.
+        """
+        return self._start_call(ServerStreamingCall,
+                                self.method.get_request(request, request_args),
+                                None, max_buffered_responses, True)
+
+    async def __call__(self,
+                       _rpc_request_proto: Message = None,
+                       *,
+                       pw_rpc_timeout_s: OptionalTimeout = UseDefault.VALUE,
+                       **request_fields) -> StreamResponse:
+        """Invokes the RPC and collects its responses until it completes.
+
+        All responses are kept, so the buffering limit does not apply. Iterate
+        over the call returned by invoke() to bound memory use.
+        """
+        call = self._start_call(
+            ServerStreamingCall,
+            self.method.get_request(_rpc_request_proto, request_fields),
+            pw_rpc_timeout_s, sys.maxsize)
+        return await call.wait()
+
+
+class _ClientStreamingMethodClient(_MethodClient):
+    def invoke(
+            self,
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE
+    ) -> ClientStreamingCall:
+        """Invokes the client streaming RPC and returns a call object"""
+        return self._start_call(ClientStreamingCall, None, timeout_s, 1, True)
+
+    async def __call__(
+            self,
+            requests: Iterable[Message] = (),
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> UnaryResponse:
+        """Sends the requests, ends the client stream, and awaits the result."""
+        return await self.invoke().finish_and_wait(requests,
+                                                   timeout_s=timeout_s)
+
+
+class _BidirectionalStreamingMethodClient(_MethodClient):
+    def invoke(
+            self,
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE,
+            max_buffered_responses: int = None) -> BidirectionalStreamingCall:
+        """Invokes the bidirectional streaming RPC and returns a call object."""
+        return self._start_call(BidirectionalStreamingCall, None, timeout_s,
+                                max_buffered_responses)
+
+    async def __call__(
+            self,
+            requests: Iterable[Message] = (),
+            *,
+            timeout_s: OptionalTimeout = UseDefault.VALUE) -> StreamResponse:
+        """Sends the requests, ends the client stream, and awaits the result."""
+        return await self.invoke().finish_and_wait(requests,
+                                                   timeout_s=timeout_s)
+
+
+class Impl(client.ClientImpl):
+    """asyncio-based ClientImpl, for use with pw_rpc.Client.
+
+    Responses are buffered per call, up to max_buffered_responses. Transports
+    that read from the event loop should await wait_for_capacity() before
+    each read so that slow consumers apply backpressure to the device rather
+    than losing responses.
+    """
+    def __init__(
+            self,
+            default_unary_timeout_s: float = None,
+            default_stream_timeout_s: float = None,
+            max_buffered_responses: int = DEFAULT_MAX_BUFFERED_RESPONSES
+    ) -> None:
+        super().__init__()
+        if max_buffered_responses < 1:
+            raise ValueError('max_buffered_responses must be at least 1')
+
+        self.default_unary_timeout_s = default_unary_timeout_s
+        self.default_stream_timeout_s = default_stream_timeout_s
+        self.max_buffered_responses = max_buffered_responses
+
+        self._full_calls: Set[Call] = set()
+        self._capacity_waiters: List[asyncio.Future] = []
+
+    def backpressured(self) -> bool:
+        """True if any active call's response buffer is full."""
+        return bool(self._full_calls)
+
+    async def wait_for_capacity(self) -> None:
+        """Waits until no active call has a full response buffer.
+
+        This waits on every call that uses this Impl, not just one. A transport
+        that awaits it, such as pw_hdlc.rpc.AsyncHdlcRpcClient.run, stops
+        reading while any call's buffer is full. One unread call with a full
+        buffer therefore stalls responses for every call on that transport,
+        until its responses are read or the call ends.
+        """
+        while self._full_calls:
+            waiter = asyncio.get_running_loop().create_future()
+            self._capacity_waiters.append(waiter)
+            await waiter
+
+    def _hold(self, call: Call) -> None:
+        self._full_calls.add(call)
+
+    def _release(self, call: Call) -> None:
+        self._full_calls.discard(call)
+
+        if not self._full_calls:
+            waiters, self._capacity_waiters = self._capacity_waiters, []
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.get_loop().call_soon_threadsafe(_set_done, waiter)
+
+    def method_client(self, channel: Channel, method: Method) -> _MethodClient:
+        """Returns an object that invokes a method using the given channel."""
+        if method.type is Method.Type.UNARY:
+            return _UnaryMethodClient(self, self.rpcs, channel, method,
+                                      self.default_unary_timeout_s)
+
+        if method.type is Method.Type.SERVER_STREAMING:
+            return _ServerStreamingMethodClient(self, self.rpcs, channel,
+                                                method,
+                                                self.default_stream_timeout_s)
+
+        if method.type is Method.Type.CLIENT_STREAMING:
+            return _ClientStreamingMethodClient(self, self.rpcs, channel,
+                                                method,
+                                                self.default_unary_timeout_s)
+
+        if method.type is Method.Type.BIDIRECTIONAL_STREAMING:
+            return _BidirectionalStreamingMethodClient(
+                self, self.rpcs, channel, method,
+                self.default_stream_timeout_s)
+
+        raise AssertionError(f'Unknown method type {method.type}')
+
+    def handle_response(self,
+                        rpc: PendingRpc,
+                        context: Call,
+                        payload,
+                        *,
+                        args: tuple = (),
+                        kwargs: dict = None) -> None:
+        """Buffers the response in the call's event loop."""
+        assert not args and not kwargs, 'Forwarding args & kwargs not supported'
+        # pylint: disable=protected-access
+        context._deliver(context._handle_response, payload)
+
+    def handle_completion(self,
+                          rpc: PendingRpc,
+                          context: Call,
+                          status: Status,
+                          *,
+                          args: tuple = (),
+                          kwargs: dict = None):
+        assert not args and not kwargs, 'Forwarding args & kwargs not supported'
+        # pylint: disable=protected-access
+        context._deliver(context._handle_completion, status)
+
+    def handle_error(self,
+                     rpc: PendingRpc,
+                     context: Call,
+                     status: Status,
+                     *,
+                     args: tuple = (),
+                     kwargs: dict = None) -> None:
+        assert not args and not kwargs, 'Forwarding args & kwargs not supported'
+        # pylint: disable=protected-access
+        context._deliver(context._handle_error, status)
+
+
+def _set_done(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
@@ -84,6 +84,19 @@ takes an iterable for responses to send before closing the stream.
 
   # Send the requests, close the stream, then wait for the RPC to complete.
   stream_responses = call.finish_and_wait([RequestType(some_field=123), ...])
+
+Streaming calls retain every response by default. Long-lived streams can bound
+their memory with max_responses. By default, responses past the limit are
+dropped; OverflowPolicy.DROP_OLDEST keeps the most recent responses instead.
+call.dropped_responses counts the responses that were not retained.
+
+.. code-block:: python
+
+  # Invoke on_next for every log, but only keep the last 100 responses.
+  call = rpcs.pw.log.Logs.Listen.invoke(
+      on_next=handle_logs,
+      max_responses=100,
+      overflow=callback_client.OverflowPolicy.DROP_OLDEST)
 """
 
 from pw_rpc.callback_client.call import (
@@ -98,6 +111,7 @@ from pw_rpc.callback_client.call import (
     OnNextCallback,
     OnCompletedCallback,
     OnErrorCallback,
+    OverflowPolicy,
 )
 from pw_rpc.callback_client.errors import RpcError, RpcTimeout
 from pw_rpc.callback_client.impl import Impl
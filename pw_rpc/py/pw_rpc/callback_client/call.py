@@ -13,12 +13,13 @@
 # the License.
 """Classes for handling ongoing RPC calls."""
 
+import collections
 import enum
 import logging
 import math
-import queue
-from typing import (Any, Callable, Iterable, Iterator, NamedTuple, Union,
-                    Optional, Sequence, TypeVar)
+import threading
+from typing import (Any, Callable, Deque, Iterable, Iterator, NamedTuple,
+                    Union, Optional, Sequence, TypeVar)
 
 from pw_protobuf_compiler.python_protos import proto_repr
 from pw_status import Status
@@ -36,6 +37,12 @@ class UseDefault(enum.Enum):
     VALUE = 0
 
 
+class OverflowPolicy(enum.Enum):
+    """What a call with max_responses set does with additional responses."""
+    DROP_NEWEST = 0  # Keep the first max_responses responses.
+    DROP_OLDEST = 1  # Ring buffer: keep the last max_responses responses.
+
+
 CallType = TypeVar('CallType', 'UnaryCall', 'ServerStreamingCall',
                    'ClientStreamingCall', 'BidirectionalStreamingCall')
 
@@ -66,21 +73,46 @@ class StreamResponse(NamedTuple):
 
 
 class Call:
-    """Represents an in-progress or completed RPC call."""
-    def __init__(self, rpcs: PendingRpcs, rpc: PendingRpc,
-                 default_timeout_s: Optional[float],
-                 on_next: Optional[OnNextCallback],
-                 on_completed: Optional[OnCompletedCallback],
-                 on_error: Optional[OnErrorCallback]) -> None:
+    """Represents an in-progress or completed RPC call.
+
+    By default, a call retains every response it receives. If max_responses is
+    set, the call keeps at most that many responses, both in its list of
+    responses and in the queue of responses not yet read with
+    get_responses(). The overflow policy selects whether the first or the last
+    max_responses responses are kept. dropped_responses counts responses that
+    were not retained. Callbacks are invoked for every response regardless.
+    """
+    def __init__(
+            self,
+            rpcs: PendingRpcs,
+            rpc: PendingRpc,
+            default_timeout_s: Optional[float],
+            on_next: Optional[OnNextCallback],
+            on_completed: Optional[OnCompletedCallback],
+            on_error: Optional[OnErrorCallback],
+            *,
+            max_responses: Optional[int] = None,
+            overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST) -> None:
+        if max_responses is not None and max_responses < 0:
+            raise ValueError('max_responses cannot be negative')
+
         self._rpcs = rpcs
         self._rpc = rpc
         self.default_timeout_s = default_timeout_s
 
         self.status: Optional[Status] = None
         self.error: Optional[Status] = None
+        self.dropped_responses = 0
         self._callback_exception: Optional[Exception] = None
-        self._responses: list = []
-        self._response_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+        self._max_responses = max_responses
+        self._ring_buffer = (max_responses is not None
+                             and overflow is OverflowPolicy.DROP_OLDEST)
+        self._responses: Union[list, Deque[Any]] = (collections.deque(
+            maxlen=max_responses) if self._ring_buffer else [])
+        self._response_queue: Deque[Any] = collections.deque(
+            maxlen=max_responses if self._ring_buffer else None)
+        self._response_available = threading.Condition()
 
         self.on_next = on_next or Call._default_response
         self.on_completed = on_completed or Call._default_completion
@@ -151,7 +183,12 @@ class Call:
             pass
 
         assert self.status is not None
-        return StreamResponse(self.status, self._responses)
+        return StreamResponse(self.status, self._retained_responses())
+
+    def _retained_responses(self) -> Sequence:
+        if self._ring_buffer:
+            return list(self._responses)
+        return self._responses
 
     def _get_responses(self,
                        *,
@@ -166,7 +203,7 @@ class Call:
         """
         self._check_errors()
 
-        if self.completed() and self._response_queue.empty():
+        if self.completed() and not self._response_queue:
             return
 
         if timeout_s is UseDefault.VALUE:
@@ -174,26 +211,33 @@ class Call:
 
         remaining = math.inf if count is None else count
 
-        try:
-            while remaining:
-                response = self._response_queue.get(True, timeout_s)
+        while remaining:
+            with self._response_available:
+                if not self._response_available.wait_for(
+                        lambda: self._response_queue or self.completed(),
+                        timeout_s):
+                    raise RpcTimeout(self._rpc, timeout_s)
+
+                response = (self._response_queue.popleft()
+                            if self._response_queue else None)
 
-                self._check_errors()
+            self._check_errors()
 
-                if response is None:
-                    return
+            if response is None:
+                return
 
-                yield response
-                remaining -= 1
-        except queue.Empty:
-            raise RpcTimeout(self._rpc, timeout_s)
+            yield response
+            remaining -= 1
 
     def cancel(self) -> bool:
         """Cancels the RPC; returns whether the RPC was active."""
         if self.completed():
             return False
 
-        self.error = Status.CANCELLED
+        with self._response_available:
+            self.error = Status.CANCELLED
+            self._response_available.notify_all()
+
         return self._rpcs.send_cancel(self._rpc)
 
     def _check_errors(self) -> None:
@@ -204,22 +248,37 @@ class Call:
             raise RpcError(self._rpc, self.error)
 
     def _handle_response(self, response: Any) -> None:
-        # TODO(frolv): These lists could grow very large for persistent
-        # streaming RPCs such as logs. The size should be limited.
-        self._responses.append(response)
-        self._response_queue.put(response)
+        with self._response_available:
+            if self._max_responses is None or self._ring_buffer:
+                # Ring buffer deques discard their oldest item when full.
+                if len(self._responses) == self._max_responses:
+                    self.dropped_responses += 1
+                self._responses.append(response)
+                self._response_queue.append(response)
+            else:
+                if len(self._responses) < self._max_responses:
+                    self._responses.append(response)
+                else:
+                    self.dropped_responses += 1
+
+                if len(self._response_queue) < self._max_responses:
+                    self._response_queue.append(response)
+
+            self._response_available.notify_all()
 
         self._invoke_callback('on_next', response)
 
     def _handle_completion(self, status: Status) -> None:
-        self.status = status
-        self._response_queue.put(None)
+        with self._response_available:
+            self.status = status
+            self._response_available.notify_all()
 
         self._invoke_callback('on_completed', status)
 
     def _handle_error(self, error: Status) -> None:
-        self.error = error
-        self._response_queue.put(None)
+        with self._response_available:
+            self.error = error
+            self._response_available.notify_all()
 
         self._invoke_callback('on_error', error)
 
@@ -265,7 +324,7 @@ class ServerStreamingCall(Call):
     """Tracks the state of a server streaming RPC call."""
     @property
     def responses(self) -> Sequence:
-        return self._responses
+        return self._retained_responses()
 
     def wait(self,
              timeout_s: OptionalTimeout = UseDefault.VALUE) -> StreamResponse:
@@ -310,7 +369,7 @@ class BidirectionalStreamingCall(Call):
     """Tracks the state of a bidirectional streaming RPC call."""
     @property
     def responses(self) -> Sequence:
-        return self._responses
+        return self._retained_responses()
 
     # TODO(hepler): Use / to mark the first arg as positional-only
     #     when when Python 3.7 support is no longer required.
@@ -39,6 +39,7 @@ from pw_rpc.callback_client.call import (
     OnNextCallback,
     OnCompletedCallback,
     OnErrorCallback,
+    OverflowPolicy,
 )
 
 _LOG = logging.getLogger(__package__)
@@ -104,13 +105,14 @@ class _MethodClient:
                     on_next: Optional[OnNextCallback],
                     on_completed: Optional[OnCompletedCallback],
                     on_error: Optional[OnErrorCallback],
-                    ignore_errors: bool = False) -> CallType:
+                    ignore_errors: bool = False,
+                    **call_options) -> CallType:
         """Creates the Call object and invokes the RPC using it."""
         if timeout_s is UseDefault.VALUE:
             timeout_s = self.default_timeout_s
 
         call = call_type(self._rpcs, self._rpc, timeout_s, on_next,
-                         on_completed, on_error)
+                         on_completed, on_error, **call_options)
         call._invoke(request, ignore_errors)  # pylint: disable=protected-access
         return call
 
@@ -196,27 +198,42 @@ class _UnaryMethodClient(_MethodClient):
 
 class _ServerStreamingMethodClient(_MethodClient):
     def invoke(
-            self,
-            request: Message = None,
-            on_next: OnNextCallback = None,
-            on_completed: OnCompletedCallback = None,
-            on_error: OnErrorCallback = None,
-            *,
-            request_args: Dict[str, Any] = None,
-            timeout_s: OptionalTimeout = UseDefault.VALUE
+        self,
+        request: Message = None,
+        on_next: OnNextCallback = None,
+        on_completed: OnCompletedCallback = None,
+        on_error: OnErrorCallback = None,
+        *,
+        request_args: Dict[str, Any] = None,
+        timeout_s: OptionalTimeout = UseDefault.VALUE,
+        max_responses: int = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST
     ) -> ServerStreamingCall:
-        """Invokes the server streaming RPC and returns a call object."""
+        """Invokes the server streaming RPC and returns a call object.
+
+        If max_responses is set, the call retains at most that many responses;
+        overflow selects which are kept.
+        """
         return self._start_call(ServerStreamingCall,
                                 self.method.get_request(request, request_args),
-                                timeout_s, on_next, on_completed, on_error)
-
-    def open(self,
-             request: Message = None,
-             on_next: OnNextCallback = None,
-             on_completed: OnCompletedCallback = None,
-             on_error: OnErrorCallback = None,
-             *,
-             request_args: Dict[str, Any] = None) -> ServerStreamingCall:
+                                timeout_s,
+                                on_next,
+                                on_completed,
+                                on_error,
+                                max_responses=max_responses,
+                                overflow=overflow)
+
+    def open(
+        self,
+        request: Message = None,
+        on_next: OnNextCallback = None,
+        on_completed: OnCompletedCallback = None,
+        on_error: OnErrorCallback = None,
+        *,
+        request_args: Dict[str, Any] = None,
+        max_responses: int = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST
+    ) -> ServerStreamingCall:
         """Returns a call object for the RPC, even if the RPC cannot be invoked.
 
         Can be used to listen for responses from an RPC server that may yet be
@@ -224,7 +241,13 @@ class _ServerStreamingMethodClient(_MethodClient):
         """
         return self._start_call(ServerStreamingCall,
                                 self.method.get_request(request, request_args),
-                                None, on_next, on_completed, on_error, True)
+                                None,
+                                on_next,
+                                on_completed,
+                                on_error,
+                                True,
+                                max_responses=max_responses,
+                                overflow=overflow)
 
 
 class _ClientStreamingMethodClient(_MethodClient):
@@ -269,25 +292,49 @@ class _BidirectionalStreamingMethodClient(_MethodClient):
         on_completed: OnCompletedCallback = None,
         on_error: OnErrorCallback = None,
         *,
-        timeout_s: OptionalTimeout = UseDefault.VALUE
+        timeout_s: OptionalTimeout = UseDefault.VALUE,
+        max_responses: int = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST
     ) -> BidirectionalStreamingCall:
-        """Invokes the bidirectional streaming RPC and returns a call object."""
-        return self._start_call(
-            self._client_streaming_call_type(BidirectionalStreamingCall), None,
-            timeout_s, on_next, on_completed, on_error)
+        """Invokes the bidirectional streaming RPC and returns a call object.
 
-    def open(self,
-             on_next: OnNextCallback = None,
-             on_completed: OnCompletedCallback = None,
-             on_error: OnErrorCallback = None) -> BidirectionalStreamingCall:
+        If max_responses is set, the call retains at most that many responses;
+        overflow selects which are kept.
+        """
+        return self._start_call(
+            self._client_streaming_call_type(BidirectionalStreamingCall),
+            None,
+            timeout_s,
+            on_next,
+            on_completed,
+            on_error,
+            max_responses=max_responses,
+            overflow=overflow)
+
+    def open(
+        self,
+        on_next: OnNextCallback = None,
+        on_completed: OnCompletedCallback = None,
+        on_error: OnErrorCallback = None,
+        *,
+        max_responses: int = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST
+    ) -> BidirectionalStreamingCall:
         """Returns a call object for the RPC, even if the RPC cannot be invoked.
 
         Can be used to listen for responses from an RPC server that may yet be
         available.
         """
         return self._start_call(
-            self._client_streaming_call_type(BidirectionalStreamingCall), None,
-            None, on_next, on_completed, on_error, True)
+            self._client_streaming_call_type(BidirectionalStreamingCall),
+            None,
+            None,
+            on_next,
+            on_completed,
+            on_error,
+            True,
+            max_responses=max_responses,
+            overflow=overflow)
 
     def __call__(
             self,
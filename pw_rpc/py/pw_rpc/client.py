@@ -17,17 +17,25 @@ import abc
 from dataclasses import dataclass
 import logging
 from typing import (Any, Callable, Collection, Dict, Iterable, Iterator,
-                    NamedTuple, Optional)
+                    NamedTuple, Optional, Tuple)
 
 from google.protobuf.message import DecodeError, Message
 from pw_status import Status
 
 from pw_rpc import descriptors, packets
 from pw_rpc.descriptors import Channel, Service, Method
-from pw_rpc.internal.packet_pb2 import PacketType, RpcPacket
+from pw_rpc.internal.packet_pb2 import PacketType
 
 _LOG = logging.getLogger(__package__)
 
+# Packet types used when processing packets. Accessing protobuf enum values is
+# slow with the pure Python protobuf implementation, so look them up once.
+_RESPONSE = PacketType.RESPONSE
+_SERVER_STREAM = PacketType.SERVER_STREAM
+_SERVER_ERROR = PacketType.SERVER_ERROR
+_DEPRECATED_SERVER_STREAM_END = PacketType.DEPRECATED_SERVER_STREAM_END
+_CLIENT_PACKET_TYPES = frozenset([_RESPONSE, _SERVER_STREAM, _SERVER_ERROR])
+
 
 class Error(Exception):
     """Error from incorrectly using the RPC client classes."""
@@ -163,6 +171,10 @@ class PendingRpcs:
 
         return True
 
+    def is_pending(self, rpc: PendingRpc) -> bool:
+        """True if the RPC has a context, i.e. it was opened or requested."""
+        return rpc in self._pending
+
     def get_pending(self, rpc: PendingRpc, status: Optional[Status]):
         """Gets the pending RPC's context. If status is set, clears the RPC."""
         if status is None:
@@ -279,7 +291,7 @@ class Services(descriptors.ServiceAccessor[ServiceClient]):
 
 
 def _decode_status(rpc: PendingRpc, packet) -> Optional[Status]:
-    if packet.type == PacketType.SERVER_STREAM:
+    if packet.type == _SERVER_STREAM:
         return None
 
     try:
@@ -290,11 +302,11 @@ def _decode_status(rpc: PendingRpc, packet) -> Optional[Status]:
 
 
 def _decode_payload(rpc: PendingRpc, packet) -> Optional[Message]:
-    if packet.type == PacketType.SERVER_ERROR:
+    if packet.type == _SERVER_ERROR:
         return None
 
     # Server streaming RPCs do not send a payload with their RESPONSE packet.
-    if packet.type == PacketType.RESPONSE and rpc.method.server_streaming:
+    if packet.type == _RESPONSE and rpc.method.server_streaming:
         return None
 
     return packets.decode_payload(packet, rpc.method.response_type)
@@ -357,7 +369,7 @@ class ChannelClient:
 
 
 def _update_for_backwards_compatibility(rpc: PendingRpc,
-                                        packet: RpcPacket) -> None:
+                                        packet: packets.Packet) -> None:
     """Adapts server streaming RPC packets to the updated protocol if needed."""
     # The protocol changes only affect server streaming RPCs.
     if rpc.method.type is not Method.Type.SERVER_STREAMING:
@@ -365,8 +377,8 @@ def _update_for_backwards_compatibility(rpc: PendingRpc,
 
     # SERVER_STREAM_END packets are deprecated. They are equivalent to a
     # RESPONSE packet.
-    if packet.type == PacketType.DEPRECATED_SERVER_STREAM_END:
-        packet.type = PacketType.RESPONSE
+    if packet.type == _DEPRECATED_SERVER_STREAM_END:
+        packet.type = _RESPONSE
         return
 
     # Prior to the introduction of SERVER_STREAM packets, RESPONSE packets with
@@ -377,8 +389,8 @@ def _update_for_backwards_compatibility(rpc: PendingRpc,
     # equivalent to a payload that happens to encode to zero bytes. This would
     # only affect server streaming RPCs on the old protocol that intentionally
     # send empty payloads, which will not be an issue in practice.
-    if packet.type == PacketType.RESPONSE and packet.payload:
-        packet.type = PacketType.SERVER_STREAM
+    if packet.type == _RESPONSE and packet.payload:
+        packet.type = _SERVER_STREAM
 
 
 class Client:
@@ -416,6 +428,11 @@ class Client:
         self.response_callback: Optional[Callable[
             [PendingRpc, Any, Optional[Status]], Any]] = None
 
+        # PendingRpcs by (channel ID, service ID, method ID), so that packets
+        # for the same RPC reuse one PendingRpc instead of looking up the
+        # channel, service, and method for every packet.
+        self._rpcs_by_id: Dict[Tuple[int, int, int], PendingRpc] = {}
+
     def channel(self, channel_id: int = None) -> ChannelClient:
         """Returns a ChannelClient, which is used to call RPCs on a channel.
 
@@ -463,7 +480,7 @@ class Client:
           NOT_FOUND - the packet's channel ID is not known to this client
         """
         try:
-            packet = packets.decode(pw_rpc_raw_packet_data)
+            packet = packets.decode_packet(pw_rpc_raw_packet_data)
         except DecodeError as err:
             _LOG.warning('Failed to decode packet: %s', err)
             _LOG.debug('Raw packet: %r', pw_rpc_raw_packet_data)
@@ -473,54 +490,68 @@ class Client:
             return Status.INVALID_ARGUMENT
 
         try:
-            channel_client = self._channels_by_id[packet.channel_id]
+            rpc = self._rpcs_by_id[packet.channel_id, packet.service_id,
+                                   packet.method_id]
         except KeyError:
-            _LOG.warning('Unrecognized channel ID %d', packet.channel_id)
-            return Status.NOT_FOUND
+            try:
+                channel_client = self._channels_by_id[packet.channel_id]
+            except KeyError:
+                _LOG.warning('Unrecognized channel ID %d', packet.channel_id)
+                return Status.NOT_FOUND
 
-        try:
-            rpc = self._look_up_service_and_method(packet, channel_client)
-        except ValueError as err:
-            _send_client_error(channel_client, packet, Status.NOT_FOUND)
-            _LOG.warning('%s', err)
-            return Status.OK
+            try:
+                rpc = self._look_up_service_and_method(packet, channel_client)
+            except ValueError as err:
+                _send_client_error(channel_client.channel, packet,
+                                   Status.NOT_FOUND)
+                _LOG.warning('%s', err)
+                return Status.OK
+
+            self._rpcs_by_id[packet.channel_id, packet.service_id,
+                             packet.method_id] = rpc
 
         _update_for_backwards_compatibility(rpc, packet)
 
-        if packet.type not in (PacketType.RESPONSE, PacketType.SERVER_STREAM,
-                               PacketType.SERVER_ERROR):
+        if packet.type not in _CLIENT_PACKET_TYPES:
             _LOG.error('%s: unexpected PacketType %s', rpc, packet.type)
             _LOG.debug('Packet:\n%s', packet)
             return Status.OK
 
+        # Without a response callback, the payload is only needed if the RPC
+        # is pending. Check that before spending time decoding it.
+        if (self.response_callback is None
+                and not self._impl.rpcs.is_pending(rpc)):
+            _send_client_error(rpc.channel, packet, Status.FAILED_PRECONDITION)
+            _LOG.debug('Discarding response for %s, which is not pending', rpc)
+            return Status.OK
+
         status = _decode_status(rpc, packet)
 
         try:
             payload = _decode_payload(rpc, packet)
         except DecodeError as err:
-            _send_client_error(channel_client, packet, Status.DATA_LOSS)
+            _send_client_error(rpc.channel, packet, Status.DATA_LOSS)
             _LOG.warning('Failed to decode %s response for %s: %s',
                          rpc.method.response_type.DESCRIPTOR.full_name,
                          rpc.method.full_name, err)
             _LOG.debug('Raw payload: %s', packet.payload)
 
             # Make this an error packet so the error handler is called.
-            packet.type = PacketType.SERVER_ERROR
+            packet.type = _SERVER_ERROR
             status = Status.DATA_LOSS
 
         # If set, call the response callback with non-error packets.
-        if self.response_callback and packet.type != PacketType.SERVER_ERROR:
+        if self.response_callback and packet.type != _SERVER_ERROR:
             self.response_callback(rpc, payload, status)  # pylint: disable=not-callable
 
         try:
             context = self._impl.rpcs.get_pending(rpc, status)
         except KeyError:
-            _send_client_error(channel_client, packet,
-                               Status.FAILED_PRECONDITION)
+            _send_client_error(rpc.channel, packet, Status.FAILED_PRECONDITION)
             _LOG.debug('Discarding response for %s, which is not pending', rpc)
             return Status.OK
 
-        if packet.type == PacketType.SERVER_ERROR:
+        if packet.type == _SERVER_ERROR:
             assert status is not None and not status.ok()
             _LOG.warning('%s: invocation failed with %s', rpc, status)
             self._impl.handle_error(rpc,
@@ -546,7 +577,7 @@ class Client:
         return Status.OK
 
     def _look_up_service_and_method(
-            self, packet: RpcPacket,
+            self, packet: packets.Packet,
             channel_client: ChannelClient) -> PendingRpc:
         try:
             service = self.services[packet.service_id]
@@ -566,9 +597,9 @@ class Client:
                 f'services={[s.full_name for s in self.services]})')
 
 
-def _send_client_error(client: ChannelClient, packet: RpcPacket,
+def _send_client_error(channel: Channel, packet: packets.Packet,
                        error: Status) -> None:
     # Never send responses to SERVER_ERRORs.
-    if packet.type != PacketType.SERVER_ERROR:
-        client.channel.output(  # type: ignore
+    if packet.type != _SERVER_ERROR:
+        channel.output(  # type: ignore
             packets.encode_client_error(packet, error))
@@ -13,13 +13,101 @@
 # the License.
 """Functions for working with pw_rpc packets."""
 
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 
 from google.protobuf import message
 from pw_status import Status
 
 from pw_rpc.internal import packet_pb2
 
+# Tags for the RpcPacket fields with their expected wire types.
+_TYPE_TAG = 0x08  # field 1, varint
+_CHANNEL_ID_TAG = 0x10  # field 2, varint
+_SERVICE_ID_TAG = 0x1d  # field 3, fixed32
+_METHOD_ID_TAG = 0x25  # field 4, fixed32
+_PAYLOAD_TAG = 0x2a  # field 5, length delimited
+_STATUS_TAG = 0x30  # field 6, varint
+_CALL_ID_TAG = 0x38  # field 7, varint
+
+_TYPE_TAG_BYTES = bytes([_TYPE_TAG])
+_CHANNEL_ID_TAG_BYTES = bytes([_CHANNEL_ID_TAG])
+_SERVICE_ID_TAG_BYTES = bytes([_SERVICE_ID_TAG])
+_METHOD_ID_TAG_BYTES = bytes([_METHOD_ID_TAG])
+_PAYLOAD_TAG_BYTES = bytes([_PAYLOAD_TAG])
+_STATUS_TAG_BYTES = bytes([_STATUS_TAG])
+_CALL_ID_TAG_BYTES = bytes([_CALL_ID_TAG])
+
+_UINT32_LIMIT = 1 << 32
+_INT32_LIMIT = 1 << 31  # PacketType is an enum, which is an int32.
+
+_ONE_BYTE_VARINTS = tuple(bytes([i]) for i in range(0x80))
+
+_REQUEST = packet_pb2.PacketType.REQUEST
+_RESPONSE = packet_pb2.PacketType.RESPONSE
+_CLIENT_STREAM = packet_pb2.PacketType.CLIENT_STREAM
+_CLIENT_ERROR = packet_pb2.PacketType.CLIENT_ERROR
+_CLIENT_STREAM_END = packet_pb2.PacketType.CLIENT_STREAM_END
+
+
+class DecodedPacket:
+    """The fields of an RpcPacket, decoded without a protobuf message.
+
+    Has the same attributes as packet_pb2.RpcPacket. The payload is left
+    serialized.
+    """
+
+    __slots__ = ('type', 'channel_id', 'service_id', 'method_id', 'payload',
+                 'status', 'call_id')
+
+    def __init__(
+            self,
+            type: int = 0,  # pylint: disable=redefined-builtin
+            channel_id: int = 0,
+            service_id: int = 0,
+            method_id: int = 0,
+            payload: bytes = b'',
+            status: int = 0,
+            call_id: int = 0) -> None:
+        self.type = type
+        self.channel_id = channel_id
+        self.service_id = service_id
+        self.method_id = method_id
+        self.payload = payload
+        self.status = status
+        self.call_id = call_id
+
+    @classmethod
+    def from_proto(cls, packet: packet_pb2.RpcPacket) -> 'DecodedPacket':
+        return cls(packet.type, packet.channel_id, packet.service_id,
+                   packet.method_id, packet.payload, packet.status,
+                   packet.call_id)
+
+    def to_proto(self) -> packet_pb2.RpcPacket:
+        return packet_pb2.RpcPacket(type=self.type,
+                                    channel_id=self.channel_id,
+                                    service_id=self.service_id,
+                                    method_id=self.method_id,
+                                    payload=self.payload,
+                                    status=self.status,
+                                    call_id=self.call_id)
+
+    def _fields(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DecodedPacket):
+            return NotImplemented
+
+        return self._fields() == other._fields()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}'
+                           for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+Packet = Union[packet_pb2.RpcPacket, DecodedPacket]
+
 
 def decode(data: bytes) -> packet_pb2.RpcPacket:
     packet = packet_pb2.RpcPacket()
@@ -27,6 +115,92 @@ def decode(data: bytes) -> packet_pb2.RpcPacket:
     return packet
 
 
+class _Unsupported(Exception):
+    """The packet must be decoded by the protobuf library."""
+
+
+def _decode_varint(data: bytes, pos: int, limit: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+
+    while shift < 35:  # uint32 and int32 fields use at most 5 bytes.
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise _Unsupported from None
+
+        pos += 1
+        value |= (byte & 0x7f) << shift
+
+        if not byte & 0x80:
+            if value >= limit:
+                raise _Unsupported
+            return value, pos
+
+        shift += 7
+
+    raise _Unsupported
+
+
+def _decode_fields(data: bytes) -> DecodedPacket:
+    packet = DecodedPacket()
+    pos = 0
+    end = len(data)
+
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+
+        if tag == _SERVICE_ID_TAG or tag == _METHOD_ID_TAG:
+            if pos + 4 > end:
+                raise _Unsupported
+
+            value = int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+
+            if tag == _SERVICE_ID_TAG:
+                packet.service_id = value
+            else:
+                packet.method_id = value
+        elif tag == _PAYLOAD_TAG:
+            length, pos = _decode_varint(data, pos, _UINT32_LIMIT)
+            if pos + length > end:
+                raise _Unsupported
+
+            packet.payload = data[pos:pos + length]
+            pos += length
+        elif tag == _TYPE_TAG:
+            packet.type, pos = _decode_varint(data, pos, _INT32_LIMIT)
+        elif tag == _CHANNEL_ID_TAG:
+            packet.channel_id, pos = _decode_varint(data, pos, _UINT32_LIMIT)
+        elif tag == _STATUS_TAG:
+            packet.status, pos = _decode_varint(data, pos, _UINT32_LIMIT)
+        elif tag == _CALL_ID_TAG:
+            packet.call_id, pos = _decode_varint(data, pos, _UINT32_LIMIT)
+        else:  # Unknown fields, unexpected wire types, or multi-byte tags
+            raise _Unsupported
+
+    return packet
+
+
+def decode_packet(data: bytes) -> DecodedPacket:
+    """Decodes an RpcPacket without creating a protobuf message.
+
+    The RpcPacket fields are decoded directly. Packets that use encodings this
+    decoder does not handle, such as unknown fields, are decoded with the
+    protobuf library instead, so the results always match decode().
+
+    Raises:
+      google.protobuf.message.DecodeError if the packet is invalid
+    """
+    data = bytes(data)
+
+    try:
+        return _decode_fields(data)
+    except _Unsupported:
+        return DecodedPacket.from_proto(decode(data))
+
+
 def decode_payload(packet, payload_type):
     payload = payload_type()
     payload.MergeFromString(packet.payload)
@@ -37,64 +211,107 @@ def _ids(rpc: tuple) -> tuple:
     return tuple(item if isinstance(item, int) else item.id for item in rpc)
 
 
+def _encode_varint(value: int, limit: int = _UINT32_LIMIT) -> bytes:
+    if value < 0x80:
+        if value < 0:
+            raise ValueError(f'Value out of range: {value}')
+        return _ONE_BYTE_VARINTS[value]
+
+    if value >= limit:
+        raise ValueError(f'Value out of range: {value}')
+
+    result = bytearray()
+    while value >= 0x80:
+        result.append(0x80 | (value & 0x7f))
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def _encode_fixed32(value: int) -> bytes:
+    if not 0 <= value < _UINT32_LIMIT:
+        raise ValueError(f'Value out of range: {value}')
+
+    return value.to_bytes(4, 'little')
+
+
+def encode_packet(packet_type: int,
+                  channel_id: int,
+                  service_id: int,
+                  method_id: int,
+                  payload: bytes = b'',
+                  status: int = 0,
+                  call_id: int = 0) -> bytes:
+    """Encodes an RpcPacket from its fields and a serialized payload.
+
+    The output is identical to serializing a packet_pb2.RpcPacket, but no
+    message object is created and the payload is not copied into one. Fields
+    are written in field number order and zero-valued fields are omitted, like
+    the protobuf library does.
+    """
+    parts: List[bytes] = []
+
+    if packet_type:
+        parts += (_TYPE_TAG_BYTES, _encode_varint(packet_type, _INT32_LIMIT))
+    if channel_id:
+        parts += (_CHANNEL_ID_TAG_BYTES, _encode_varint(channel_id))
+    if service_id:
+        parts += (_SERVICE_ID_TAG_BYTES, _encode_fixed32(service_id))
+    if method_id:
+        parts += (_METHOD_ID_TAG_BYTES, _encode_fixed32(method_id))
+    if payload:
+        parts += (_PAYLOAD_TAG_BYTES, _encode_varint(len(payload)), payload)
+    if status:
+        parts += (_STATUS_TAG_BYTES, _encode_varint(status))
+    if call_id:
+        parts += (_CALL_ID_TAG_BYTES, _encode_varint(call_id))
+
+    return b''.join(parts)
+
+
 def encode_request(rpc: tuple, request: Optional[message.Message]) -> bytes:
     channel, service, method = _ids(rpc)
     payload = request.SerializeToString() if request is not None else bytes()
 
-    return packet_pb2.RpcPacket(type=packet_pb2.PacketType.REQUEST,
-                                channel_id=channel,
-                                service_id=service,
-                                method_id=method,
-                                payload=payload).SerializeToString()
+    return encode_packet(_REQUEST, channel, service, method, payload)
 
 
 def encode_response(rpc: tuple, response: message.Message) -> bytes:
     channel, service, method = _ids(rpc)
 
-    return packet_pb2.RpcPacket(
-        type=packet_pb2.PacketType.RESPONSE,
-        channel_id=channel,
-        service_id=service,
-        method_id=method,
-        payload=response.SerializeToString()).SerializeToString()
+    return encode_packet(_RESPONSE, channel, service, method,
+                         response.SerializeToString())
 
 
 def encode_client_stream(rpc: tuple, request: message.Message) -> bytes:
     channel, service, method = _ids(rpc)
 
-    return packet_pb2.RpcPacket(
-        type=packet_pb2.PacketType.CLIENT_STREAM,
-        channel_id=channel,
-        service_id=service,
-        method_id=method,
-        payload=request.SerializeToString()).SerializeToString()
+    return encode_packet(_CLIENT_STREAM, channel, service, method,
+                         request.SerializeToString())
 
 
-def encode_client_error(packet: packet_pb2.RpcPacket, status: Status) -> bytes:
-    return packet_pb2.RpcPacket(type=packet_pb2.PacketType.CLIENT_ERROR,
-                                channel_id=packet.channel_id,
-                                service_id=packet.service_id,
-                                method_id=packet.method_id,
-                                status=status.value).SerializeToString()
+def encode_client_error(packet: Packet, status: Status) -> bytes:
+    return encode_packet(_CLIENT_ERROR,
+                         packet.channel_id,
+                         packet.service_id,
+                         packet.method_id,
+                         status=status.value)
 
 
 def encode_cancel(rpc: tuple) -> bytes:
     channel, service, method = _ids(rpc)
-    return packet_pb2.RpcPacket(type=packet_pb2.PacketType.CLIENT_ERROR,
-                                status=Status.CANCELLED.value,
-                                channel_id=channel,
-                                service_id=service,
-                                method_id=method).SerializeToString()
+    return encode_packet(_CLIENT_ERROR,
+                         channel,
+                         service,
+                         method,
+                         status=Status.CANCELLED.value)
 
 
 def encode_client_stream_end(rpc: tuple) -> bytes:
     channel, service, method = _ids(rpc)
 
-    return packet_pb2.RpcPacket(type=packet_pb2.PacketType.CLIENT_STREAM_END,
-                                channel_id=channel,
-                                service_id=service,
-                                method_id=method).SerializeToString()
+    return encode_packet(_CLIENT_STREAM_END, channel, service, method)
 
 
-def for_server(packet: packet_pb2.RpcPacket) -> bool:
+def for_server(packet: Packet) -> bool:
     return packet.type % 2 == 0
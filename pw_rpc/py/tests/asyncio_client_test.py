@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests the asyncio client for pw_rpc."""
+
+import asyncio
+import threading
+import unittest
+from typing import List
+
+from pw_protobuf_compiler import python_protos
+from pw_status import Status
+
+from pw_rpc import asyncio_client, client, packets
+from pw_rpc.internal import packet_pb2
+
+TEST_PROTO = """\
+syntax = "proto3";
+
+package pw.test_asyncio;
+
+message SomeMessage {
+  uint32 magic_number = 1;
+}
+
+message AnotherMessage {
+  string payload = 1;
+}
+
+service PublicService {
+  rpc SomeUnary(SomeMessage) returns (AnotherMessage) {}
+  rpc SomeServerStreaming(SomeMessage) returns (stream AnotherMessage) {}
+  rpc SomeClientStreaming(stream SomeMessage) returns (AnotherMessage) {}
+  rpc SomeBidiStreaming(stream SomeMessage) returns (stream AnotherMessage) {}
+}
+"""
+
+
+class AsyncioClientTest(unittest.IsolatedAsyncioTestCase):
+    """Tests the asyncio_client.Impl client implementation."""
+    def setUp(self) -> None:
+        self._protos = python_protos.Library.from_strings(TEST_PROTO)
+        self._response = self._protos.packages.pw.test_asyncio.AnotherMessage
+
+        self._impl = asyncio_client.Impl(max_buffered_responses=2)
+        self._client = client.Client.from_modules(
+            self._impl, [client.Channel(1, self._handle_packet)],
+            self._protos.modules())
+        self._service = (
+            self._client.channel(1).rpcs.pw.test_asyncio.PublicService)
+
+        self.requests: List[packet_pb2.RpcPacket] = []
+        self._replies: List[bytes] = []
+
+    def _handle_packet(self, data: bytes) -> None:
+        self.requests.append(packets.decode(data))
+
+        replies, self._replies = self._replies, []
+        for reply in replies:
+            self._client.process_packet(reply)
+
+    def _packet(self, packet_type, method, **fields) -> bytes:
+        return packet_pb2.RpcPacket(type=packet_type,
+                                    channel_id=1,
+                                    service_id=method.service.id,
+                                    method_id=method.id,
+                                    **fields).SerializeToString()
+
+    def _response_packet(self, method, status: Status, payload='') -> bytes:
+        return self._packet(
+            packet_pb2.PacketType.RESPONSE,
+            method,
+            status=status.value,
+            payload=self._response(payload=payload).SerializeToString())
+
+    def _stream_packet(self, method, payload: str) -> bytes:
+        return self._packet(
+            packet_pb2.PacketType.SERVER_STREAM,
+            method,
+            payload=self._response(payload=payload).SerializeToString())
+
+    def _error_packet(self, method, status: Status) -> bytes:
+        return self._packet(packet_pb2.PacketType.SERVER_ERROR,
+                            method,
+                            status=status.value)
+
+    async def test_unary_await(self) -> None:
+        method = self._service.SomeUnary.method
+        self._replies.append(
+            self._response_packet(method, Status.ABORTED, 'hi'))
+
+        status, response = await self._service.SomeUnary(magic_number=6)
+
+        self.assertIs(Status.ABORTED, status)
+        self.assertEqual('hi', response.payload)
+        self.assertEqual(packet_pb2.PacketType.REQUEST, self.requests[-1].type)
+
+    async def test_unary_invoke_returns_awaitable_call(self) -> None:
+        call = self._service.SomeUnary.invoke()
+        self.assertFalse(call.completed())
+
+        self._client.process_packet(
+            self._response_packet(call.method, Status.OK, 'done'))
+
+        status, response = await call
+        self.assertIs(Status.OK, status)
+        self.assertEqual('done', response.payload)
+        self.assertEqual('done', call.response.payload)
+
+    async def test_unary_error(self) -> None:
+        method = self._service.SomeUnary.method
+        self._replies.append(self._error_packet(method, Status.NOT_FOUND))
+
+        with self.assertRaises(asyncio_client.RpcError) as context:
+            await self._service.SomeUnary()
+
+        self.assertIs(Status.NOT_FOUND, context.exception.status)
+
+    async def test_unary_timeout(self) -> None:
+        with self.assertRaises(asyncio_client.RpcTimeout):
+            await self._service.SomeUnary(pw_rpc_timeout_s=0.01)
+
+    async def test_many_concurrent_unary_calls(self) -> None:
+        channels = [client.Channel(i, lambda _: None) for i in range(1, 101)]
+        rpc_client = client.Client.from_modules(asyncio_client.Impl(),
+                                                channels,
+                                                self._protos.modules())
+        method = self._service.SomeUnary.method
+        calls = [
+            rpc_client.channel(
+                i).rpcs.pw.test_asyncio.PublicService.SomeUnary.invoke()
+            for i in range(1, 101)
+        ]
+
+        for i in range(1, 101):
+            rpc_client.process_packet(
+                packet_pb2.RpcPacket(
+                    type=packet_pb2.PacketType.RESPONSE,
+                    channel_id=i,
+                    service_id=method.service.id,
+                    method_id=method.id,
+                    payload=self._response(payload=str(
+                        i)).SerializeToString()).SerializeToString())
+
+        results = await asyncio.gather(*calls)
+        self.assertEqual([str(i) for i in range(1, 101)],
+                         [response.payload for _, response in results])
+
+    async def test_server_streaming_async_for(self) -> None:
+        call = self._service.SomeServerStreaming.invoke(request_args=dict(
+            magic_number=3))
+
+        async def respond() -> None:
+            for payload in ('a', 'b', 'c', 'd'):
+                self._client.process_packet(
+                    self._stream_packet(call.method, payload))
+                await asyncio.sleep(0)
+
+            self._client.process_packet(
+                self._response_packet(call.method, Status.OK))
+
+        task = asyncio.create_task(respond())
+        responses = [response.payload async for response in call]
+        await task
+
+        self.assertEqual(['a', 'b', 'c', 'd'], responses)
+        self.assertIs(Status.OK, call.status)
+        self.assertEqual(0, call.dropped_responses)
+
+    async def test_server_streaming_call_collects_all_responses(self) -> None:
+        method = self._service.SomeServerStreaming.method
+        self._replies += [
+            self._stream_packet(method, str(i)) for i in range(5)
+        ]
+        self._replies.append(self._response_packet(method, Status.OK))
+
+        status, responses = await self._service.SomeServerStreaming()
+
+        self.assertIs(Status.OK, status)
+        self.assertEqual([str(i) for i in range(5)],
+                         [r.payload for r in responses])
+
+    async def test_server_streaming_get_responses_count(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        self._client.process_packet(self._stream_packet(call.method, 'x'))
+        self._client.process_packet(self._stream_packet(call.method, 'y'))
+
+        first = [r.payload async for r in call.get_responses(count=1)]
+        self.assertEqual(['x'], first)
+        self.assertEqual(1, call.buffered_responses())
+
+    async def test_server_streaming_error_after_responses(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        self._client.process_packet(self._stream_packet(call.method, 'x'))
+        self._client.process_packet(
+            self._error_packet(call.method, Status.INTERNAL))
+
+        received = []
+        with self.assertRaises(asyncio_client.RpcError):
+            async for response in call:
+                received.append(response.payload)
+
+        self.assertEqual(['x'], received)
+
+    async def test_server_streaming_timeout(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+
+        with self.assertRaises(asyncio_client.RpcTimeout):
+            async for _ in call.get_responses(timeout_s=0.01):
+                pass
+
+    async def test_full_buffer_applies_backpressure(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        self._client.process_packet(self._stream_packet(call.method, 'a'))
+        self.assertFalse(self._impl.backpressured())
+
+        self._client.process_packet(self._stream_packet(call.method, 'b'))
+        self.assertTrue(self._impl.backpressured())
+
+        waiter = asyncio.create_task(self._impl.wait_for_capacity())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        self.assertEqual(
+            ['a'], [r.payload async for r in call.get_responses(count=1)])
+        await asyncio.wait_for(waiter, 1)
+        self.assertFalse(self._impl.backpressured())
+
+    async def test_full_buffer_drops_oldest_response(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        for payload in ('a', 'b', 'c'):
+            self._client.process_packet(
+                self._stream_packet(call.method, payload))
+        self._client.process_packet(
+            self._response_packet(call.method, Status.OK))
+
+        self.assertEqual(1, call.dropped_responses)
+        self.assertEqual(['b', 'c'], [r.payload async for r in call])
+
+    async def test_per_call_buffer_limit(self) -> None:
+        call = self._service.SomeServerStreaming.invoke(
+            max_buffered_responses=10)
+        for i in range(10):
+            self._client.process_packet(
+                self._stream_packet(call.method, str(i)))
+
+        self.assertEqual(0, call.dropped_responses)
+        self.assertEqual(10, call.buffered_responses())
+        self.assertTrue(self._impl.backpressured())
+
+    async def test_cancel_releases_backpressure(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        self._client.process_packet(self._stream_packet(call.method, 'a'))
+        self._client.process_packet(self._stream_packet(call.method, 'b'))
+        self.assertTrue(self._impl.backpressured())
+
+        self.assertTrue(call.cancel())
+
+        self.assertFalse(self._impl.backpressured())
+        self.assertEqual(packet_pb2.PacketType.CLIENT_ERROR,
+                         self.requests[-1].type)
+        self.assertIs(Status.CANCELLED, Status(self.requests[-1].status))
+
+    async def test_completion_releases_backpressure(self) -> None:
+        call = self._service.SomeServerStreaming.invoke()
+        self._client.process_packet(self._stream_packet(call.method, 'a'))
+        self._client.process_packet(self._stream_packet(call.method, 'b'))
+        self._client.process_packet(
+            self._response_packet(call.method, Status.OK))
+
+        self.assertFalse(self._impl.backpressured())
+        self.assertEqual(['a', 'b'], [r.payload async for r in call])
+
+    async def test_packets_processed_in_another_thread(self) -> None:
+        call = self._service.SomeServerStreaming.invoke(
+            max_buffered_responses=100)
+
+        def process() -> None:
+            for i in range(50):
+                self._client.process_packet(
+                    self._stream_packet(call.method, str(i)))
+            self._client.process_packet(
+                self._response_packet(call.method, Status.OK))
+
+        thread = threading.Thread(target=process)
+        thread.start()
+        responses = [r.payload async for r in call.get_responses(timeout_s=5)]
+        thread.join()
+
+        self.assertEqual([str(i) for i in range(50)], responses)
+        self.assertIs(Status.OK, call.status)
+
+    async def test_client_streaming(self) -> None:
+        stub = self._service.SomeClientStreaming
+        call = stub.invoke()
+        call.send(magic_number=1)
+        call.send(stub.method.request_type(magic_number=2))
+
+        self._replies.append(
+            self._response_packet(stub.method, Status.OK, 'sum'))
+        status, response = await call.finish_and_wait()
+
+        self.assertIs(Status.OK, status)
+        self.assertEqual('sum', response.payload)
+        self.assertEqual([
+            packet_pb2.PacketType.REQUEST,
+            packet_pb2.PacketType.CLIENT_STREAM,
+            packet_pb2.PacketType.CLIENT_STREAM,
+            packet_pb2.PacketType.CLIENT_STREAM_END,
+        ], [request.type for request in self.requests])
+
+    async def test_bidirectional_streaming(self) -> None:
+        call = self._service.SomeBidiStreaming.invoke()
+
+        self._replies.append(self._stream_packet(call.method, 'pong'))
+        call.send(magic_number=1)
+        self.assertEqual(
+            ['pong'], [r.payload async for r in call.get_responses(count=1)])
+
+        self._replies.append(self._stream_packet(call.method, 'last'))
+        self._replies.append(self._response_packet(call.method, Status.OK))
+        status, responses = await call.finish_and_wait()
+
+        self.assertIs(Status.OK, status)
+        self.assertEqual(['last'], [r.payload for r in responses])
+
+    async def test_send_after_completion_fails(self) -> None:
+        call = self._service.SomeBidiStreaming.invoke()
+        self._client.process_packet(
+            self._response_packet(call.method, Status.OK))
+
+        with self.assertRaises(asyncio_client.RpcError):
+            call.send(magic_number=1)
+
+    async def test_duplicate_call_cancels_previous(self) -> None:
+        first = self._service.SomeServerStreaming.invoke()
+        second = self._service.SomeServerStreaming.invoke()
+
+        self.assertIs(Status.CANCELLED, first.error)
+        self.assertFalse(second.completed())
+
+    def test_max_buffered_responses_must_be_positive(self) -> None:
+        with self.assertRaises(ValueError):
+            asyncio_client.Impl(max_buffered_responses=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
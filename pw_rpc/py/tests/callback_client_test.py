@@ -14,6 +14,8 @@
 # the License.
 """Tests using the callback client for pw_rpc."""
 
+import threading
+import time
 import unittest
 from unittest import mock
 from typing import Any, List, Optional, Tuple
@@ -575,6 +577,103 @@ class ServerStreamingTest(_CallbackClientImplTestBase):
         self.assertEqual(list(call.get_responses()), [])
         self.assertEqual(list(call), [])
 
+    def _enqueue_numbered_stream(self, count: int) -> list:
+        replies = [
+            self.method.response_type(payload=str(i)) for i in range(count)
+        ]
+        for reply in replies:
+            self._enqueue_server_stream(1, self.method, reply)
+        self._enqueue_response(1, self.method, Status.OK)
+        return replies
+
+    def test_max_responses_keeps_first_responses(self) -> None:
+        replies = self._enqueue_numbered_stream(5)
+        callback = mock.Mock()
+
+        call = self.rpc.invoke(on_next=callback, max_responses=2)
+
+        self.assertEqual(callback.call_count, 5)
+        self.assertEqual(call.responses, replies[:2])
+        self.assertEqual(call.dropped_responses, 3)
+        self.assertEqual(list(call), replies[:2])
+        self.assertEqual(call.wait(), (Status.OK, replies[:2]))
+
+    def test_max_responses_ring_buffer_keeps_last_responses(self) -> None:
+        replies = self._enqueue_numbered_stream(5)
+
+        call = self.rpc.invoke(
+            max_responses=2,
+            overflow=callback_client.OverflowPolicy.DROP_OLDEST)
+
+        self.assertEqual(call.responses, replies[3:])
+        self.assertEqual(call.dropped_responses, 3)
+        self.assertEqual(list(call), replies[3:])
+        self.assertEqual(call.wait(), (Status.OK, replies[3:]))
+
+    def test_max_responses_zero_retains_nothing(self) -> None:
+        self._enqueue_numbered_stream(3)
+        callback = mock.Mock()
+
+        call = self.rpc.invoke(on_next=callback, max_responses=0)
+
+        self.assertEqual(callback.call_count, 3)
+        self.assertEqual(call.responses, [])
+        self.assertEqual(call.dropped_responses, 3)
+        self.assertEqual(list(call), [])
+
+    def test_max_responses_iteration_frees_queue(self) -> None:
+        call = self.rpc.invoke(max_responses=2)
+        self._enqueue_server_stream(1, self.method,
+                                    self.method.response_type(payload='a'))
+        self._process_enqueued_packets()
+
+        self.assertEqual(list(call.get_responses(count=1)),
+                         [self.method.response_type(payload='a')])
+
+        replies = self._enqueue_numbered_stream(2)
+        self._process_enqueued_packets()
+
+        # The queue had room for both responses, but the retained responses
+        # were limited to two.
+        self.assertEqual(list(call), replies)
+        self.assertEqual(call.dropped_responses, 1)
+
+    def test_max_responses_negative(self) -> None:
+        with self.assertRaises(ValueError):
+            self.rpc.invoke(max_responses=-1)
+
+    def test_open_with_max_responses(self) -> None:
+        replies = self._enqueue_numbered_stream(4)
+
+        call = self.rpc.open(
+            max_responses=3,
+            overflow=callback_client.OverflowPolicy.DROP_OLDEST)
+        self._process_enqueued_packets()
+
+        self.assertEqual(call.responses, replies[1:])
+        self.assertEqual(call.dropped_responses, 1)
+
+    def test_cancel_wakes_iterating_thread(self) -> None:
+        call = self.rpc.invoke()
+        errors: list = []
+
+        def iterate() -> None:
+            try:
+                for _ in call.get_responses(timeout_s=5):
+                    pass
+            except callback_client.RpcError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=iterate)
+        thread.start()
+        time.sleep(0.01)
+        call.cancel()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIs(errors[0].status, Status.CANCELLED)
+
 
 class ClientStreamingTest(_CallbackClientImplTestBase):
     """Tests for client streaming RPCs."""
@@ -15,6 +15,7 @@
 """Tests creating pw_rpc client."""
 
 import unittest
+from unittest import mock
 from typing import Optional
 
 from pw_protobuf_compiler import python_protos
@@ -305,6 +306,44 @@ class ClientTest(unittest.TestCase):
                 packets.encode_response((1, method.service, method), reply)),
             Status.OK)
 
+    def test_process_packet_non_pending_does_not_decode_payload(self) -> None:
+        method = self._client.method('pw.test1.PublicService.SomeUnary')
+
+        with mock.patch.object(packets, 'decode_payload') as decode_payload:
+            self.assertIs(
+                self._client.process_packet(
+                    packets.encode_response((1, method.service, method),
+                                            method.response_type())),
+                Status.OK)
+
+        decode_payload.assert_not_called()
+        self.assertEqual(
+            self._last_packet_sent(),
+            RpcPacket(type=PacketType.CLIENT_ERROR,
+                      channel_id=1,
+                      service_id=method.service.id,
+                      method_id=method.id,
+                      status=Status.FAILED_PRECONDITION.value))
+
+    def test_process_packet_reuses_pending_rpc(self) -> None:
+        method = self._client.method(
+            'pw.test1.PublicService.SomeServerStreaming')
+        rpcs = []
+        self._client.response_callback = lambda rpc, *_: rpcs.append(rpc)
+
+        for _ in range(3):
+            self._client.process_packet(
+                packets.encode_response((1, method.service, method),
+                                        method.response_type()))
+
+        self.assertEqual(len(rpcs), 3)
+        self.assertIs(rpcs[0], rpcs[1])
+        self.assertIs(rpcs[1], rpcs[2])
+        self.assertEqual(
+            rpcs[0],
+            client.PendingRpc(
+                self._client.channel(1).channel, method.service, method))
+
 
 if __name__ == '__main__':
     unittest.main()
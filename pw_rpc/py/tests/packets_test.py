@@ -14,8 +14,10 @@
 # the License.
 """Tests creating pw_rpc client."""
 
+import random
 import unittest
 
+from google.protobuf.message import DecodeError
 from pw_status import Status
 
 from pw_rpc.internal.packet_pb2 import PacketType, RpcPacket
@@ -94,5 +96,103 @@ class PacketsTest(unittest.TestCase):
                           payload=RpcPacket(status=321).SerializeToString())))
 
 
+_PAYLOAD_SIZES = (0, 1, 127, 128, 300)
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+def _random_uint32(rng: random.Random) -> int:
+    return rng.choice([
+        0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 2**31, 2**32 - 1,
+        rng.randrange(2**32)
+    ])
+
+
+def _random_packet(rng: random.Random) -> RpcPacket:
+    return RpcPacket(type=rng.choice(list(PacketType.values())),
+                     channel_id=_random_uint32(rng),
+                     service_id=_random_uint32(rng),
+                     method_id=_random_uint32(rng),
+                     payload=_random_bytes(rng, rng.choice(_PAYLOAD_SIZES)),
+                     status=_random_uint32(rng),
+                     call_id=_random_uint32(rng))
+
+
+def _decode_with_protobuf(data: bytes):
+    try:
+        return packets.DecodedPacket.from_proto(packets.decode(data))
+    except DecodeError:
+        return DecodeError
+
+
+def _decode_packet(data: bytes):
+    try:
+        return packets.decode_packet(data)
+    except DecodeError:
+        return DecodeError
+
+
+class PacketCodecFuzzTest(unittest.TestCase):
+    """Compares the hand-written packet codec to the protobuf library."""
+    def setUp(self) -> None:
+        self._rng = random.Random(1234)
+
+    def test_encode_packet_matches_protobuf(self) -> None:
+        for _ in range(2000):
+            packet = _random_packet(self._rng)
+            self.assertEqual(packets.encode_packet(
+                packet.type, packet.channel_id, packet.service_id,
+                packet.method_id, packet.payload, packet.status,
+                packet.call_id),
+                             packet.SerializeToString(),
+                             msg=str(packet))
+
+    def test_encode_packet_out_of_range(self) -> None:
+        for args in [(1, -1, 0, 0), (1, 2**32, 0, 0), (1, 0, 2**32, 0),
+                     (1, 0, 0, -1), (2**31, 0, 0, 0)]:
+            with self.assertRaises(ValueError):
+                packets.encode_packet(*args)
+
+    def test_decode_packet_matches_protobuf(self) -> None:
+        for _ in range(2000):
+            data = _random_packet(self._rng).SerializeToString()
+            self.assertEqual(
+                packets.decode_packet(data),
+                packets.DecodedPacket.from_proto(packets.decode(data)))
+
+    def test_decode_corrupted_packet_matches_protobuf(self) -> None:
+        for _ in range(5000):
+            data = bytearray(_random_packet(self._rng).SerializeToString())
+
+            for _ in range(self._rng.randint(1, 3)):
+                mutation = self._rng.randrange(4)
+                if mutation == 0 and data:  # Flip a byte
+                    data[self._rng.randrange(
+                        len(data))] = self._rng.randrange(256)
+                elif mutation == 1 and data:  # Truncate
+                    del data[self._rng.randrange(len(data)):]
+                elif mutation == 2:  # Append an unknown or duplicate field
+                    data += _random_bytes(self._rng, 6)
+                else:  # Insert random bytes
+                    pos = self._rng.randint(0, len(data))
+                    data[pos:pos] = _random_bytes(self._rng, 3)
+
+            self.assertEqual(_decode_packet(bytes(data)),
+                             _decode_with_protobuf(bytes(data)),
+                             msg=repr(bytes(data)))
+
+    def test_decode_packet_accepts_memoryview(self) -> None:
+        data = _TEST_REQUEST.SerializeToString()
+        self.assertEqual(
+            packets.decode_packet(memoryview(data)).to_proto(), _TEST_REQUEST)
+
+    def test_decode_packet_is_mutable(self) -> None:
+        packet = packets.decode_packet(_TEST_REQUEST.SerializeToString())
+        packet.type = PacketType.RESPONSE
+        self.assertFalse(packets.for_server(packet))
+
+
 if __name__ == '__main__':
     unittest.main()
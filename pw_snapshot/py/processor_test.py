@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for the snapshot processor."""
+
+from pathlib import Path
+import tempfile
+import unittest
+
+import pw_tokenizer
+from pw_snapshot import processor
+from pw_snapshot_metadata.metadata import MetadataProcessor
+from pw_snapshot_protos import snapshot_pb2
+from pw_thread_protos import thread_pb2
+from pw_tokenizer import tokens
+
+_TOKENIZED_REASON = b'\xc3\xc4\x9b\x3a'
+_TOKENS = tokens.Database([
+    tokens.TokenizedStringEntry(0x3A9BC4C3, 'Assert failed: 1+1 == 42'),
+])
+
+
+def _snapshot(device_name: str) -> snapshot_pb2.Snapshot:
+    snapshot = snapshot_pb2.Snapshot()
+    snapshot.metadata.reason = _TOKENIZED_REASON
+    snapshot.metadata.device_name = device_name.encode()
+    snapshot.threads.append(
+        thread_pb2.Thread(name=b'Idle',
+                          state=thread_pb2.ThreadState.Enum.RUNNING))
+    return snapshot
+
+
+def _nested_snapshot() -> snapshot_pb2.Snapshot:
+    snapshot = _snapshot('main')
+    snapshot.related_snapshots.append(_snapshot('sensor'))
+    snapshot.related_snapshots[0].related_snapshots.append(_snapshot('radio'))
+    return snapshot
+
+
+class ProcessSnapshotsTest(unittest.TestCase):
+    """Tests processing snapshots with embedded snapshots."""
+    def setUp(self):
+        super().setUp()
+        self.detok = pw_tokenizer.Detokenizer(_TOKENS)
+
+    def test_processes_nested_snapshots(self):
+        output = processor.process_snapshots(
+            _nested_snapshot().SerializeToString(), self.detok)
+
+        self.assertEqual(output.count('Assert failed: 1+1 == 42'), 3)
+        for device in ('main', 'sensor', 'radio'):
+            self.assertIn(f'Device:            {device}', output)
+
+    def test_callback_gets_captured_snapshots(self):
+        snapshot = _nested_snapshot()
+        serialized: list = []
+
+        def callback(data: bytes) -> str:
+            serialized.append(data)
+            return ''
+
+        processor.process_snapshots(snapshot.SerializeToString(),
+                                    self.detok,
+                                    user_processing_callback=callback)
+
+        nested = snapshot.related_snapshots[0]
+        self.assertEqual(serialized, [
+            snapshot.SerializeToString(),
+            nested.SerializeToString(),
+            nested.related_snapshots[0].SerializeToString(),
+        ])
+
+    def test_symbolizer_matcher_sees_captured_metadata(self):
+        reasons = []
+        symbolizer = processor.LlvmSymbolizer()
+
+        def matcher(snapshot: snapshot_pb2.Snapshot) -> processor.Symbolizer:
+            reasons.append(snapshot.metadata.reason)
+            # Like the matcher in the docs, this detokenizes the metadata.
+            MetadataProcessor(snapshot.metadata, self.detok)
+            return symbolizer
+
+        output = processor.process_snapshots(
+            _nested_snapshot().SerializeToString(),
+            self.detok,
+            symbolizer_matcher=matcher)
+
+        self.assertEqual(reasons, [_TOKENIZED_REASON] * 3)
+        self.assertEqual(output.count('Assert failed: 1+1 == 42'), 3)
+
+
+class ProcessSnapshotDirectoryTest(unittest.TestCase):
+    """Tests processing a directory of snapshots in a batch."""
+    def setUp(self):
+        super().setUp()
+        self._dir = tempfile.TemporaryDirectory(prefix='pw_snapshot_test_')
+        self.snapshot_dir = Path(self._dir.name, 'snapshots')
+        self.snapshot_dir.mkdir()
+        self.out_dir = Path(self._dir.name, 'out')
+        self.token_db = Path(self._dir.name, 'tokens.csv')
+        with self.token_db.open('wb') as token_db:
+            tokens.write_csv(_TOKENS, token_db)
+
+    def tearDown(self):
+        self._dir.cleanup()
+        super().tearDown()
+
+    def test_processes_each_snapshot(self):
+        snapshots = {}
+        for i in range(6):
+            snapshot = _nested_snapshot().SerializeToString()
+            snapshots[f'crash_{i}.bin'] = snapshot
+            self.snapshot_dir.joinpath(f'crash_{i}.bin').write_bytes(snapshot)
+
+        failures = processor.process_snapshot_directory(self.snapshot_dir,
+                                                        self.out_dir,
+                                                        self.token_db,
+                                                        jobs=2)
+        self.assertEqual(failures, [])
+
+        detok = pw_tokenizer.Detokenizer(_TOKENS)
+        for name, snapshot in snapshots.items():
+            self.assertEqual(
+                self.out_dir.joinpath(f'{name}.txt').read_text('utf-8'),
+                processor.process_snapshots(snapshot, detok))
+
+    def test_reports_invalid_snapshots(self):
+        self.snapshot_dir.joinpath('good.bin').write_bytes(
+            _snapshot('main').SerializeToString())
+        self.snapshot_dir.joinpath('bad.bin').write_bytes(b'\xff\xff\xff')
+
+        failures = processor.process_snapshot_directory(self.snapshot_dir,
+                                                        self.out_dir,
+                                                        jobs=2)
+
+        self.assertEqual(failures, [self.snapshot_dir / 'bad.bin'])
+        self.assertTrue(self.out_dir.joinpath('good.bin.txt').exists())
+        self.assertFalse(self.out_dir.joinpath('bad.bin.txt').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
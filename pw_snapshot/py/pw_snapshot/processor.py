@@ -14,15 +14,19 @@
 """Tool for processing and outputting Snapshot protos as text"""
 
 import argparse
+import concurrent.futures
 import functools
+import itertools
 import logging
+import os
 import sys
 from pathlib import Path
-from typing import Optional, BinaryIO, TextIO, Callable
+from typing import Optional, List, TextIO, Callable
 import pw_tokenizer
 import pw_cpu_exception_cortex_m
 import pw_build_info.build_id
 from pw_snapshot_metadata import metadata
+from pw_snapshot_metadata_proto import snapshot_metadata_pb2
 from pw_snapshot_protos import snapshot_pb2
 from pw_symbolizer import LlvmSymbolizer, Symbolizer
 from pw_thread import thread_analyzer
@@ -52,6 +56,10 @@ ElfMatcher = Callable[[snapshot_pb2.Snapshot], Optional[Path]]
 # whether a Symbolizer may be loaded with a suitable ELF file for symbolization.
 SymbolizerMatcher = Callable[[snapshot_pb2.Snapshot], Symbolizer]
 
+# Maximum number of symbolizers, each of which runs an llvm-symbolizer process,
+# to keep for reuse when processing many snapshots.
+_MAX_SYMBOLIZERS = 8
+
 
 def process_snapshot(
         serialized_snapshot: bytes,
@@ -59,18 +67,30 @@ def process_snapshot(
         elf_matcher: Optional[ElfMatcher] = None,
         symbolizer_matcher: Optional[SymbolizerMatcher] = None) -> str:
     """Processes a single snapshot."""
+    snapshot = snapshot_pb2.Snapshot()
+    snapshot.ParseFromString(serialized_snapshot)
+    return _process_snapshot(snapshot, detokenizer, elf_matcher,
+                             symbolizer_matcher)
+
 
+def _process_snapshot(snapshot: snapshot_pb2.Snapshot,
+                      detokenizer: Optional[pw_tokenizer.Detokenizer],
+                      elf_matcher: Optional[ElfMatcher],
+                      symbolizer_matcher: Optional[SymbolizerMatcher]) -> str:
+    """Runs each analyzer on a decoded snapshot.
+
+    Analyzers detokenize fields of the snapshot in place, so the symbolizer
+    matcher is called first and the metadata is processed from a copy. This
+    way, both see the fields as they were captured.
+    """
     output = [_BRANDING]
 
-    captured_metadata = metadata.process_snapshot(serialized_snapshot,
-                                                  detokenizer)
-    if captured_metadata:
-        output.append(captured_metadata)
+    captured_metadata = None
+    if snapshot.HasField('metadata'):
+        captured_metadata = snapshot_metadata_pb2.Metadata()
+        captured_metadata.CopyFrom(snapshot.metadata)
 
     # Open a symbolizer.
-    snapshot = snapshot_pb2.Snapshot()
-    snapshot.ParseFromString(serialized_snapshot)
-
     if symbolizer_matcher is not None:
         symbolizer = symbolizer_matcher(snapshot)
     elif elf_matcher is not None:
@@ -78,13 +98,19 @@ def process_snapshot(
     else:
         symbolizer = LlvmSymbolizer()
 
-    cortex_m_cpu_state = pw_cpu_exception_cortex_m.process_snapshot(
-        serialized_snapshot, symbolizer)
-    if cortex_m_cpu_state:
-        output.append(cortex_m_cpu_state)
+    metadata_info = metadata.process_metadata(captured_metadata, snapshot.tags,
+                                              detokenizer)
+    if metadata_info:
+        output.append(metadata_info)
+
+    if snapshot.HasField('armv7m_cpu_state'):
+        output.append(
+            pw_cpu_exception_cortex_m.process_cpu_state(
+                snapshot.armv7m_cpu_state, symbolizer))
 
-    thread_info = thread_analyzer.process_snapshot(serialized_snapshot,
-                                                   detokenizer, symbolizer)
+    thread_info = str(
+        thread_analyzer.ThreadSnapshotAnalyzer(snapshot.threads, detokenizer,
+                                               symbolizer))
     if thread_info:
         output.append(thread_info)
 
@@ -106,84 +132,234 @@ def process_snapshots(
         elf_matcher: Optional[ElfMatcher] = None,
         user_processing_callback: Optional[Callable[[bytes], str]] = None,
         symbolizer_matcher: Optional[SymbolizerMatcher] = None) -> str:
-    """Processes a snapshot that may have multiple embedded snapshots."""
+    """Processes a snapshot that may have multiple embedded snapshots.
+
+    The snapshot is parsed once, and its embedded snapshots are processed from
+    the decoded message. They are only serialized again to pass them to the
+    user_processing_callback, if one is provided. Without a matcher, one
+    symbolizer is shared by all of the snapshots.
+    """
+    snapshot = snapshot_pb2.Snapshot()
+    snapshot.ParseFromString(serialized_snapshot)
+
+    if symbolizer_matcher is None and elf_matcher is None:
+        default_symbolizer = LlvmSymbolizer()
+        symbolizer_matcher = lambda _: default_symbolizer
+
+    return _process_snapshots(snapshot, serialized_snapshot, detokenizer,
+                              elf_matcher, user_processing_callback,
+                              symbolizer_matcher)
+
+
+def _process_snapshots(snapshot: snapshot_pb2.Snapshot,
+                       serialized_snapshot: Optional[bytes],
+                       detokenizer: Optional[pw_tokenizer.Detokenizer],
+                       elf_matcher: Optional[ElfMatcher],
+                       user_processing_callback: Optional[Callable[[bytes],
+                                                                   str]],
+                       symbolizer_matcher: Optional[SymbolizerMatcher]) -> str:
+    """Processes a decoded snapshot and its embedded snapshots."""
+    # Serialize the snapshot for the callback before it is detokenized.
+    if user_processing_callback is not None and serialized_snapshot is None:
+        serialized_snapshot = snapshot.SerializeToString()
+
     output = []
     # Process the top-level snapshot.
     output.append(
-        process_snapshot(serialized_snapshot, detokenizer, elf_matcher,
-                         symbolizer_matcher))
+        _process_snapshot(snapshot, detokenizer, elf_matcher,
+                          symbolizer_matcher))
 
     # If the user provided a custom processing callback, call it on each
     # snapshot.
     if user_processing_callback is not None:
+        assert serialized_snapshot is not None
         output.append(user_processing_callback(serialized_snapshot))
 
     # Process any related snapshots that were embedded in this one.
-    snapshot = snapshot_pb2.Snapshot()
-    snapshot.ParseFromString(serialized_snapshot)
     for nested_snapshot in snapshot.related_snapshots:
         output.append('\n[' + '=' * 78 + ']\n')
         output.append(
-            str(
-                process_snapshots(nested_snapshot.SerializeToString(),
-                                  detokenizer, elf_matcher,
-                                  user_processing_callback,
-                                  symbolizer_matcher)))
+            _process_snapshots(nested_snapshot, None, detokenizer, elf_matcher,
+                               user_processing_callback, symbolizer_matcher))
 
     return '\n'.join(output)
 
 
-def _snapshot_symbolizer_matcher(
-        artifacts_dir: Path,
-        snapshot: snapshot_pb2.Snapshot) -> LlvmSymbolizer:
+def _build_id_symbolizer(artifacts_dir: Path,
+                         build_id: bytes) -> LlvmSymbolizer:
     matching_elf: Optional[Path] = pw_build_info.build_id.find_matching_elf(
-        snapshot.metadata.software_build_uuid, artifacts_dir)
+        build_id, artifacts_dir)
     if not matching_elf:
         _LOG.error('Error: No matching ELF found for GNU build ID %s.',
-                   snapshot.metadata.software_build_uuid.hex())
+                   build_id.hex())
     return LlvmSymbolizer(matching_elf)
 
 
-def _load_and_dump_snapshots(in_file: BinaryIO, out_file: TextIO,
-                             token_db: Optional[TextIO],
-                             artifacts_dir: Optional[Path]):
-    detokenizer = None
-    if token_db:
-        detokenizer = pw_tokenizer.Detokenizer(token_db)
-    symbolizer_matcher: Optional[SymbolizerMatcher] = None
-    if artifacts_dir:
-        symbolizer_matcher = functools.partial(_snapshot_symbolizer_matcher,
-                                               artifacts_dir)
+class _SnapshotTools:
+    """A detokenizer and symbolizers shared by the snapshots a process handles.
+
+    Symbolizers are matched to snapshots by build ID, and the most recently used
+    ones are kept so that snapshots from the same build reuse them.
+    """
+    def __init__(self, token_db: Optional[Path],
+                 artifacts_dir: Optional[Path]):
+        self.detokenizer: Optional[pw_tokenizer.Detokenizer] = None
+        if token_db:
+            self.detokenizer = pw_tokenizer.Detokenizer(token_db)
+
+        self._default_symbolizer: Optional[Symbolizer] = None
+        self._symbolizer_for_build: Optional[Callable[[bytes],
+                                                      Symbolizer]] = None
+        if artifacts_dir:
+            self._symbolizer_for_build = functools.lru_cache(
+                maxsize=_MAX_SYMBOLIZERS)(functools.partial(
+                    _build_id_symbolizer, artifacts_dir))
+
+    def symbolizer(self, snapshot: snapshot_pb2.Snapshot) -> Symbolizer:
+        """A SymbolizerMatcher that reuses symbolizers."""
+        if self._symbolizer_for_build is not None:
+            return self._symbolizer_for_build(
+                snapshot.metadata.software_build_uuid)
+
+        if self._default_symbolizer is None:
+            self._default_symbolizer = LlvmSymbolizer()
+        return self._default_symbolizer
+
+
+# The detokenizer and symbolizers of a batch worker process.
+_worker_tools: Optional[_SnapshotTools] = None
+
+
+def _init_batch_worker(token_db: Optional[Path],
+                       artifacts_dir: Optional[Path]) -> None:
+    global _worker_tools  # pylint: disable=global-statement
+    _worker_tools = _SnapshotTools(token_db, artifacts_dir)
+
+
+def _process_snapshot_file(snapshot_file: Path,
+                           out_dir: Path) -> Optional[str]:
+    """Processes a snapshot in a batch worker; returns the error, if any."""
+    assert _worker_tools is not None
+
+    try:
+        output = process_snapshots(snapshot_file.read_bytes(),
+                                   _worker_tools.detokenizer,
+                                   symbolizer_matcher=_worker_tools.symbolizer)
+        out_dir.joinpath(f'{snapshot_file.name}.txt').write_text(
+            output, encoding='utf-8')
+    except Exception as err:  # pylint: disable=broad-except
+        return f'{type(err).__name__}: {err}'
+
+    return None
+
+
+def process_snapshot_directory(snapshot_dir: Path,
+                               out_dir: Path,
+                               token_db: Optional[Path] = None,
+                               artifacts_dir: Optional[Path] = None,
+                               jobs: Optional[int] = None) -> List[Path]:
+    """Processes each snapshot file in a directory with a pool of processes.
+
+    The output for each snapshot is written to out_dir, to a file named after
+    the snapshot with a .txt suffix. Each worker process loads the token
+    database once and reuses its symbolizers for all of the snapshots it
+    processes, rather than setting them up for every snapshot.
+
+    Args:
+      snapshot_dir: directory of binary snapshot files
+      out_dir: directory to which to write the decoded snapshots
+      token_db: token database or ELF file to use for detokenization
+      artifacts_dir: directory to recursively search for matching ELF files
+          to use for symbolization
+      jobs: number of worker processes; defaults to the number of CPUs
+
+    Returns:
+      the snapshot files that could not be processed
+    """
+    snapshot_files = sorted(path for path in snapshot_dir.iterdir()
+                            if path.is_file())
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = jobs or os.cpu_count() or 1
+    # Send snapshots to workers in chunks to reduce IPC overhead, but keep the
+    # chunks small enough to balance the load between workers.
+    chunksize = max(len(snapshot_files) // (jobs * 4), 1)
+
+    failures: List[Path] = []
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_batch_worker,
+            initargs=(token_db, artifacts_dir)) as executor:
+        errors = executor.map(_process_snapshot_file,
+                              snapshot_files,
+                              itertools.repeat(out_dir),
+                              chunksize=chunksize)
+        for snapshot_file, error in zip(snapshot_files, errors):
+            if error is not None:
+                _LOG.error('Failed to process %s: %s', snapshot_file, error)
+                failures.append(snapshot_file)
+
+    _LOG.info('Processed %d snapshots from %s; %d failed', len(snapshot_files),
+              snapshot_dir, len(failures))
+    return failures
+
+
+def _load_and_dump_snapshots(in_file: Path, out_file: TextIO,
+                             out_dir: Optional[Path], token_db: Optional[Path],
+                             artifacts_dir: Optional[Path],
+                             jobs: Optional[int]) -> int:
+    if in_file.is_dir():
+        if out_dir is None:
+            _LOG.error('--out-dir is required to process a directory')
+            return 1
+
+        failures = process_snapshot_directory(in_file, out_dir, token_db,
+                                              artifacts_dir, jobs)
+        return 1 if failures else 0
+
+    tools = _SnapshotTools(token_db, artifacts_dir)
     out_file.write(
-        process_snapshots(serialized_snapshot=in_file.read(),
-                          detokenizer=detokenizer,
-                          symbolizer_matcher=symbolizer_matcher))
+        process_snapshots(serialized_snapshot=in_file.read_bytes(),
+                          detokenizer=tools.detokenizer,
+                          symbolizer_matcher=tools.symbolizer))
+    return 0
 
 
 def _parse_args():
     parser = argparse.ArgumentParser(description='Decode Pigweed snapshots')
-    parser.add_argument('in_file',
-                        type=argparse.FileType('rb'),
-                        help='Binary snapshot file')
+    parser.add_argument(
+        'in_file',
+        type=Path,
+        help=('Binary snapshot file, or a directory of snapshot files to '
+              'process in a batch'))
     parser.add_argument(
         '--out-file',
         '-o',
         default='-',
-        type=argparse.FileType('wb'),
+        type=argparse.FileType('w', encoding='utf-8'),
         help='File to output decoded snapshots to. Defaults to stdout.')
+    parser.add_argument(
+        '--out-dir',
+        type=Path,
+        help='Directory to output decoded snapshots to in batch mode.')
     parser.add_argument(
         '--token-db',
-        type=argparse.FileType('r'),
+        type=Path,
         help='Token database or ELF file to use for detokenization.')
     parser.add_argument(
         '--artifacts-dir',
         type=Path,
         help=('Directory to recursively search for matching ELF files to use '
               'for symbolization.'))
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        type=int,
+        help=('Number of processes to use in batch mode. Defaults to the '
+              'number of CPUs.'))
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     logging.basicConfig(format='%(message)s', level=logging.INFO)
-    _load_and_dump_snapshots(**vars(_parse_args()))
-    sys.exit(0)
+    sys.exit(_load_and_dump_snapshots(**vars(_parse_args())))
@@ -40,18 +40,30 @@ def process_snapshot(serialized_snapshot: bytes,
     snapshot = snapshot_metadata_pb2.SnapshotBasicInfo()
     snapshot.ParseFromString(serialized_snapshot)
 
+    return process_metadata(
+        snapshot.metadata if snapshot.HasField('metadata') else None,
+        snapshot.tags, tokenizer_db)
+
+
+def process_metadata(metadata: Optional[snapshot_metadata_pb2.Metadata],
+                     tags: Mapping[str, str],
+                     tokenizer_db: Optional[pw_tokenizer.Detokenizer]) -> str:
+    """Processes decoded snapshot metadata and tags into a multi-line string.
+
+    Tokenized metadata fields are detokenized in place.
+    """
     output: List[str] = []
 
-    if snapshot.HasField('metadata'):
+    if metadata is not None:
         output.extend((
-            str(MetadataProcessor(snapshot.metadata, tokenizer_db)),
+            str(MetadataProcessor(metadata, tokenizer_db)),
             '',
         ))
 
-    if snapshot.tags:
-        tags = _process_tags(snapshot.tags)
-        if tags:
-            output.append(tags)
+    if tags:
+        tags_text = _process_tags(tags)
+        if tags_text:
+            output.append(tags_text)
         # Trailing blank line for spacing.
         output.append('')
 
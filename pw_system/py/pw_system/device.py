@@ -83,14 +83,16 @@ class Device:
         """Opens a log RPC for the device's unrequested log stream.
 
         The RPCs remain open until the server cancels or closes them, either
-        with a response or error packet.
+        with a response or error packet. Logs are handled as they arrive, so
+        the call does not retain any responses.
         """
         self.rpcs.pw.log.Logs.Listen.open(
             on_next=lambda _, log_entries_proto: self.
             _log_entries_proto_parser(log_entries_proto),
             on_completed=lambda _, status: _LOG.info(
                 'Log stream completed with status: %s', status),
-            on_error=lambda _, error: self._handle_log_stream_error(error))
+            on_error=lambda _, error: self._handle_log_stream_error(error),
+            max_responses=0)
 
     def _handle_log_stream_error(self, error: Status):
         """Resets the log stream RPC on error to avoid losing logs."""
@@ -13,7 +13,7 @@
 # the License.
 """Library to analyze and dump Thread protos and Thread snapshots into text."""
 
-from typing import Optional, List, Mapping
+from typing import Optional, List, Mapping, Sequence, Union
 import pw_tokenizer
 from pw_symbolizer import LlvmSymbolizer, Symbolizer
 from pw_tokenizer import proto as proto_detokenizer
@@ -173,10 +173,21 @@ class ThreadInfo:
 class ThreadSnapshotAnalyzer:
     """This class simplifies dumping contents of a snapshot Metadata message."""
     def __init__(self,
-                 threads: thread_pb2.SnapshotThreadInfo,
+                 threads: Union[thread_pb2.SnapshotThreadInfo,
+                                Sequence[thread_pb2.Thread]],
                  tokenizer_db: Optional[pw_tokenizer.Detokenizer] = None,
                  symbolizer: Optional[Symbolizer] = None):
-        self._threads = threads.threads
+        """Analyzes the threads in a snapshot.
+
+        Args:
+          threads: a SnapshotThreadInfo, or the threads of a decoded Snapshot;
+              thread names are detokenized in place
+          tokenizer_db: detokenizer for tokenized thread names
+          symbolizer: symbolizer for thread backtraces
+        """
+        if isinstance(threads, thread_pb2.SnapshotThreadInfo):
+            threads = threads.threads
+        self._threads: Sequence[thread_pb2.Thread] = threads
         self._tokenizer_db = (tokenizer_db if tokenizer_db is not None else
                               pw_tokenizer.Detokenizer(None))
         if symbolizer is not None:
@@ -117,6 +117,14 @@ class ThreadSnapshotAnalyzerTest(unittest.TestCase):
         self.assertEqual(analyzer.active_thread(), None)
         self.assertEqual(str(ThreadSnapshotAnalyzer(snapshot)), expected)
 
+    def test_thread_sequence(self):
+        """Ensures threads can be passed without a SnapshotThreadInfo."""
+        snapshot = thread_pb2.SnapshotThreadInfo()
+        snapshot.threads.append(thread_pb2.Thread(name=b'Idle'))
+
+        self.assertEqual(str(ThreadSnapshotAnalyzer(list(snapshot.threads))),
+                         str(ThreadSnapshotAnalyzer(snapshot)))
+
     def test_two_threads(self):
         """Ensures multiple threads are printed correctly."""
         snapshot = thread_pb2.SnapshotThreadInfo()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Measures how long it takes to build a token database from many ELFs.
+
+Generates ELF files with overlapping tokenized strings, then compares reading
+and merging them one at a time to load_token_databases_parallel().
+
+Example:
+
+  python database_benchmark.py --elfs 32 --strings 20000 --jobs 8
+"""
+
+import argparse
+import os
+from pathlib import Path
+import random
+import struct
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+from pw_tokenizer import database, tokens
+
+_ENTRY = struct.Struct('<4I')
+_ENTRY_MAGIC = 0xBAA98DEE
+
+_SECTION_HEADER = struct.Struct('<IIQQQQIIQQ')
+_SHT_PROGBITS = 1
+_SHT_STRTAB = 3
+
+
+def _elf(strings: List[str]) -> bytes:
+    """Creates a 64-bit ELF with a .pw_tokenizer.entries section."""
+    entries = b''.join(
+        _ENTRY.pack(_ENTRY_MAGIC, tokens.default_hash(string), 1,
+                    len(string) + 1) + b'\0' + string.encode() + b'\0'
+        for string in strings)
+    names = b'\0.shstrtab\0.pw_tokenizer.entries\0'
+
+    names_offset = 64
+    entries_offset = names_offset + len(names)
+    headers_offset = entries_offset + len(entries)
+
+    elf_header = (b'\x7fELF\x02\x01\x01'.ljust(16, b'\0') +
+                  struct.pack('<HHIQQQIHHHHHH', 1, 62, 1, 0, 0, headers_offset,
+                              0, 64, 0, 0, _SECTION_HEADER.size, 3, 1))
+    headers = b''.join((
+        _SECTION_HEADER.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        _SECTION_HEADER.pack(1, _SHT_STRTAB, 0, 0, names_offset, len(names), 0,
+                             0, 1, 0),
+        _SECTION_HEADER.pack(11, _SHT_PROGBITS, 0, 0, entries_offset,
+                             len(entries), 0, 0, 1, 0),
+    ))
+    return elf_header + names + entries + headers
+
+
+def _write_elfs(directory: Path, elfs: int, strings: int,
+                seed: int) -> List[Path]:
+    """Writes ELFs that each contain a random subset of a shared string set."""
+    rng = random.Random(seed)
+    all_strings = [
+        f'Message {i} with value %d and name %s' for i in range(strings * 2)
+    ]
+
+    paths = []
+    for i in range(elfs):
+        paths.append(directory / f'firmware_{i}.elf')
+        paths[-1].write_bytes(_elf(rng.sample(all_strings, strings)))
+
+    return paths
+
+
+def _serial(paths: List[Path]) -> tokens.Database:
+    return tokens.Database.merged(*(database.load_token_database(path)
+                                    for path in paths))
+
+
+def _parallel(jobs: Optional[int]) -> Callable[[List[Path]], tokens.Database]:
+    def load(paths: List[Path]) -> tokens.Database:
+        return database.load_token_databases_parallel(
+            ((path, tokens.DEFAULT_DOMAIN) for path in paths), jobs)
+
+    return load
+
+
+def _time(name: str, function: Callable[[List[Path]], tokens.Database],
+          paths: List[Path]) -> str:
+    """Times loading the ELFs and returns the database as CSV."""
+    start = time.perf_counter()
+    db = function(paths)
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>18}: {elapsed:8.3f} s ({len(db)} entries)')
+    return str(db)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--elfs', type=int, default=16)
+    parser.add_argument('--strings', type=int, default=20000)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main(elfs: int, strings: int, jobs: int, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = _write_elfs(Path(directory), elfs, strings, seed)
+
+        expected = _time('serial', _serial, paths)
+        assert _time('parallel, 1 job', _parallel(1), paths) == expected
+        assert _time(f'parallel, {jobs} jobs', _parallel(jobs),
+                     paths) == expected
+
+
+if __name__ == '__main__':
+    main(**vars(_parse_args()))
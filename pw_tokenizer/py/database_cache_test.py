@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for the on-disk cache of token databases read from ELF files."""
+
+import os
+from pathlib import Path
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pw_tokenizer import database, database_cache, tokens
+
+ELF = Path(__file__).parent / 'example_binary_with_tokenized_strings.elf'
+ALL_DOMAINS = re.compile('.*')
+
+
+class DatabaseCacheTest(unittest.TestCase):
+    """Tests the DatabaseCache class."""
+    def setUp(self) -> None:
+        super().setUp()
+        self._dir = Path(tempfile.mkdtemp('_pw_tokenizer_test'))
+        self._cache = database_cache.DatabaseCache(self._dir / 'cache')
+        self._elf = self._dir / 'test.elf'
+        shutil.copy(ELF, self._elf)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._dir)
+        super().tearDown()
+
+    def _read(self, domain=ALL_DOMAINS) -> tokens.Database:
+        with self._elf.open('rb') as elf:
+            # pylint: disable=protected-access
+            return database._database_from_elf(elf, domain)
+            # pylint: enable=protected-access
+
+    def _load(self, domain=ALL_DOMAINS) -> tokens.Database:
+        return self._cache.load(self._elf, domain, lambda: self._read(domain))
+
+    def test_second_load_is_mapped_from_cache(self) -> None:
+        first = self._load()
+        self.assertNotIsInstance(first, tokens.MappedDatabase)
+
+        read = mock.Mock()
+        second = self._cache.load(self._elf, ALL_DOMAINS, read)
+        read.assert_not_called()
+
+        self.assertIsInstance(second, tokens.MappedDatabase)
+        self.assertEqual(str(first), str(second))
+        self.assertEqual(
+            sorted((e.token, e.string, e.domain) for e in first.entries()),
+            sorted((e.token, e.string, e.domain) for e in second.entries()))
+
+    def test_domains_are_cached_separately(self) -> None:
+        self._load(re.compile('TEST_DOMAIN'))
+        self._load(re.compile(''))
+
+        self.assertEqual(len(list(self._cache.directory.iterdir())), 2)
+        self.assertEqual(str(self._load(re.compile('TEST_DOMAIN'))),
+                         str(self._read(re.compile('TEST_DOMAIN'))))
+
+    def test_modified_elf_is_read_again(self) -> None:
+        self._load()
+
+        stat = self._elf.stat()
+        self._elf.write_bytes(self._elf.read_bytes() + b'\0')
+        self.assertNotIsInstance(self._load(), tokens.MappedDatabase)
+
+        # Changing the contents is detected even if the size and modified time
+        # are the same.
+        self._elf.write_bytes(self._elf.read_bytes()[:-1] + b'\1')
+        os.utime(self._elf, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertNotIsInstance(self._load(), tokens.MappedDatabase)
+
+    def test_evicts_least_recently_used(self) -> None:
+        first = self._dir / 'first.elf'
+        second = self._dir / 'second.elf'
+        shutil.copy(ELF, first)
+        shutil.copy(ELF, second)
+
+        # Give the ELFs different modified times so they have different keys.
+        os.utime(first, ns=(0, 1))
+        os.utime(second, ns=(0, 2))
+
+        self._load()
+        entry, = self._cache.directory.iterdir()
+        self._cache.max_size_bytes = entry.stat().st_size * 2
+
+        self._cache.load(first, ALL_DOMAINS, self._read)
+        first_entry, = set(self._cache.directory.iterdir()) - {entry}
+
+        # Mark the entry for test.elf as used more recently than first.elf.
+        os.utime(first_entry, ns=(0, 1))
+        os.utime(entry, ns=(0, 2))
+
+        # The cache is full, so adding another database evicts the least
+        # recently used one, which is first.elf.
+        self._cache.load(second, ALL_DOMAINS, self._read)
+        self.assertEqual(self._cache.size_bytes(), entry.stat().st_size * 2)
+        self.assertFalse(first_entry.exists())
+
+        self.assertIsInstance(self._load(), tokens.MappedDatabase)
+        self.assertNotIsInstance(
+            self._cache.load(first, ALL_DOMAINS, self._read),
+            tokens.MappedDatabase)
+
+    def test_elf_changed_while_reading_is_not_cached(self) -> None:
+        def read_and_replace() -> tokens.Database:
+            database = self._read()
+            self._elf.write_bytes(ELF.read_bytes() + b'changed')
+            return database
+
+        self._cache.load(self._elf, ALL_DOMAINS, read_and_replace)
+        self.assertEqual(self._cache.size_bytes(), 0)
+
+    def test_corrupt_entry_is_replaced(self) -> None:
+        self._load()
+        entry, = self._cache.directory.iterdir()
+        entry.write_bytes(b'TOKENS\0\2 truncated')
+
+        self.assertNotIsInstance(self._load(), tokens.MappedDatabase)
+        self.assertIsInstance(self._load(), tokens.MappedDatabase)
+
+    def test_unwritable_cache_directory(self) -> None:
+        self._cache.directory.write_bytes(b'not a directory')
+
+        self.assertEqual(str(self._load()), str(self._read()))
+
+    def test_clear(self) -> None:
+        self._load()
+        self.assertGreater(self._cache.size_bytes(), 0)
+
+        self._cache.clear()
+        self.assertEqual(self._cache.size_bytes(), 0)
+
+
+class LoadTokenDatabaseCacheTest(unittest.TestCase):
+    """Tests that database.load_token_database uses the default cache."""
+    def setUp(self) -> None:
+        super().setUp()
+        self._dir = tempfile.mkdtemp('_pw_tokenizer_test')
+        database_cache.set_default(database_cache.DatabaseCache(self._dir))
+
+    def tearDown(self) -> None:
+        database_cache.set_default(None)
+        shutil.rmtree(self._dir)
+        super().tearDown()
+
+    def test_load_elf_twice(self) -> None:
+        first = database.load_token_database(ELF, domain='.*')
+        second = database.load_token_database(ELF, domain='.*')
+
+        self.assertNotIsInstance(second, tokens.MappedDatabase)
+        self.assertEqual(str(first), str(second))
+
+        # Databases loaded from the cache can be modified like any other.
+        second.add([tokens.TokenizedStringEntry(1, 'new string')])
+        second.mark_removed([])
+
+    def test_load_elf_twice_memory_mapped(self) -> None:
+        first = database.load_token_database(ELF, domain='.*', memory_map=True)
+        second = database.load_token_database(ELF,
+                                              domain='.*',
+                                              memory_map=True)
+
+        self.assertNotIsInstance(first, tokens.MappedDatabase)
+        self.assertIsInstance(second, tokens.MappedDatabase)
+        self.assertEqual(str(first), str(second))
+
+    def test_default_disabled_without_directory(self) -> None:
+        with mock.patch.dict(os.environ, clear=True):
+            # pylint: disable=protected-access
+            database_cache._default_configured = False
+            self.assertIsNone(database_cache.default())
+            # pylint: enable=protected-access
+
+    def test_default_disabled_by_size(self) -> None:
+        with mock.patch.dict(os.environ, {
+                'PW_TOKENIZER_CACHE_DIR': self._dir,
+                'PW_TOKENIZER_CACHE_SIZE': '0',
+        }):
+            # pylint: disable=protected-access
+            database_cache._default_configured = False
+            self.assertIsNone(database_cache.default())
+            # pylint: enable=protected-access
+
+    def test_default_directory_from_environment(self) -> None:
+        with mock.patch.dict(os.environ,
+                             {'PW_TOKENIZER_CACHE_DIR': self._dir}):
+            # pylint: disable=protected-access
+            database_cache._default_configured = False
+            cache = database_cache.default()
+            # pylint: enable=protected-access
+
+        assert cache is not None
+        self.assertEqual(cache.directory, Path(self._dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
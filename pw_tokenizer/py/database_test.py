@@ -23,7 +23,7 @@ import tempfile
 import unittest
 from unittest import mock
 
-from pw_tokenizer import database
+from pw_tokenizer import database, database_cache, tokens
 
 # This is an ELF file with only the pw_tokenizer sections. It was created
 # from a tokenize_test binary built for the STM32F429i Discovery board. The
@@ -152,12 +152,56 @@ def run_cli(*args) -> None:
         sys.argv = original_argv
 
 
+def setUpModule():  # pylint: disable=invalid-name
+    # Read ELF files directly instead of through the user's database cache.
+    database_cache.set_default(None)
+
+
 def _mock_output() -> io.TextIOWrapper:
     output = io.BytesIO()
     output.name = '<fake stdout>'
     return io.TextIOWrapper(output, write_through=True)
 
 
+class LoadTokenDatabasesParallelTest(unittest.TestCase):
+    """Tests reading databases with load_token_databases_parallel."""
+    def setUp(self):
+        self._dir = Path(tempfile.mkdtemp('_pw_tokenizer_test'))
+        self._csv = self._dir / 'db.csv'
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_matches_serial_merge(self):
+        self._csv.write_text('2e668cd6,2019-06-11,"Jello, world!"\n'
+                             '01234567,2020-01-01,"Only in the CSV"\n')
+        sources = [
+            (TOKENIZED_ENTRIES_ELF, 'TEST_DOMAIN'),
+            (self._csv, ''),
+            (LEGACY_PLAIN_STRING_ELF, '.*'),
+            (TOKENIZED_ENTRIES_ELF, ''),
+        ]
+        serial = tokens.Database.merged(
+            *(database.load_token_database(path, domain=domain)
+              for path, domain in sources))
+
+        for jobs in (1, 2):
+            parallel = database.load_token_databases_parallel(sources, jobs)
+            self.assertEqual(str(serial), str(parallel))
+            self.assertEqual(
+                {entry.key(): entry.domain
+                 for entry in serial.entries()},
+                {entry.key(): entry.domain
+                 for entry in parallel.entries()})
+
+        # The ELF has the string, so it has no removal date.
+        jello, = parallel.token_to_entries[0x2e668cd6]
+        self.assertIsNone(jello.date_removed)
+
+    def test_empty(self):
+        self.assertEqual(len(database.load_token_databases_parallel([])), 0)
+
+
 class DatabaseCommandLineTest(unittest.TestCase):
     """Tests the database.py command line interface."""
     def setUp(self):
@@ -206,6 +250,69 @@ class DatabaseCommandLineTest(unittest.TestCase):
         self.assertEqual(CSV_DEFAULT_DOMAIN.splitlines(),
                          self._csv.read_text().splitlines())
 
+    def test_load_binary_database_is_read_into_memory(self):
+        binary = self._dir / 'db.bin'
+        run_cli('create', '--type', 'binary', '--database', binary, self._elf)
+        run_cli('create', '--database', self._csv, self._elf)
+
+        db = database.load_token_database(binary)
+        self.assertNotIsInstance(db, tokens.MappedDatabase)
+        self.assertEqual(str(db), self._csv.read_text())
+
+    def test_load_binary_database_memory_mapped(self):
+        binary = self._dir / 'db.bin'
+        run_cli('create', '--type', 'binary', '--database', binary, self._elf)
+        run_cli('create', '--database', self._csv, self._elf)
+
+        db = database.load_token_database(binary, memory_map=True)
+        self.assertIsInstance(db, tokens.MappedDatabase)
+        self.assertEqual(str(db), self._csv.read_text())
+
+    def test_binary_v2_create_add_and_purge(self):
+        binary = self._dir / 'db.bin'
+        run_cli('create', '--type', 'binary-v2', '--database', binary,
+                f'{self._elf}#TEST_DOMAIN')
+        run_cli('add', '--database', binary, f'{self._elf}#.*')
+
+        db = database.load_token_database(binary, memory_map=True)
+        self.assertIsInstance(db, tokens.MappedDatabase)
+        self.assertEqual(str(db).splitlines(), CSV_ALL_DOMAINS.splitlines())
+        self.assertIn('TEST_DOMAIN', {entry.domain for entry in db.entries()})
+        db.close()
+
+        run_cli('mark_removed', '--database', binary,
+                f'{self._elf}#TEST_DOMAIN')
+        run_cli('purge', '--database', binary)
+        run_cli('create', '--database', self._csv, binary)
+
+        self.assertEqual(self._csv_test_domain.splitlines(),
+                         self._csv.read_text().splitlines())
+        with binary.open('rb') as fd:
+            self.assertEqual(fd.read(8), tokens.BINARY_FORMAT_V2.magic)
+
+    def test_create_with_jobs(self):
+        elfs = []
+        for i in range(3):
+            elfs.append(self._dir / f'{i}.elf')
+            shutil.copy(self._elf, elfs[-1])
+
+        run_cli('create', '--jobs', '2', '--database', self._csv,
+                f'{self._dir}/*.elf#.*')
+        self.assertEqual(CSV_ALL_DOMAINS.splitlines(),
+                         self._csv.read_text().splitlines())
+
+    def test_add_with_jobs(self):
+        serial = self._dir / 'serial.csv'
+        serial.write_text(CSV_TEST_DOMAIN)
+        self._csv.write_text(CSV_TEST_DOMAIN)
+        elf_copy = self._dir / 'copy.elf'
+        shutil.copy(self._elf, elf_copy)
+
+        run_cli('add', '--database', serial, self._elf, elf_copy)
+        run_cli('add', '-j', '0', '--database', self._csv, self._elf, elf_copy)
+
+        self.assertEqual(serial.read_text(), self._csv.read_text())
+
     def test_add_does_not_recalculate_tokens(self):
         db_with_custom_token = '01234567,          ,"hello"'
 
@@ -15,6 +15,7 @@
 """Tests the tokenized string decode module."""
 
 from datetime import datetime
+import random
 import unittest
 
 import tokenized_string_decoding_test_data as tokenized_string
@@ -126,5 +127,74 @@ class TestFormattedString(unittest.TestCase):
                            missing_one_arg_extra_data.score())
 
 
+class TestFormatPlan(unittest.TestCase):
+    """Tests that FormatPlans format strings the same as FormatStrings."""
+    def _assert_same_result(self, format_string: str, encoded: bytes) -> None:
+        plan = decode.FormatPlan(decode.FormatString(format_string))
+
+        for show_errors in (False, True):
+            expected = decode.FormatString(format_string).format(
+                encoded, show_errors)
+            result = plan.format(encoded, show_errors)
+
+            self.assertEqual(result.value, expected.value)
+            self.assertEqual(result.remaining, expected.remaining)
+            self.assertEqual(result.ok(), expected.ok())
+            self.assertEqual(result.score(), expected.score())
+            self.assertEqual([str(arg) for arg in result.args],
+                             [str(arg) for arg in expected.args])
+
+        self.assertEqual(plan.render(encoded),
+                         expected.value if expected.ok() else None)
+
+    def test_generated_data(self) -> None:
+        for fmt, _, encoded in tokenized_string.TEST_DATA:
+            self._assert_same_result(fmt, encoded)
+
+    def test_varint_data(self) -> None:
+        for signed_spec, _, unsigned_spec, _, encoded in (
+                varint_test_data.TEST_DATA):
+            self._assert_same_result(signed_spec, encoded)
+            self._assert_same_result(unsigned_spec, encoded)
+            self._assert_same_result(f'{signed_spec} and %c', encoded)
+
+    def test_random_data(self) -> None:
+        format_strings = ('%d', '%u %s', '%s%s', '%c%lld', '%f %d%%', '%p',
+                          '%llx %x', '%-5s|%5.2f', 'no args', '%5.1e%%%s')
+        rng = random.Random(0)
+
+        for _ in range(2000):
+            encoded = bytes(
+                rng.getrandbits(8) for _ in range(rng.randint(0, 12)))
+            self._assert_same_result(rng.choice(format_strings), encoded)
+
+    def test_errors(self) -> None:
+        self._assert_same_result('Why, %c', b'\x01')
+        self._assert_same_result('%sXY%+ldxy%u', b'\x83N\x80!\x01\x02')
+        self._assert_same_result('%s%lld%9u', b'\x82$\x80\x80')
+        self._assert_same_result('%d', b'\x80' * 11)
+        self._assert_same_result('%d', b'\x02\x03')
+        self._assert_same_result('Unsupported %n', b'\x02')
+        self._assert_same_result('Unsupported %n', b'')
+
+    def test_truncated_string(self) -> None:
+        plan = decode.FormatPlan(decode.FormatString('[%s]'))
+        self.assertEqual(plan.render(b'\x83abc'), '[abc[...]]')
+        self._assert_same_result('[%s]', b'\x83abc')
+
+    def test_literal_percent(self) -> None:
+        plan = decode.FormatPlan(decode.FormatString('100%% %d%%'))
+        self.assertEqual(plan.render(b'\x02'), '100% 1%')
+        self.assertEqual(len(plan.format(b'\x02').args), 3)
+
+    def test_args_are_decoded_when_accessed(self) -> None:
+        result = decode.FormatPlan(
+            decode.FormatString('%d %s')).format(b'\x04\x02hi')
+
+        self.assertEqual(result.value, '2 hi')
+        self.assertEqual([arg.value for arg in result.args], [2, 'hi'])
+        self.assertEqual(result.args[1].raw_data, b'\x02hi')
+
+
 if __name__ == '__main__':
     unittest.main()
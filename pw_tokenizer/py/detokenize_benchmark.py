@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Measures tokenized messages detokenized per second.
+
+Compares formatting with FormatStrings, as Detokenizer did before format plans
+were added, to detokenize() and detokenize_many().
+
+Example:
+
+  python detokenize_benchmark.py --messages 200000
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from pw_tokenizer import decode, detokenize, encode, tokens
+
+_FORMAT_STRINGS = (
+    'Booting...',
+    'Battery at %d%%',
+    'Sensor %s read %d (0x%08x)',
+    'Temperature %f C, humidity %f%%',
+    'Task %s used %u of %u bytes of stack',
+    'Received %c from port %d',
+)
+
+_ARGS = {
+    'Booting...': (),
+    'Battery at %d%%': (87, ),
+    'Sensor %s read %d (0x%08x)': ('accel', -1203, 0xfeedbeef),
+    'Temperature %f C, humidity %f%%': (21.5, 40.25),
+    'Task %s used %u of %u bytes of stack': ('idle', 312, 1024),
+    'Received %c from port %d': (ord('x'), 3),
+}
+
+
+def _messages(count: int, seed: int) -> List[bytes]:
+    rng = random.Random(seed)
+    return [
+        encode.encode_token_and_args(tokens.default_hash(string),
+                                     *_ARGS[string])
+        for string in (rng.choice(_FORMAT_STRINGS) for _ in range(count))
+    ]
+
+
+def _format_strings(
+        detokenizer: detokenize.Detokenizer,
+        messages: List[bytes]) -> List[detokenize.DetokenizedString]:
+    """Formats messages with FormatStrings instead of FormatPlans."""
+    cache = {}
+    results = []
+    for message in messages:
+        token = detokenize.ENCODED_TOKEN.unpack_from(message)[0]
+        try:
+            entries = cache[token]
+        except KeyError:
+            entries = cache[token] = [
+                (entry, decode.FormatString(str(entry)))
+                for entry in detokenizer.database.token_to_entries[token]
+            ]
+        results.append(detokenize.DetokenizedString(token, entries, message))
+    return results
+
+
+def _detokenize(detokenizer: detokenize.Detokenizer,
+                messages: List[bytes]) -> List[detokenize.DetokenizedString]:
+    return [detokenizer.detokenize(message) for message in messages]
+
+
+def _detokenize_many(
+        detokenizer: detokenize.Detokenizer,
+        messages: List[bytes]) -> List[detokenize.DetokenizedString]:
+    return detokenizer.detokenize_many(messages)
+
+
+def _time(name: str, function: Callable[[detokenize.Detokenizer, List[bytes]],
+                                        List[detokenize.DetokenizedString]],
+          detokenizer: detokenize.Detokenizer,
+          messages: List[bytes]) -> List[str]:
+    """Times detokenizing messages and converting the results to strings."""
+    start = time.perf_counter()
+    results = [str(result) for result in function(detokenizer, messages)]
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>18}: {len(messages) / elapsed:10.0f} messages/s')
+    return results
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main(messages: int, seed: int) -> None:
+    encoded = _messages(messages, seed)
+    detokenizer = detokenize.Detokenizer(
+        tokens.Database.from_strings(_FORMAT_STRINGS))
+
+    expected = _time('FormatString', _format_strings, detokenizer, encoded)
+    for name, function in [('detokenize', _detokenize),
+                           ('detokenize_many', _detokenize_many)]:
+        assert _time(name, function, detokenizer, encoded) == expected
+
+
+if __name__ == '__main__':
+    main(**vars(_parse_args()))
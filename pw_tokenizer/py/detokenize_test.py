@@ -19,17 +19,25 @@ import datetime as dt
 import io
 import os
 from pathlib import Path
+import shutil
 import struct
 import tempfile
+import threading
 import unittest
 from unittest import mock
 
 from pw_tokenizer import database
+from pw_tokenizer import database_cache
 from pw_tokenizer import detokenize
 from pw_tokenizer import elf_reader
 from pw_tokenizer import tokens
 
 
+def setUpModule():  # pylint: disable=invalid-name
+    # Read ELF files directly instead of through the user's database cache.
+    database_cache.set_default(None)
+
+
 # This function is not part of this test. It was used to generate the binary
 # strings for EMPTY_ELF and ELF_WITH_TOKENIZER_SECTIONS. It takes a path and
 # returns a Python byte string suitable for copying into Python source code.
@@ -326,6 +334,53 @@ class DetokenizeTest(unittest.TestCase):
                          frozenset(detok.database.token_to_entries.keys()))
 
 
+class DetokenizeManyTest(unittest.TestCase):
+    """Tests detokenizing batches of messages."""
+    def setUp(self):
+        super().setUp()
+        self.detok = detokenize.Detokenizer(
+            tokens.Database([
+                tokens.TokenizedStringEntry(1, 'one %d'),
+                tokens.TokenizedStringEntry(2, 'two %s'),
+                tokens.TokenizedStringEntry(3, 'collision %s'),
+                tokens.TokenizedStringEntry(3, 'collision %d'),
+            ]))
+
+    def test_matches_detokenize(self):
+        messages = [
+            b'\1\0\0\0\x04',
+            b'\2\0\0\0\x02hi',
+            b'\3\0\0\0\x02',
+            b'\3\0\0\0\x01!',
+            b'\1\0\0\0\x80',
+            b'\9\0\0\0',
+            b'\1',
+            b'',
+        ]
+
+        results = self.detok.detokenize_many(messages)
+
+        self.assertEqual(len(results), len(messages))
+        for message, result in zip(messages, results):
+            expected = self.detok.detokenize(message)
+            self.assertEqual(str(result), str(expected))
+            self.assertEqual(result.ok(), expected.ok())
+            self.assertEqual(result.error_message(), expected.error_message())
+
+    def test_results(self):
+        one, two, collision = self.detok.detokenize_many(
+            [b'\1\0\0\0\x04', b'\2\0\0\0\x02hi', b'\3\0\0\0\x02'])
+
+        self.assertEqual(str(one), 'one 2')
+        self.assertEqual([arg.value for arg in one.best_result().args], [2])
+        self.assertEqual(str(two), 'two hi')
+        self.assertTrue(collision.ok())
+        self.assertEqual(str(collision), 'collision 1')
+
+    def test_empty_batch(self):
+        self.assertEqual(self.detok.detokenize_many([]), [])
+
+
 class DetokenizeWithCollisions(unittest.TestCase):
     """Tests collision resolution."""
     def setUp(self):
@@ -405,6 +460,17 @@ class DetokenizeWithCollisions(unittest.TestCase):
 @mock.patch('os.path.getmtime')
 class AutoUpdatingDetokenizerTest(unittest.TestCase):
     """Tests the AutoUpdatingDetokenizer class."""
+    @staticmethod
+    def _detokenize_after_reload(
+            detok: detokenize.AutoUpdatingDetokenizer,
+            message: bytes) -> detokenize.DetokenizedString:
+        """Checks for changes and waits for the reload before detokenizing."""
+        detok.detokenize(message)
+        detok.wait_for_reload()
+        result = detok.detokenize(message)
+        detok.wait_for_reload()
+        return result
+
     def test_update(self, mock_getmtime):
         """Tests the update command."""
 
@@ -429,17 +495,22 @@ class AutoUpdatingDetokenizerTest(unittest.TestCase):
 
                 detok = detokenize.AutoUpdatingDetokenizer(file.name,
                                                            min_poll_period_s=0)
-                self.assertFalse(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+                self.assertFalse(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
 
                 with open(file.name, 'wb') as fd:
                     tokens.write_binary(db, fd)
 
-                self.assertTrue(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+                self.assertTrue(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
             finally:
                 os.unlink(file.name)
 
         # The database stays around if the file is deleted.
-        self.assertTrue(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+        self.assertTrue(
+            self._detokenize_after_reload(detok, JELLO_WORLD_TOKEN).ok())
 
     def test_no_update_if_time_is_same(self, mock_getmtime):
         mock_getmtime.return_value = 100
@@ -453,21 +524,131 @@ class AutoUpdatingDetokenizerTest(unittest.TestCase):
 
                 detok = detokenize.AutoUpdatingDetokenizer(file,
                                                            min_poll_period_s=0)
-                self.assertTrue(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+                self.assertTrue(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
 
                 # Empty the database, but keep the mock modified time the same.
                 with open(file.name, 'wb'):
                     pass
 
-                self.assertTrue(detok.detokenize(JELLO_WORLD_TOKEN).ok())
-                self.assertTrue(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+                self.assertTrue(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
+                self.assertTrue(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
 
                 # Move back time so the now-empty file is reloaded.
                 mock_getmtime.return_value = 50
-                self.assertFalse(detok.detokenize(JELLO_WORLD_TOKEN).ok())
+                self.assertFalse(
+                    self._detokenize_after_reload(detok,
+                                                  JELLO_WORLD_TOKEN).ok())
             finally:
                 os.unlink(file.name)
 
+    def test_detokenize_many_checks_for_updates_once(self, mock_getmtime):
+        mock_getmtime.return_value = 100
+
+        with tempfile.NamedTemporaryFile('wb', delete=False) as file:
+            try:
+                tokens.write_csv(
+                    database.load_token_database(
+                        io.BytesIO(ELF_WITH_TOKENIZER_SECTIONS)), file)
+                file.close()
+
+                detok = detokenize.AutoUpdatingDetokenizer(file,
+                                                           min_poll_period_s=0)
+                calls = mock_getmtime.call_count
+
+                results = detok.detokenize_many([JELLO_WORLD_TOKEN] * 10)
+                detok.wait_for_reload()
+
+                self.assertTrue(all(result.ok() for result in results))
+                self.assertEqual(mock_getmtime.call_count, calls + 1)
+            finally:
+                os.unlink(file.name)
+
+
+@mock.patch('os.path.getmtime')
+class AutoUpdatingDetokenizerReloadTest(unittest.TestCase):
+    """Tests reloading AutoUpdatingDetokenizer databases in the background."""
+    def setUp(self) -> None:
+        super().setUp()
+        self._dir = Path(tempfile.mkdtemp('_pw_tokenizer_test'))
+        self._one = self._dir / 'one.csv'
+        self._two = self._dir / 'two.csv'
+        self._one.write_text('00000001,          ,"One"\n')
+        self._two.write_text('00000002,          ,"Two"\n')
+        self._mtimes = {str(self._one): 1, str(self._two): 1}
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._dir)
+        super().tearDown()
+
+    def _detokenizer(self,
+                     mock_getmtime) -> detokenize.AutoUpdatingDetokenizer:
+        mock_getmtime.side_effect = lambda path: self._mtimes[str(path)]
+        return detokenize.AutoUpdatingDetokenizer(self._one,
+                                                  self._two,
+                                                  min_poll_period_s=0)
+
+    def test_lookups_do_not_wait_for_reload(self, mock_getmtime):
+        detok = self._detokenizer(mock_getmtime)
+        self.assertEqual(str(detok.detokenize(b'\2\0\0\0')), 'Two')
+
+        self._two.write_text('00000002,          ,"Deux"\n')
+        self._mtimes[str(self._two)] = 2
+
+        loading = threading.Event()
+        finish_loading = threading.Event()
+        load = database.load_token_database
+
+        def slow_load(*args, **kwargs):
+            loading.set()
+            finish_loading.wait()
+            return load(*args, **kwargs)
+
+        with mock.patch.object(database, 'load_token_database', slow_load):
+            detok.detokenize(b'\2\0\0\0')
+            self.assertTrue(loading.wait(10))
+
+            # The old database is used while the new one is loading.
+            self.assertEqual(str(detok.detokenize(b'\2\0\0\0')), 'Two')
+
+            finish_loading.set()
+            detok.wait_for_reload()
+
+        self.assertEqual(str(detok.detokenize(b'\2\0\0\0')), 'Deux')
+        detok.wait_for_reload()
+
+    def test_reload_only_changed_path(self, mock_getmtime):
+        detok = self._detokenizer(mock_getmtime)
+        one = detok.lookup(1)
+        two = detok.lookup(2)
+
+        self._two.write_text('00000002,          ,"Deux"\n'
+                             '00000003,          ,"Trois"\n')
+        self._mtimes[str(self._two)] = 2
+
+        with mock.patch.object(database,
+                               'load_token_database',
+                               wraps=database.load_token_database) as load:
+            detok.lookup(1)
+            detok.wait_for_reload()
+
+        self.assertIn(mock.call(self._two), load.mock_calls)
+        self.assertNotIn(mock.call(self._one), load.mock_calls)
+
+        # Cached format strings for unchanged tokens are kept.
+        self.assertIs(detok.lookup(1), one)
+        self.assertIsNot(detok.lookup(2), two)
+        detok.wait_for_reload()
+
+        self.assertEqual(str(detok.detokenize(b'\2\0\0\0')), 'Deux')
+        self.assertEqual(str(detok.detokenize(b'\3\0\0\0')), 'Trois')
+        detok.wait_for_reload()
+
 
 def _next_char(message: bytes) -> bytes:
     return bytes(b + 1 for b in message)
@@ -501,6 +682,18 @@ class PrefixedMessageDecoderTest(unittest.TestCase):
                 self.decode.transform(io.BytesIO(b'$abc$defgh'), _next_char)))
 
 
+class _ChunkedReader:
+    """Returns data in chunks of a fixed size, like a slow stream."""
+    def __init__(self, data: bytes, chunk_size: int) -> None:
+        self._data = data
+        self._chunk_size = chunk_size
+
+    def read(self, size: int) -> bytes:
+        chunk = self._data[:min(size, self._chunk_size)]
+        self._data = self._data[len(chunk):]
+        return chunk
+
+
 class DetokenizeBase64(unittest.TestCase):
     """Tests detokenizing Base64 messages."""
 
@@ -550,6 +743,79 @@ class DetokenizeBase64(unittest.TestCase):
 
             self.assertEqual(expected, output.getvalue())
 
+    def test_streaming_split_at_every_position(self):
+        for data, expected in self.TEST_CASES:
+            for split in range(len(data) + 1):
+                stream = detokenize.StreamingBase64Detokenizer(self.detok)
+                output = (stream.process(data[:split]) +
+                          stream.process(data[split:]) + stream.flush())
+                self.assertEqual(expected, output, f'split at {split}')
+
+    def test_streaming_one_byte_at_a_time(self):
+        data = b'\n'.join(data for data, _ in self.TEST_CASES)
+        expected = b'\n'.join(expected for _, expected in self.TEST_CASES)
+
+        stream = detokenize.StreamingBase64Detokenizer(self.detok)
+        output = b''.join(
+            stream.process(data[i:i + 1]) for i in range(len(data)))
+        self.assertEqual(expected, output + stream.flush())
+
+    def test_streaming_only_holds_back_unfinished_message(self):
+        stream = detokenize.StreamingBase64Detokenizer(self.detok)
+        self.assertEqual(b'Hello ', stream.process(b'Hello ' + self.JELLO))
+        self.assertEqual(b'Jello, world!\n', stream.process(b'\n'))
+        self.assertEqual(b'', stream.flush())
+
+    def test_streaming_multibyte_prefix(self):
+        data = b'Hello ##' + self.JELLO[1:] + b'!'
+        expected = b'Hello Jello, world!!'
+
+        for split in range(len(data) + 1):
+            stream = detokenize.StreamingBase64Detokenizer(self.detok, '##')
+            output = (stream.process(data[:split]) +
+                      stream.process(data[split:]) + stream.flush())
+            self.assertEqual(expected, output, f'split at {split}')
+
+        stream = detokenize.StreamingBase64Detokenizer(self.detok, '##')
+        output = b''.join(
+            stream.process(data[i:i + 1]) for i in range(len(data)))
+        self.assertEqual(expected, output + stream.flush())
+
+    def test_streaming_holds_back_partial_prefix(self):
+        stream = detokenize.StreamingBase64Detokenizer(self.detok, '##')
+        self.assertEqual(b'Hello ', stream.process(b'Hello #'))
+        self.assertEqual(b'#', stream.flush())
+
+    def test_streaming_max_message_size(self):
+        stream = detokenize.StreamingBase64Detokenizer(self.detok,
+                                                       max_message_size=8)
+        self.assertEqual(b'$abcdefghijk', stream.process(b'$abcdefghijk'))
+
+    def test_live_reads_blocks_and_flushes_lines(self):
+        data = b'\n'.join(data for data, _ in self.TEST_CASES)
+        expected = b'\n'.join(expected for _, expected in self.TEST_CASES)
+
+        for chunk_size in (1, 3, 7, 1000):
+            output = mock.MagicMock(wraps=io.BytesIO())
+            self.detok.detokenize_base64_live(_ChunkedReader(data, chunk_size),
+                                              output, '$')
+
+            written = b''.join(call.args[0]
+                               for call in output.write.call_args_list)
+            self.assertEqual(expected, written)
+            self.assertTrue(output.flush.called)
+
+    def test_live_reads_available_serial_data(self):
+        serial_port = mock.Mock(spec=['read', 'in_waiting'],
+                                in_waiting=len(self.JELLO))
+        serial_port.read.side_effect = [self.JELLO, b'\n', b'']
+
+        output = io.BytesIO()
+        self.detok.detokenize_base64_live(serial_port, output)
+
+        self.assertEqual(b'Jello, world!\n', output.getvalue())
+        serial_port.read.assert_any_call(len(self.JELLO))
+
     def test_detokenize_base64_to_file(self):
         for data, expected in self.TEST_CASES:
             output = io.BytesIO()
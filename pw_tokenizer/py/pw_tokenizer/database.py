@@ -19,26 +19,30 @@ maintaining token databases.
 """
 
 import argparse
+import concurrent.futures
 from datetime import datetime
 import glob
+import heapq
 import json
 import logging
+import mmap
+import operator
 import os
 from pathlib import Path
 import re
 import struct
 import sys
-from typing import (Any, Callable, Dict, Iterable, Iterator, List, Pattern,
-                    Set, TextIO, Tuple, Union)
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List,
+                    Optional, Pattern, Set, TextIO, Tuple, Type, Union)
 
 try:
-    from pw_tokenizer import elf_reader, tokens
+    from pw_tokenizer import database_cache, elf_reader, tokens
 except ImportError:
     # Append this path to the module search path to allow running this module
     # without installing the pw_tokenizer package.
     sys.path.append(os.path.dirname(os.path.dirname(
         os.path.abspath(__file__))))
-    from pw_tokenizer import elf_reader, tokens
+    from pw_tokenizer import database_cache, elf_reader, tokens
 
 _LOG = logging.getLogger('pw_tokenizer')
 
@@ -135,6 +139,35 @@ def _database_from_elf(elf, domain: Pattern[str]) -> tokens.Database:
     return tokens.Database([])
 
 
+def _database_from_elf_path(path: Union[str, Path],
+                            domain: Pattern[str],
+                            memory_map: bool = False) -> tokens.Database:
+    """Reads a memory mapped ELF file, using the database cache if enabled.
+
+    Databases from the cache are read-only MappedDatabases. Unless memory_map
+    is True, they are copied into a Database.
+    """
+    def read() -> tokens.Database:
+        with open(path, 'rb') as fd:
+            try:
+                elf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty files cannot be mapped.
+                return tokens.Database([])
+
+            with elf:
+                return _database_from_elf(elf, domain)
+
+    cache = database_cache.default()
+    if cache is None:
+        return read()
+
+    database = cache.load(path, domain, read)
+    if memory_map or not isinstance(database, tokens.MappedDatabase):
+        return database
+
+    return tokens.Database.merged(database)
+
+
 def tokenization_domains(elf) -> Iterator[str]:
     """Lists all tokenization domains in an ELF file."""
     reader = _elf_reader(elf)
@@ -187,7 +220,19 @@ def _database_from_json(fd) -> tokens.Database:
     return _database_from_strings(json.load(fd))
 
 
-def _load_token_database(db, domain: Pattern[str]) -> tokens.Database:
+def _read_database_file(path: Union[str, Path],
+                        memory_map: bool) -> tokens.Database:
+    if memory_map:
+        with open(path, 'rb') as fd:
+            if tokens.file_is_binary_database(fd):
+                return tokens.MappedDatabase(path)
+
+    return tokens.DatabaseFile(path)
+
+
+def _load_token_database(db,
+                         domain: Pattern[str],
+                         memory_map: bool = False) -> tokens.Database:
     """Loads a Database from supported database types.
 
     Supports Database objects, JSONs, ELFs, CSVs, and binary databases.
@@ -208,17 +253,16 @@ def _load_token_database(db, domain: Pattern[str]) -> tokens.Database:
                 f'"{db}" is not a path to a token database')
 
         # Read the path as an ELF file.
-        with open(db, 'rb') as fd:
-            if elf_reader.compatible_file(fd):
-                return _database_from_elf(fd, domain)
+        if elf_reader.compatible_file(db):
+            return _database_from_elf_path(db, domain, memory_map)
 
         # Generate a database from JSON.
         if str(db).endswith('.json'):
             with open(db, 'r') as json_fd:
                 return _database_from_json(json_fd)
 
-        # Read the path as a packed binary or CSV file.
-        return tokens.DatabaseFile(db)
+        # Read (or map) a packed binary file or read a CSV file.
+        return _read_database_file(db, memory_map)
 
     # Assume that it's a file object and check if it's an ELF.
     if elf_reader.compatible_file(db):
@@ -230,7 +274,7 @@ def _load_token_database(db, domain: Pattern[str]) -> tokens.Database:
         if db.name.endswith('.json'):
             return _database_from_json(db)
 
-        return tokens.DatabaseFile(db.name)
+        return _read_database_file(db.name, memory_map)
 
     # Read CSV directly from the file object.
     return tokens.Database(tokens.parse_csv(db))
@@ -238,15 +282,94 @@ def _load_token_database(db, domain: Pattern[str]) -> tokens.Database:
 
 def load_token_database(
     *databases,
-    domain: Union[str,
-                  Pattern[str]] = tokens.DEFAULT_DOMAIN) -> tokens.Database:
+    domain: Union[str, Pattern[str]] = tokens.DEFAULT_DOMAIN,
+    memory_map: bool = False,
+) -> tokens.Database:
     """Loads a Database from supported database types.
 
     Supports Database objects, JSONs, ELFs, CSVs, and binary databases.
+
+    Multiple databases are merged into a new Database. With memory_map=True, a
+    single binary database file, or an ELF file from the database cache, is
+    returned as a read-only tokens.MappedDatabase, which reads entries from the
+    file as they are looked up. A mapped file must only be replaced, never rewritten in place; writing
+    to it while it is mapped may crash the process with SIGBUS.
     """
     domain = re.compile(domain)
-    return tokens.Database.merged(*(_load_token_database(db, domain)
-                                    for db in databases))
+    loaded = [_load_token_database(db, domain, memory_map) for db in databases]
+
+    if len(loaded) == 1 and isinstance(loaded[0], tokens.MappedDatabase):
+        return loaded[0]
+
+    return tokens.Database.merged(*loaded)
+
+
+# (token, string, domain, date_removed) tuples, which are faster to sort, merge,
+# and send between processes than TokenizedStringEntry objects.
+_EntryTuple = Tuple[int, str, str, Optional[datetime]]
+
+
+def _sorted_entry_tuples(db: tokens.Database) -> List[_EntryTuple]:
+    return sorted((entry.token, entry.string, entry.domain, entry.date_removed)
+                  for entry in db.entries())
+
+
+def _read_sorted_elf_entries(path: Path,
+                             domain: Pattern[str]) -> List[_EntryTuple]:
+    """Reads the entries from an ELF; runs in worker processes."""
+    return _sorted_entry_tuples(
+        _database_from_elf_path(path, domain, memory_map=True))
+
+
+def _merge_sorted_entries(
+        entry_lists: Iterable[Iterable[_EntryTuple]]) -> tokens.Database:
+    """Merges sorted entries as Database.merged() would, in a single pass."""
+    merged: List[tokens.TokenizedStringEntry] = []
+
+    for token, string, domain, date_removed in heapq.merge(
+            *entry_lists, key=operator.itemgetter(0, 1)):
+        if merged and merged[-1].token == token and merged[-1].string == string:
+            merged[-1].update_date_removed(date_removed)
+        else:
+            merged.append(
+                tokens.TokenizedStringEntry(token, string, domain,
+                                            date_removed))
+
+    return tokens.Database(merged)
+
+
+def load_token_databases_parallel(
+        sources: Iterable[Tuple[Union[str, Path], Union[str, Pattern[str]]]],
+        jobs: Optional[int] = None) -> tokens.Database:
+    """Loads and merges token databases, reading ELF files in parallel.
+
+    Each ELF file is memory mapped and read in a pool of worker processes.
+    Other token databases are read in this process. The results are combined
+    with a single k-way merge and match tokens.Database.merged().
+
+    Args:
+      sources: (path, domain) pairs; domains only apply to ELF files
+      jobs: the number of worker processes; os.cpu_count() if None
+    """
+    paths = [(Path(path), re.compile(domain)) for path, domain in sources]
+    is_elf = [elf_reader.compatible_file(path) for path, _ in paths]
+    elfs = [path for path, elf in zip(paths, is_elf) if elf]
+
+    if jobs == 1 or len(elfs) < 2:
+        elf_entries = [_read_sorted_elf_entries(*elf) for elf in elfs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            elf_entries = list(pool.map(_read_sorted_elf_entries, *zip(*elfs)))
+
+    # Keep the sources in order, since the first entry for a string is kept.
+    next_elf = iter(elf_entries)
+    entry_lists = [
+        next(next_elf) if elf else _sorted_entry_tuples(
+            _load_token_database(path, domain))
+        for (path, domain), elf in zip(paths, is_elf)
+    ]
+
+    return _merge_sorted_entries(entry_lists)
 
 
 def database_summary(db: tokens.Database) -> Dict[str, Any]:
@@ -296,28 +419,32 @@ def _handle_create(databases, database, force, output_type, include, exclude,
                    replace):
     """Creates a token database file from one or more ELF files."""
 
-    if database == '-':
-        # Must write bytes to stdout; use sys.stdout.buffer.
-        fd = sys.stdout.buffer
-    elif not force and os.path.exists(database):
+    if output_type == 'csv':
+        write: Callable[[tokens.Database, BinaryIO], None] = tokens.write_csv
+    elif output_type == 'binary':
+        write = tokens.write_binary
+    elif output_type == 'binary-v2':
+        write = tokens.write_binary_v2
+    else:
+        raise ValueError(f'Unknown database type "{output_type}"')
+
+    if database != '-' and not force and os.path.exists(database):
         raise FileExistsError(
             f'The file {database} already exists! Use --force to overwrite.')
-    else:
-        fd = open(database, 'wb')
 
-    database = tokens.Database.merged(*databases)
-    database.filter(include, exclude, replace)
+    token_database = tokens.Database.merged(*databases)
+    token_database.filter(include, exclude, replace)
 
-    with fd:
-        if output_type == 'csv':
-            tokens.write_csv(database, fd)
-        elif output_type == 'binary':
-            tokens.write_binary(database, fd)
-        else:
-            raise ValueError(f'Unknown database type "{output_type}"')
+    if database == '-':
+        # Must write bytes to stdout; use sys.stdout.buffer.
+        write(token_database, sys.stdout.buffer)
+        name = sys.stdout.buffer.name
+    else:
+        tokens.write_atomically(database, lambda fd: write(token_database, fd))
+        name = database
 
-    _LOG.info('Wrote database with %d entries to %s as %s', len(database),
-              fd.name, output_type)
+    _LOG.info('Wrote database with %d entries to %s as %s',
+              len(token_database), name, output_type)
 
 
 def _handle_add(token_database, databases):
@@ -384,12 +511,11 @@ class ExpandGlobs(argparse.Action):
 def _read_elf_with_domain(elf: str,
                           domain: Pattern[str]) -> Iterable[tokens.Database]:
     for path in expand_paths_or_globs(elf):
-        with path.open('rb') as file:
-            if not elf_reader.compatible_file(file):
-                raise ValueError(f'{elf} is not an ELF file, '
-                                 f'but the "{domain}" domain was specified')
+        if not elf_reader.compatible_file(path):
+            raise ValueError(f'{elf} is not an ELF file, '
+                             f'but the "{domain}" domain was specified')
 
-            yield _database_from_elf(file, domain)
+        yield _database_from_elf_path(path, domain)
 
 
 class LoadTokenDatabases(argparse.Action):
@@ -428,7 +554,40 @@ class LoadTokenDatabases(argparse.Action):
         setattr(namespace, self.dest, databases)
 
 
-def token_databases_parser(nargs: str = '+') -> argparse.ArgumentParser:
+class _ExpandDatabaseSources(argparse.Action):
+    """Argparse action that expands paths or globs to (path, domain) pairs.
+
+    The databases are loaded after parsing so that they can be read in parallel.
+    """
+    def __call__(self, parser, namespace, values, option_string=None):
+        sources: List[Tuple[Path, str]] = []
+        paths: Set[Path] = set()
+
+        try:
+            for value in values:
+                if value.count('#') == 1:
+                    path, domain = value.split('#')
+                    for elf in expand_paths_or_globs(path):
+                        if not elf_reader.compatible_file(elf):
+                            parser.error(
+                                f'argument elf_or_token_database: {elf} is '
+                                f'not an ELF file, but the "{domain}" domain '
+                                'was specified')
+
+                        sources.append((elf, domain))
+                else:
+                    paths.update(expand_paths_or_globs(value))
+        except FileNotFoundError as err:
+            parser.error(f'argument elf_or_token_database: {err}')
+
+        sources.extend((path, tokens.DEFAULT_DOMAIN) for path in sorted(paths))
+        setattr(namespace, self.dest, sources)
+
+
+def token_databases_parser(
+    nargs: str = '+',
+    action: Type[argparse.Action] = LoadTokenDatabases
+) -> argparse.ArgumentParser:
     """Returns an argument parser for reading token databases.
 
     These arguments can be added to another parser using the parents arg.
@@ -438,7 +597,7 @@ def token_databases_parser(nargs: str = '+') -> argparse.ArgumentParser:
         'databases',
         metavar='elf_or_token_database',
         nargs=nargs,
-        action=LoadTokenDatabases,
+        action=action,
         help=('ELF or token database files from which to read strings and '
               'tokens. For ELF files, the tokenization domain to read from '
               'may specified after the path as #domain_name (e.g. '
@@ -467,7 +626,14 @@ def _parse_args():
                            required=True,
                            help='The database file to update.')
 
-    option_tokens = token_databases_parser('*')
+    option_tokens = token_databases_parser('*', _ExpandDatabaseSources)
+    option_tokens.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help=('The number of processes to use to read ELF files. 0 uses one '
+              'process per CPU. (default: 1)'))
 
     # Top-level argument parser.
     parser = argparse.ArgumentParser(
@@ -494,9 +660,10 @@ def _parse_args():
         '-t',
         '--type',
         dest='output_type',
-        choices=('csv', 'binary'),
+        choices=('csv', 'binary', 'binary-v2'),
         default='csv',
-        help='Which type of database to create. (default: csv)')
+        help=('Which type of database to create. binary-v2 is an indexed '
+              'binary format that includes domains. (default: csv)'))
     subparser.add_argument('-f',
                            '--force',
                            action='store_true',
@@ -603,6 +770,18 @@ def _parse_args():
 
     args = parser.parse_args()
 
+    if 'jobs' in args:
+        try:
+            args.databases = [
+                load_token_databases_parallel(args.databases, args.jobs
+                                              or None)
+            ]
+        except tokens.DatabaseFormatError as err:
+            parser.error('argument elf_or_token_database: Only ELF files or '
+                         'token databases (CSV or binary format) are '
+                         f'supported. {err}')
+        del args.jobs
+
     handler = args.handler
     del args.handler
 
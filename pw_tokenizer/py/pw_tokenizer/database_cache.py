@@ -0,0 +1,213 @@
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Caches token databases extracted from ELF files on disk.
+
+Reading tokenized strings from a large ELF can take seconds. The cache stores
+each extracted database in the indexed binary format, so loading the same ELF
+again only hashes the file and memory maps the cached database.
+
+The default cache is disabled. It is enabled and configured with environment
+variables:
+
+  PW_TOKENIZER_CACHE_DIR: cache directory; the cache is only used if this is set
+  PW_TOKENIZER_CACHE_SIZE: maximum cache size in bytes (default: 256 MiB)
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional, Pattern, Union
+
+from pw_tokenizer import tokens
+
+_LOG = logging.getLogger('pw_tokenizer')
+
+DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024
+
+# Change this if the cached databases for an ELF could differ, for example if
+# the way tokenized strings are read from ELF files changes.
+_CACHE_VERSION = b'pw_tokenizer database cache 1'
+
+_SUFFIX = '.pwdb'
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _content_hash(path: Path, stat: os.stat_result,
+                  domain: Pattern[str]) -> str:
+    """Hashes an ELF's size, modified time, and contents with a domain."""
+    digest = hashlib.blake2b(_CACHE_VERSION, digest_size=20)
+    digest.update(f'\0{stat.st_size}\0{stat.st_mtime_ns}\0'.encode())
+    digest.update(domain.pattern.encode(errors='surrogatepass') + b'\0')
+
+    with path.open('rb') as fd:
+        for block in iter(lambda: fd.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _unchanged(path: Path, stat: os.stat_result) -> bool:
+    try:
+        current = path.stat()
+    except OSError:
+        return False
+
+    return (current.st_ino, current.st_size,
+            current.st_mtime_ns) == (stat.st_ino, stat.st_size,
+                                     stat.st_mtime_ns)
+
+
+class DatabaseCache:
+    """Stores token databases read from ELF files in a directory.
+
+    Cached databases are keyed by the ELF's size, modified time, contents, and
+    the tokenization domain. When the cache exceeds max_size_bytes, the least
+    recently used databases are removed.
+    """
+    def __init__(self,
+                 directory: Union[str, Path],
+                 max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_size_bytes = max_size_bytes
+
+    def load(self, path: Union[str, Path], domain: Pattern[str],
+             read: Callable[[], tokens.Database]) -> tokens.Database:
+        """Returns a cached database for the ELF or reads and caches it.
+
+        Cached databases are returned as read-only tokens.MappedDatabases.
+        Failures to access the cache are logged and the ELF is read directly.
+        The database is not stored if the ELF changes while it is read.
+        """
+        path = Path(path)
+        try:
+            stat = path.stat()
+            entry = self.directory / (_content_hash(path, stat, domain) +
+                                      _SUFFIX)
+        except OSError as err:
+            _LOG.debug('Not caching the database for %s: %s', path, err)
+            return read()
+
+        cached = self._open(entry)
+        if cached is not None:
+            _LOG.debug('Loaded cached database for %s from %s', path, entry)
+            return cached
+
+        database = read()
+
+        if _unchanged(path, stat):
+            self._store(entry, database)
+        else:
+            _LOG.debug('Not caching the database for %s; it changed', path)
+
+        return database
+
+    def clear(self) -> None:
+        """Removes all cached databases."""
+        for entry in self._entries():
+            entry.unlink()
+
+    def size_bytes(self) -> int:
+        """Returns the total size of the cached databases."""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        if not self.directory.is_dir():
+            return []
+
+        return list(self.directory.glob('*' + _SUFFIX))
+
+    def _open(self, entry: Path) -> Optional[tokens.MappedDatabase]:
+        try:
+            database = tokens.MappedDatabase(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except (OSError, tokens.DatabaseFormatError) as err:
+            _LOG.warning('Removing unreadable cached database %s: %s', entry,
+                         err)
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+            return None
+
+        # Track recent use with the modified time for LRU eviction.
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        return database
+
+    def _store(self, entry: Path, database: tokens.Database) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tokens.write_atomically(
+                entry, lambda fd: tokens.write_binary_v2(database, fd))
+            self._evict()
+        except OSError as err:
+            _LOG.warning('Failed to cache token database in %s: %s',
+                         self.directory, err)
+
+    def _evict(self) -> None:
+        """Removes the least recently used entries until the cache fits."""
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat(), entry))
+            except FileNotFoundError:  # Removed by another process
+                pass
+
+        size = sum(stat.st_size for stat, _ in entries)
+
+        for stat, entry in sorted(entries, key=lambda e: e[0].st_mtime_ns):
+            if size <= self.max_size_bytes:
+                break
+
+            try:
+                entry.unlink()
+            except FileNotFoundError:  # Removed by another process
+                pass
+
+            size -= stat.st_size
+
+
+_default: Optional[DatabaseCache] = None
+_default_configured = False
+
+
+def default() -> Optional[DatabaseCache]:
+    """Returns the cache configured by environment variables, if enabled.
+
+    The cache is only enabled if PW_TOKENIZER_CACHE_DIR is set, so tools such as
+    build actions do not write outside of their outputs unless asked to.
+    """
+    global _default, _default_configured  # pylint: disable=global-statement
+
+    if not _default_configured:
+        _default_configured = True
+        directory = os.environ.get('PW_TOKENIZER_CACHE_DIR')
+        max_size = int(
+            os.environ.get('PW_TOKENIZER_CACHE_SIZE', DEFAULT_MAX_SIZE_BYTES))
+        _default = DatabaseCache(
+            directory, max_size) if directory and max_size > 0 else None
+
+    return _default
+
+
+def set_default(cache: Optional[DatabaseCache]) -> None:
+    """Sets the cache used when loading ELF files; None disables caching."""
+    global _default, _default_configured  # pylint: disable=global-statement
+    _default = cache
+    _default_configured = True
@@ -20,10 +20,12 @@ Missing, truncated, or otherwise corrupted arguments are handled and displayed
 in the resulting string with an error message.
 """
 
+from collections import abc
 from datetime import datetime
 import re
 import struct
-from typing import Iterable, List, NamedTuple, Match, Sequence, Tuple
+from typing import (Iterable, Iterator, List, NamedTuple, Match, Optional,
+                    Sequence, Tuple)
 
 
 def zigzag_decode(value: int) -> int:
@@ -291,7 +293,14 @@ class FormattedString(NamedTuple):
 
     def ok(self) -> bool:
         """Arg data decoded successfully and all expected args were found."""
-        return all(arg.ok() for arg in self.args) and not self.remaining
+        return not self._arg_errors() and not self.remaining
+
+    def _arg_errors(self) -> int:
+        # Deferred args are only used for successfully decoded strings.
+        if isinstance(self.args, _DeferredArgs):
+            return 0
+
+        return sum(not arg.ok() for arg in self.args)
 
     def score(self, date_removed: datetime = None) -> tuple:
         """Returns a key for sorting by how successful a decode was.
@@ -312,7 +321,7 @@ class FormattedString(NamedTuple):
         return (
             self.ok(),  # decocoded all data and all expected args were found
             not self.remaining,  # decoded all data
-            -sum(not arg.ok() for arg in self.args),  # fewest errors
+            -self._arg_errors(),  # fewest errors
             len(self.args),  # decoded the most arguments
             date_removed or datetime.max)  # most recently present
 
@@ -405,6 +414,183 @@ class FormatString:
         return FormattedString(''.join(self._segments), args, remaining)
 
 
+class _DeferredArgs(abc.Sequence):
+    """Decodes a message's DecodedArgs only if they are accessed."""
+    def __init__(self, format_string: FormatString, encoded: bytes) -> None:
+        self._format_string = format_string
+        self._encoded = encoded
+        self._args: Optional[Sequence[DecodedArg]] = None
+
+    def _decoded(self) -> Sequence[DecodedArg]:
+        if self._args is None:
+            self._args = self._format_string.decode(self._encoded)[0]
+        return self._args
+
+    def __getitem__(self, index):
+        return self._decoded()[index]
+
+    def __len__(self) -> int:
+        return len(self._format_string.specifiers)
+
+    def __iter__(self) -> Iterator[DecodedArg]:
+        return iter(self._decoded())
+
+    def __repr__(self) -> str:
+        return repr(self._decoded())
+
+
+class FormatPlan:
+    """A FormatString compiled for decoding and formatting quickly.
+
+    render() decodes the arguments and renders the string directly from the
+    encoded bytes, without creating FormatSpec or DecodedArg objects. It only
+    handles messages whose arguments all decode and format successfully, and
+    returns None for any other message. format() falls back to
+    FormatString.format() for those messages to report the errors.
+    """
+
+    # Operations for decoding each argument.
+    _SIGNED = 0
+    _UNSIGNED = 1
+    _CHAR = 2
+    _FLOAT = 3
+    _STRING = 4
+
+    _PACKED_FLOAT = struct.Struct('<f')
+
+    def __init__(self, format_string: FormatString):
+        self.format_string = format_string.format_string
+        self.specifiers = format_string.specifiers
+        self._parsed = format_string
+
+        # pylint: disable=protected-access
+        segments = format_string._parse_string_segments()
+        # pylint: enable=protected-access
+
+        # (index in segments, operation, % conversion, unsigned int mask)
+        ops: List[Tuple[int, int, str, int]] = []
+        self._supported = True
+
+        # pylint: disable=protected-access
+        for i, spec in enumerate(format_string.specifiers):
+            index = 2 * i + 1
+
+            if spec.type == '%':
+                segments[index] = '%'
+            elif spec.type == 's':
+                ops.append((index, self._STRING, spec.compatible, 0))
+            elif spec.type == 'c':
+                ops.append((index, self._CHAR, spec.compatible, 0))
+            elif spec.type in FormatSpec._SIGNED_INT:
+                ops.append((index, self._SIGNED, spec.compatible, 0))
+            elif spec.type in FormatSpec._UNSIGNED_INT:
+                ops.append((index, self._UNSIGNED, spec.compatible,
+                            (1 << spec.size_bits()) - 1))
+            elif spec.type in FormatSpec._FLOATING_POINT:
+                ops.append((index, self._FLOAT, spec.compatible, 0))
+            else:  # Unsupported specifiers (%n) always fail to decode.
+                self._supported = False
+        # pylint: enable=protected-access
+
+        self._segments = segments
+        self._ops = tuple(ops)
+        self._text = (''.join(segments)
+                      if self._supported and not ops else None)
+
+    def render(self, encoded: bytes) -> Optional[str]:
+        """Formats the string; returns None if any argument has an error."""
+        # pylint: disable=too-many-branches
+        if not self._supported:
+            return None
+
+        if self._text is not None:
+            return None if encoded else self._text
+
+        output = self._segments.copy()
+        size = len(encoded)
+        index = 0
+
+        for slot, operation, conversion, mask in self._ops:
+            if operation == self._FLOAT:
+                if size - index < 4:
+                    return None
+                value = self._PACKED_FLOAT.unpack_from(encoded, index)[0]
+                index += 4
+            elif operation == self._STRING:
+                if index >= size:
+                    return None
+
+                length = encoded[index]
+                end = index + 1 + (length & 0x7f)
+                if end > size:
+                    return None
+
+                try:
+                    value = encoded[index + 1:end].decode()
+                except UnicodeDecodeError:
+                    return None
+
+                if length & 0x80:
+                    value += '[...]'
+                index = end
+            else:  # ZigZag-encoded varint
+                if index >= size:
+                    return None
+
+                byte = encoded[index]
+                index += 1
+                value = byte & 0x7f
+                shift = 7
+
+                while byte & 0x80:
+                    if index >= size:
+                        return None
+
+                    byte = encoded[index]
+                    index += 1
+                    value |= (byte & 0x7f) << shift
+
+                    if byte & 0x80:
+                        shift += 7
+                        if shift >= 64:
+                            return None
+
+                value = (value >> 1) ^ -(value & 1)
+
+                if operation == self._UNSIGNED:
+                    value &= mask
+                elif operation == self._CHAR:
+                    try:
+                        value = chr(value)
+                    except (OverflowError, ValueError):
+                        return None
+
+            try:
+                output[slot] = conversion % value
+            except (OverflowError, TypeError, ValueError):
+                return None
+
+        if index != size:
+            return None
+
+        return ''.join(output)
+
+    def format(self,
+               encoded_args: bytes,
+               show_errors: bool = False) -> FormattedString:
+        """Decodes arguments and formats the string with them.
+
+        The result is the same as FormatString.format(), but the args of a
+        successfully formatted string are only decoded if they are accessed.
+        """
+        value = self.render(encoded_args)
+        if value is None:
+            return self._parsed.format(encoded_args, show_errors)
+
+        return FormattedString(value, _DeferredArgs(self._parsed,
+                                                    encoded_args), b'')
+
+
 def decode(format_string: str,
            encoded_arguments: bytes,
            show_errors: bool = False) -> str:
@@ -39,11 +39,11 @@ import logging
 import os
 from pathlib import Path
 import re
-import string
 import struct
 import sys
+import threading
 import time
-from typing import (AnyStr, BinaryIO, Callable, Dict, List, Iterable, IO,
+from typing import (Any, AnyStr, BinaryIO, Callable, Dict, List, Iterable, IO,
                     Iterator, Match, NamedTuple, Optional, Pattern, Tuple,
                     Union)
 
@@ -77,12 +77,20 @@ class DetokenizedString:
         self.successes: List[decode.FormattedString] = []
         self.failures: List[decode.FormattedString] = []
 
-        decode_attempts: List[Tuple[Tuple, decode.FormattedString]] = []
+        encoded_args = encoded_message[ENCODED_TOKEN.size:]
+        results = [(entry, fmt.format(encoded_args, show_errors))
+                   for entry, fmt in format_string_entries]
 
-        for entry, fmt in format_string_entries:
-            result = fmt.format(encoded_message[ENCODED_TOKEN.size:],
-                                show_errors)
-            decode_attempts.append((result.score(entry.date_removed), result))
+        # Most tokens have one string, which does not need to be scored.
+        if len(results) == 1:
+            result = results[0][1]
+            (self.successes if result.ok() else self.failures).append(result)
+            return
+
+        decode_attempts: List[Tuple[Tuple, decode.FormattedString]] = [
+            (result.score(entry.date_removed), result)
+            for entry, result in results
+        ]
 
         # Sort the attempts by the score so the most likely results are first.
         decode_attempts.sort(key=lambda value: value[0], reverse=True)
@@ -150,7 +158,7 @@ class DetokenizedString:
 
 class _TokenizedFormatString(NamedTuple):
     entry: tokens.TokenizedStringEntry
-    format: decode.FormatString
+    format: decode.FormatPlan
 
 
 class Detokenizer:
@@ -166,7 +174,7 @@ class Detokenizer:
         """
         self.show_errors = show_errors
 
-        # Cache FormatStrings for faster lookup & formatting.
+        # Cache compiled FormatPlans for faster lookup & formatting.
         self._cache: Dict[int, List[_TokenizedFormatString]] = {}
 
         self._initialize_database(token_database_or_elf)
@@ -177,18 +185,58 @@ class Detokenizer:
 
     def lookup(self, token: int) -> List[_TokenizedFormatString]:
         """Returns (TokenizedStringEntry, FormatString) list for matches."""
+        # The database and cache may be replaced by another thread (see
+        # AutoUpdatingDetokenizer), so only store results in the cache that was
+        # current when the lookup started.
+        cache = self._cache
         try:
-            return self._cache[token]
+            return cache[token]
         except KeyError:
             format_strings = [
-                _TokenizedFormatString(entry, decode.FormatString(str(entry)))
+                _TokenizedFormatString(
+                    entry, decode.FormatPlan(decode.FormatString(str(entry))))
                 for entry in self.database.token_to_entries[token]
             ]
-            self._cache[token] = format_strings
+            cache[token] = format_strings
             return format_strings
 
     def detokenize(self, encoded_message: bytes) -> DetokenizedString:
         """Decodes and detokenizes a message as a DetokenizedString."""
+        return self._detokenize(encoded_message, self.lookup)
+
+    def detokenize_many(
+            self,
+            encoded_messages: Iterable[bytes]) -> List[DetokenizedString]:
+        """Detokenizes a batch of messages.
+
+        This is equivalent to calling detokenize() on each message, but with
+        less overhead per message.
+        """
+        lookup = self._batch_lookup()
+        show_errors = self.show_errors
+        token_size = ENCODED_TOKEN.size
+        unpack_token = ENCODED_TOKEN.unpack_from
+
+        results = []
+        for message in encoded_messages:
+            if len(message) < token_size:
+                results.append(self._detokenize(message, lookup))
+            else:
+                token = unpack_token(message)[0]
+                results.append(
+                    DetokenizedString(token, lookup(token), message,
+                                      show_errors))
+
+        return results
+
+    def _batch_lookup(self) -> Callable[[int], List[_TokenizedFormatString]]:
+        """Returns the lookup function to use for a detokenize_many batch."""
+        return self.lookup
+
+    def _detokenize(
+        self, encoded_message: bytes,
+        lookup: Callable[[int], List[_TokenizedFormatString]]
+    ) -> DetokenizedString:
         if not encoded_message:
             return DetokenizedString(None, (), encoded_message,
                                      self.show_errors)
@@ -201,7 +249,7 @@ class Detokenizer:
             encoded_message += b'\0' * missing_token_bytes
 
         token, = ENCODED_TOKEN.unpack_from(encoded_message)
-        return DetokenizedString(token, self.lookup(token), encoded_message,
+        return DetokenizedString(token, lookup(token), encoded_message,
                                  self.show_errors)
 
     def detokenize_base64(self,
@@ -241,25 +289,22 @@ class Detokenizer:
                                output: BinaryIO,
                                prefix: Union[str, bytes] = BASE64_PREFIX,
                                recursion: int = DEFAULT_RECURSION) -> None:
-        """Reads chars one-at-a-time, decoding messages; SLOW for big files."""
-        prefix_bytes = prefix.encode() if isinstance(prefix, str) else prefix
+        """Decodes prefixed Base64 messages in data as it is read from a file.
 
-        base64_message = _base64_message_regex(prefix_bytes)
+        Data is read in blocks as it becomes available, so this keeps up with
+        fast serial ports and pipes. Output is flushed after each newline.
+        """
+        stream = StreamingBase64Detokenizer(self, prefix, recursion)
+        read = _available_data_reader(input_file)
 
-        def transform(data: bytes) -> bytes:
-            return base64_message.sub(
-                self._detokenize_prefixed_base64(prefix_bytes, recursion),
-                data)
+        while True:
+            data = read()
+            if not data:
+                break
 
-        for message in PrefixedMessageDecoder(
-                prefix,
-                string.ascii_letters + string.digits + '+/-_=').transform(
-                    input_file, transform):
-            output.write(message)
+            _write_and_flush_lines(output, stream.process(data))
 
-            # Flush each line to prevent delays when piping between processes.
-            if b'\n' in message:
-                output.flush()
+        output.write(stream.flush())
 
     def _detokenize_prefixed_base64(
             self, prefix: bytes,
@@ -271,7 +316,7 @@ class Detokenizer:
 
             try:
                 detokenized_string = self.detokenize(
-                    base64.b64decode(original[1:], validate=True))
+                    base64.b64decode(original[len(prefix):], validate=True))
                 if detokenized_string.matches():
                     result = str(detokenized_string).encode()
 
@@ -292,12 +337,20 @@ _PathOrFile = Union[IO, str, Path]
 
 
 class AutoUpdatingDetokenizer(Detokenizer):
-    """Loads and updates a detokenizer from database paths."""
+    """Loads and updates a detokenizer from database paths.
+
+    Paths are checked for changes at most once per min_poll_period_s. Changed
+    databases are reloaded in a background thread, and the new database is
+    swapped in when it is ready, so lookups never wait for file I/O. Only the
+    paths that changed are read again, and cached format strings are kept for
+    tokens whose entries did not change.
+    """
     class _DatabasePath:
         """Tracks the modified time of a path or file object."""
         def __init__(self, path: _PathOrFile) -> None:
             self.path = path if isinstance(path, (str, Path)) else path.name
             self._modified_time: Optional[float] = self._last_modified_time()
+            self.database = self.load()
 
         def updated(self) -> bool:
             """True if the path has been updated since the last call."""
@@ -326,20 +379,161 @@ class AutoUpdatingDetokenizer(Detokenizer):
         self.paths = tuple(self._DatabasePath(path) for path in paths_or_files)
         self.min_poll_period_s = min_poll_period_s
         self._last_checked_time: float = time.time()
-        super().__init__(*(path.load() for path in self.paths))
+
+        # Held while a background thread checks for and loads changes.
+        self._reload_lock = threading.Lock()
+        super().__init__(*(path.database for path in self.paths))
+
+    def wait_for_reload(self) -> None:
+        """Waits for a reload that is in progress, if any, to complete."""
+        with self._reload_lock:
+            pass
 
     def _reload_if_changed(self) -> None:
         if time.time() - self._last_checked_time >= self.min_poll_period_s:
+            if not self._reload_lock.acquire(blocking=False):
+                return  # A reload is already in progress.
+
             self._last_checked_time = time.time()
+            try:
+                threading.Thread(target=self._reload,
+                                 name='pw_tokenizer database reload',
+                                 daemon=True).start()
+            except BaseException:
+                self._reload_lock.release()
+                raise
+
+    def _reload(self) -> None:
+        """Reloads changed paths; runs in a thread with _reload_lock held."""
+        try:
+            changed = [path for path in self.paths if path.updated()]
+            if not changed:
+                return
 
-            if any(path.updated() for path in self.paths):
-                _LOG.info('Changes detected; reloading token database')
-                self._initialize_database(path.load() for path in self.paths)
+            _LOG.info('Changes detected; reloading token database')
+            for path in changed:
+                path.database = path.load()
+
+            self._swap_database(
+                database.load_token_database(*(path.database
+                                               for path in self.paths)))
+        except:  # pylint: disable=bare-except
+            _LOG.exception('Failed to reload token database')
+        finally:
+            self._reload_lock.release()
+
+    def _swap_database(self, new_database: tokens.Database) -> None:
+        """Replaces the database, keeping cache entries that are unchanged."""
+        token_to_entries = new_database.token_to_entries
+
+        # dict.copy() is atomic, so lookups may add to the cache concurrently.
+        cache = {
+            token: format_strings
+            for token, format_strings in self._cache.copy().items()
+            if [f.entry for f in format_strings] == token_to_entries[token]
+        }
+
+        # Replace the database before the cache. Lookups that start before the
+        # cache is replaced store their results in the discarded cache.
+        self.database = new_database
+        self._cache = cache
 
     def lookup(self, token: int) -> List[_TokenizedFormatString]:
         self._reload_if_changed()
         return super().lookup(token)
 
+    def _batch_lookup(self) -> Callable[[int], List[_TokenizedFormatString]]:
+        # Check for database changes once per batch rather than per message.
+        self._reload_if_changed()
+        return super().lookup
+
+
+class StreamingBase64Detokenizer:
+    """Detokenizes prefixed Base64 messages in a stream of data.
+
+    Data may be provided in chunks of any size, split anywhere, including within
+    a message. Only data that could be the start of an unfinished message is
+    held back between chunks, so memory use is bounded by max_message_size.
+    """
+    def __init__(self,
+                 detokenizer: Detokenizer,
+                 prefix: Union[str, bytes] = BASE64_PREFIX,
+                 recursion: int = DEFAULT_RECURSION,
+                 max_message_size: int = 4096) -> None:
+        prefix = prefix.encode() if isinstance(prefix, str) else prefix
+
+        self.max_message_size = max_message_size
+        self._prefix = prefix
+        self._message = _base64_message_regex(prefix)
+        self._message_chars = re.compile(br'[A-Za-z0-9+/\-_=]*')
+        # pylint: disable=protected-access
+        self._replace = detokenizer._detokenize_prefixed_base64(
+            prefix, recursion)
+        self._pending = b''
+
+    def process(self, data: bytes) -> bytes:
+        """Returns the detokenized data that precedes any unfinished message."""
+        data = self._pending + data
+
+        # Hold back the last message if it runs to the end of the data, since
+        # more of it may arrive in the next chunk. Otherwise, hold back the
+        # start of a prefix that is split across chunks.
+        start = data.rfind(self._prefix)
+        if (start == -1 or len(data) - start > self.max_message_size
+                or not self._message_chars.fullmatch(
+                    data, start + len(self._prefix))):
+            start = len(data) - self._partial_prefix_length(data)
+
+        self._pending = data[start:]
+        data = data[:start]
+
+        if self._prefix not in data:
+            return data
+
+        return self._message.sub(self._replace, data)
+
+    def flush(self) -> bytes:
+        """Returns the detokenized data held back for an unfinished message."""
+        data, self._pending = self._pending, b''
+        return self._message.sub(self._replace, data)
+
+    def _partial_prefix_length(self, data: bytes) -> int:
+        """Returns the length of the longest prefix start that ends data."""
+        for length in range(len(self._prefix) - 1, 0, -1):
+            if data.endswith(self._prefix[:length]):
+                return length
+
+        return 0
+
+
+def _available_data_reader(file: BinaryIO,
+                           block_size: int = 8192) -> Callable[[], bytes]:
+    """Returns a function that reads up to a block of the available data.
+
+    Reading a fixed size would block until the whole block arrives, delaying
+    output from slow streams.
+    """
+    read1 = getattr(file, 'read1', None)
+    if read1 is not None:
+        return lambda: read1(block_size)
+
+    # pySerial's Serial.read() blocks for the full size, but it reports how
+    # many bytes are available.
+    if hasattr(file, 'in_waiting'):
+        serial_port: Any = file
+        return lambda: serial_port.read(
+            max(1, min(serial_port.in_waiting, block_size)))
+
+    return lambda: file.read(block_size)
+
+
+def _write_and_flush_lines(output: BinaryIO, data: bytes) -> None:
+    output.write(data)
+
+    # Flush each line to prevent delays when piping between processes.
+    if b'\n' in data:
+        output.flush()
+
 
 class PrefixedMessageDecoder:
     """Parses messages that start with a prefix character from a byte stream."""
@@ -380,6 +574,10 @@ class PrefixedMessageDecoder:
         message_start = None
 
         while True:
+            # Only the current message needs to be kept.
+            if message_start is None:
+                self.data.clear()
+
             # This reads the file character-by-character. Non-message characters
             # are yielded right away; message characters are grouped.
             char, index = self._read_next(binary_fd)
@@ -434,17 +632,17 @@ def _follow_and_detokenize_file(detokenizer: Detokenizer,
                                 prefix: Union[str, bytes],
                                 poll_period_s: float = 0.01) -> None:
     """Polls a file to detokenize it and any appended data."""
+    stream = StreamingBase64Detokenizer(detokenizer, prefix)
 
     try:
         while True:
-            data = file.read()
+            data = file.read(8192)
             if data:
-                detokenizer.detokenize_base64_to_file(data, output, prefix)
-                output.flush()
+                _write_and_flush_lines(output, stream.process(data))
             else:
                 time.sleep(poll_period_s)
     except KeyboardInterrupt:
-        pass
+        output.write(stream.flush())
 
 
 def _handle_base64(databases, input_file: BinaryIO, output: BinaryIO,
@@ -467,7 +665,7 @@ def _handle_base64(databases, input_file: BinaryIO, output: BinaryIO,
         detokenizer.detokenize_base64_to_file(input_file.read(), output,
                                               prefix)
     else:
-        # For non-seekable inputs (e.g. pipes), read one character at a time.
+        # For non-seekable inputs (e.g. pipes), decode data as it arrives.
         detokenizer.detokenize_base64_live(input_file, output, prefix)
 
 
@@ -13,17 +13,25 @@
 # the License.
 """Builds and manages databases of tokenized strings."""
 
+import abc
+from array import array
+import bisect
 import collections
 import csv
 from dataclasses import dataclass
 from datetime import datetime
 import io
 import logging
+import mmap
+import os
 from pathlib import Path
 import re
+import shutil
 import struct
+import tempfile
 from typing import (BinaryIO, Callable, Dict, Iterable, Iterator, List,
-                    NamedTuple, Optional, Pattern, Tuple, Union, ValuesView)
+                    Mapping, NamedTuple, Optional, Pattern, Sequence, Tuple,
+                    Union, ValuesView)
 
 DATE_FORMAT = '%Y-%m-%d'
 DEFAULT_DOMAIN = ''
@@ -331,7 +339,38 @@ class _BinaryFileFormat(NamedTuple):
     entry: struct.Struct = struct.Struct('<IBBH')
 
 
+class _BinaryFileFormatV2(NamedTuple):
+    """Attributes of the indexed (version 2) binary token database format.
+
+    Version 2 files contain, in order:
+
+      header: magic, entry count, domain count, index slot count, and string
+          table size in bytes
+      entries: token, removal day, month, and year, domain number, and string
+          offset, sorted in the same order as version 1 entries
+      domains: the string offset of each domain name
+      index: an open addressing hash table with linear probing; each slot is 0
+          if empty or 1 + the index of the first entry for a token
+      string table: null-terminated UTF-8 strings
+
+    String offsets are relative to the start of the string table. A token's
+    first index slot is given by _index_slot().
+    """
+
+    magic: bytes = b'TOKENS\0\2'
+    header: struct.Struct = struct.Struct('<8sIIII')
+    entry: struct.Struct = struct.Struct('<IBBHII')
+    offset: struct.Struct = struct.Struct('<I')
+
+
 BINARY_FORMAT = _BinaryFileFormat()
+BINARY_FORMAT_V2 = _BinaryFileFormatV2()
+_TOKEN = struct.Struct('<I')
+
+
+def _index_slot(token: int, slots: int) -> int:
+    """Returns the first slot to probe for a token in a version 2 index."""
+    return ((token * 0x9E3779B1) & 0xFFFFFFFF) * slots >> 32
 
 
 class DatabaseFormatError(Exception):
@@ -344,7 +383,7 @@ def file_is_binary_database(fd: BinaryIO) -> bool:
         fd.seek(0)
         magic = fd.read(len(BINARY_FORMAT.magic))
         fd.seek(0)
-        return BINARY_FORMAT.magic == magic
+        return magic in (BINARY_FORMAT.magic, BINARY_FORMAT_V2.magic)
     except IOError:
         return False
 
@@ -372,40 +411,22 @@ def _check_that_file_is_csv_database(path: Path) -> None:
 
 
 def parse_binary(fd: BinaryIO) -> Iterable[TokenizedStringEntry]:
-    """Parses TokenizedStringEntries from a binary token database file."""
-    magic, entry_count = BINARY_FORMAT.header.unpack(
-        fd.read(BINARY_FORMAT.header.size))
-
-    if magic != BINARY_FORMAT.magic:
-        raise DatabaseFormatError(
-            f'Binary token database magic number mismatch (found {magic!r}, '
-            f'expected {BINARY_FORMAT.magic!r}) while reading from {fd}')
-
-    entries = []
-
-    for _ in range(entry_count):
-        token, day, month, year = BINARY_FORMAT.entry.unpack(
-            fd.read(BINARY_FORMAT.entry.size))
-
-        try:
-            date_removed: Optional[datetime] = datetime(year, month, day)
-        except ValueError:
-            date_removed = None
+    """Parses TokenizedStringEntries from a binary token database file.
 
-        entries.append((token, date_removed))
+    Both the original and the indexed (version 2) formats are supported.
+    """
+    yield from _binary_table(fd.read(), str(fd)).iter_entries()
 
-    # Read the entire string table and define a function for looking up strings.
-    string_table = fd.read()
 
-    def read_string(start):
-        end = string_table.find(b'\0', start)
-        return string_table[start:string_table.find(b'\0', start)].decode(
-        ), end + 1
+def _date_removed_fields(entry: TokenizedStringEntry) -> Tuple[int, int, int]:
+    if entry.date_removed:
+        return (entry.date_removed.day, entry.date_removed.month,
+                entry.date_removed.year)
 
-    offset = 0
-    for token, removed in entries:
-        string, offset = read_string(offset)
-        yield TokenizedStringEntry(token, string, DEFAULT_DOMAIN, removed)
+    # If there is no removal date, use the special value 0xffffffff for the
+    # day/month/year. That ensures that still-present tokens appear as the
+    # newest tokens when sorted by removal date.
+    return 0xff, 0xff, 0xffff
 
 
 def write_binary(database: Database, fd: BinaryIO) -> None:
@@ -417,25 +438,61 @@ def write_binary(database: Database, fd: BinaryIO) -> None:
     string_table = bytearray()
 
     for entry in entries:
-        if entry.date_removed:
-            removed_day = entry.date_removed.day
-            removed_month = entry.date_removed.month
-            removed_year = entry.date_removed.year
-        else:
-            # If there is no removal date, use the special value 0xffffffff for
-            # the day/month/year. That ensures that still-present tokens appear
-            # as the newest tokens when sorted by removal date.
-            removed_day = 0xff
-            removed_month = 0xff
-            removed_year = 0xffff
-
         string_table += entry.string.encode()
         string_table.append(0)
 
         fd.write(
-            BINARY_FORMAT.entry.pack(entry.token, removed_day, removed_month,
-                                     removed_year))
+            BINARY_FORMAT.entry.pack(entry.token,
+                                     *_date_removed_fields(entry)))
+
+    fd.write(string_table)
+
+
+def write_binary_v2(database: Database, fd: BinaryIO) -> None:
+    """Writes the database in the indexed (version 2) binary format.
 
+    Unlike the original binary format, version 2 stores domains, and can be
+    searched without reading the string table (see MappedDatabase).
+    """
+    entries = sorted(database.entries())
+    domains = sorted({entry.domain for entry in entries})
+    domain_numbers = {domain: i for i, domain in enumerate(domains)}
+
+    string_table = bytearray()
+
+    def add_string(string: str) -> int:
+        offset = len(string_table)
+        string_table.extend(string.encode())
+        string_table.append(0)
+        return offset
+
+    domain_offsets = [add_string(domain) for domain in domains]
+
+    # Keep the index at most half full so probe sequences stay short.
+    index = [0] * max(1, 2 * len({entry.token for entry in entries}))
+    packed_entries = bytearray()
+    previous_token = None
+
+    for i, entry in enumerate(entries):
+        packed_entries += BINARY_FORMAT_V2.entry.pack(
+            entry.token, *_date_removed_fields(entry),
+            domain_numbers[entry.domain], add_string(entry.string))
+
+        if entry.token != previous_token:
+            previous_token = entry.token
+
+            slot = _index_slot(entry.token, len(index))
+            while index[slot]:
+                slot = (slot + 1) % len(index)
+            index[slot] = i + 1
+
+    fd.write(
+        BINARY_FORMAT_V2.header.pack(BINARY_FORMAT_V2.magic, len(entries),
+                                     len(domains), len(index),
+                                     len(string_table)))
+    fd.write(packed_entries)
+    fd.write(struct.pack(f'<{len(domain_offsets)}I', *domain_offsets))
+    fd.write(struct.pack(f'<{len(index)}I', *index))
     fd.write(string_table)
 
 
@@ -443,7 +500,7 @@ class DatabaseFile(Database):
     """A token database that is associated with a particular file.
 
     This class adds the write_to_file() method that writes to file from which it
-    was created in the correct format (CSV or binary).
+    was created in the correct format (CSV, binary, or version 2 binary).
     """
     def __init__(self, path: Union[Path, str]):
         self.path = Path(path)
@@ -451,8 +508,14 @@ class DatabaseFile(Database):
         # Read the path as a packed binary file.
         with self.path.open('rb') as fd:
             if file_is_binary_database(fd):
+                if fd.read(len(
+                        BINARY_FORMAT_V2.magic)) == (BINARY_FORMAT_V2.magic):
+                    self._export = write_binary_v2
+                else:
+                    self._export = write_binary
+
+                fd.seek(0)
                 super().__init__(parse_binary(fd))
-                self._export = write_binary
                 return
 
         # Read the path as a CSV file.
@@ -463,5 +526,354 @@ class DatabaseFile(Database):
 
     def write_to_file(self, path: Optional[Union[Path, str]] = None) -> None:
         """Exports in the original format to the original or provided path."""
-        with open(self.path if path is None else path, 'wb') as fd:
-            self._export(self, fd)
+        write_atomically(self.path if path is None else path,
+                         lambda fd: self._export(self, fd))
+
+
+def write_atomically(path: Union[Path, str], write: Callable[[BinaryIO],
+                                                             None]) -> None:
+    """Writes a file by replacing it with a fully written temporary file.
+
+    Databases may be memory mapped by running detokenizers (see
+    MappedDatabase), so they must be replaced rather than rewritten in place.
+    """
+    path = Path(path)
+
+    with tempfile.NamedTemporaryFile('wb',
+                                     dir=path.parent,
+                                     prefix=f'.{path.name}.',
+                                     delete=False) as fd:
+        try:
+            write(fd)
+            fd.close()
+
+            if path.exists():
+                shutil.copymode(path, fd.name)
+            else:
+                os.chmod(fd.name, 0o666 & ~_umask())
+
+            os.replace(fd.name, path)
+        except BaseException:
+            os.unlink(fd.name)
+            raise
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def _date_removed(day: int, month: int, year: int) -> Optional[datetime]:
+    try:
+        return datetime(year, month, day)
+    except ValueError:  # 0xff/0xff/0xffff means the entry was not removed.
+        return None
+
+
+class _TokenColumn(Sequence[int]):
+    """The sorted tokens in a binary database's entry table, for bisect."""
+    def __init__(self, data, start: int, stride: int, count: int) -> None:
+        self._data = data
+        self._start = start
+        self._stride = stride
+        self._count = count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+
+        return _TOKEN.unpack_from(self._data,
+                                  self._start + index * self._stride)[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class _BinaryTable(abc.ABC):
+    """Decodes entries on demand from the contents of a binary database."""
+    def __init__(self, data, name: str, count: int, entry: struct.Struct,
+                 entries_start: int, strings_start: int, size: int) -> None:
+        self._data = data
+        self._name = name
+        self._count = count
+        self._entry = entry
+        self._entries_start = entries_start
+        self._strings_start = strings_start
+        self._tokens = _TokenColumn(data, entries_start, entry.size, count)
+
+        if size > len(data):
+            raise DatabaseFormatError(
+                f'{name} is truncated; expected at least {size} B, found '
+                f'{len(data)} B')
+
+    def __len__(self) -> int:
+        return self._count
+
+    def tokens(self) -> Iterator[int]:
+        """Yields the token of every entry, in order."""
+        for token, *_ in self._entry.iter_unpack(
+                self._data[self._entries_start:self._entries_start +
+                           self._count * self._entry.size]):
+            yield token
+
+    def find(self, token: int) -> range:
+        """Returns the indices of the entries for a token."""
+        start = bisect.bisect_left(self._tokens, token)
+        return range(start, bisect.bisect_right(self._tokens, token, start))
+
+    @abc.abstractmethod
+    def entry(self, index: int) -> TokenizedStringEntry:
+        """Decodes the entry at an index in the entry table."""
+
+    def iter_entries(self) -> Iterator[TokenizedStringEntry]:
+        return (self.entry(index) for index in range(self._count))
+
+    def _string(self, start: int) -> Tuple[str, int]:
+        """Decodes the string at an absolute offset; returns it and its end."""
+        end = self._data.find(b'\0', start)
+        if end == -1:
+            raise DatabaseFormatError(
+                f'String at offset {start} in {self._name} is not null '
+                'terminated')
+
+        return self._data[start:end].decode(), end
+
+
+class _BinaryTableV1(_BinaryTable):
+    """Reads the original binary format, which has no string offsets."""
+    def __init__(self, data, name: str) -> None:
+        _, count = _unpack_header(BINARY_FORMAT.header, data, name)
+        strings_start = (BINARY_FORMAT.header.size +
+                         count * BINARY_FORMAT.entry.size)
+        super().__init__(data, name, count, BINARY_FORMAT.entry,
+                         BINARY_FORMAT.header.size, strings_start,
+                         strings_start)
+
+        # String offsets are found the first time a string is read.
+        self._string_offsets: Optional[array] = None
+
+    def entry(self, index: int) -> TokenizedStringEntry:
+        token, day, month, year = self._entry.unpack_from(
+            self._data, self._entries_start + index * self._entry.size)
+        string, _ = self._string(self._strings_start +
+                                 self._string_offset(index))
+        return TokenizedStringEntry(token, string, DEFAULT_DOMAIN,
+                                    _date_removed(day, month, year))
+
+    def iter_entries(self) -> Iterator[TokenizedStringEntry]:
+        offset = self._strings_start
+
+        for token, day, month, year in self._entry.iter_unpack(
+                self._data[self._entries_start:self._strings_start]):
+            string, end = self._string(offset)
+            offset = end + 1
+            yield TokenizedStringEntry(token, string, DEFAULT_DOMAIN,
+                                       _date_removed(day, month, year))
+
+    def _string_offset(self, index: int) -> int:
+        if self._string_offsets is None:
+            offsets = array('I')
+            offset = self._strings_start
+
+            for _ in range(self._count):
+                offsets.append(offset - self._strings_start)
+                offset = self._string(offset)[1] + 1
+
+            self._string_offsets = offsets
+
+        return self._string_offsets[index]
+
+
+class _BinaryTableV2(_BinaryTable):
+    """Reads the indexed (version 2) binary format."""
+    def __init__(self, data, name: str) -> None:
+        fmt = BINARY_FORMAT_V2
+        _, count, domain_count, self._slots, strings_size = _unpack_header(
+            fmt.header, data, name)
+
+        domains_start = fmt.header.size + count * fmt.entry.size
+        self._index_start = domains_start + domain_count * fmt.offset.size
+        strings_start = self._index_start + self._slots * fmt.offset.size
+
+        super().__init__(data, name, count, fmt.entry, fmt.header.size,
+                         strings_start, strings_start + strings_size)
+
+        self._domains = [
+            self._string(strings_start + offset)[0] for offset, in
+            fmt.offset.iter_unpack(data[domains_start:self._index_start])
+        ]
+
+    def find(self, token: int) -> range:
+        slot = _index_slot(token, self._slots)
+
+        for _ in range(self._slots):
+            first = BINARY_FORMAT_V2.offset.unpack_from(
+                self._data,
+                self._index_start + slot * BINARY_FORMAT_V2.offset.size)[0]
+
+            if first == 0:
+                break
+
+            if self._tokens[first - 1] == token:
+                end = first
+                while end < self._count and self._tokens[end] == token:
+                    end += 1
+                return range(first - 1, end)
+
+            slot = (slot + 1) % self._slots
+
+        return range(0)
+
+    def entry(self, index: int) -> TokenizedStringEntry:
+        token, day, month, year, domain, offset = self._entry.unpack_from(
+            self._data, self._entries_start + index * self._entry.size)
+        string, _ = self._string(self._strings_start + offset)
+        return TokenizedStringEntry(token, string, self._domains[domain],
+                                    _date_removed(day, month, year))
+
+
+def _unpack_header(header: struct.Struct, data, name: str) -> tuple:
+    try:
+        return header.unpack_from(data)
+    except struct.error as err:
+        raise DatabaseFormatError(
+            f'{name} is too short to be a binary token database') from err
+
+
+def _binary_table(data, name: str) -> _BinaryTable:
+    magic = bytes(data[:len(BINARY_FORMAT.magic)])
+
+    if magic == BINARY_FORMAT.magic:
+        return _BinaryTableV1(data, name)
+
+    if magic == BINARY_FORMAT_V2.magic:
+        return _BinaryTableV2(data, name)
+
+    raise DatabaseFormatError(
+        f'Binary token database magic number mismatch (found {magic!r}, '
+        f'expected {BINARY_FORMAT.magic!r} or {BINARY_FORMAT_V2.magic!r}) '
+        f'while reading from {name}')
+
+
+class _EntryTable(Mapping[int, TokenizedStringEntry]):
+    """Maps entry indices to entries decoded from a binary database."""
+    def __init__(self, table: _BinaryTable) -> None:
+        self._table = table
+
+    def __getitem__(self, index: int) -> TokenizedStringEntry:
+        if not 0 <= index < len(self._table):
+            raise KeyError(index)
+
+        return self._table.entry(index)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self._table)))
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+class _TokenIndex(Mapping[int, List[TokenizedStringEntry]]):
+    """Maps tokens to entries by searching a binary database.
+
+    As with Database.token_to_entries, tokens not in the database map to an
+    empty list.
+    """
+    def __init__(self, table: _BinaryTable) -> None:
+        self._table = table
+        self._unique_tokens: Optional[int] = None
+
+    def __getitem__(self, token: int) -> List[TokenizedStringEntry]:
+        return [self._table.entry(i) for i in self._table.find(token)]
+
+    def __contains__(self, token: object) -> bool:
+        return isinstance(token, int) and bool(self._table.find(token))
+
+    def __iter__(self) -> Iterator[int]:
+        previous = None
+        for token in self._table.tokens():
+            if token != previous:
+                previous = token
+                yield token
+
+    def __len__(self) -> int:
+        if self._unique_tokens is None:
+            self._unique_tokens = sum(1 for _ in self)
+
+        return self._unique_tokens
+
+
+class MappedDatabase(Database):
+    """A read-only token database that reads a binary database file on demand.
+
+    The file is memory mapped rather than parsed. Lookups search the entry table
+    and decode only the matching strings and removal dates, so opening a
+    database is fast and uses little memory regardless of its size.
+
+    Version 2 binary databases are searched with their hash index. Original
+    format databases are binary searched; their string offsets are found by
+    scanning the string table the first time a string is read.
+
+    The file must not be rewritten in place while it is mapped; the process may
+    crash with SIGBUS if it is. Pigweed's tools replace database files
+    atomically (see write_atomically), but other programs, such as cp, may not.
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+
+        with self.path.open('rb') as fd:
+            if os.name == 'nt':
+                # Windows cannot replace files that are mapped, so read the
+                # file into memory to avoid blocking updates to it.
+                self._data: Union[bytes, mmap.mmap] = fd.read()
+            else:
+                self._data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._table = _binary_table(self._data, str(self.path))
+        except DatabaseFormatError:
+            self.close()
+            raise
+
+        self._token_index = _TokenIndex(self._table)
+
+    def close(self) -> None:
+        """Releases the mapped file. The database cannot be used afterwards."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self) -> 'MappedDatabase':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def lookup(self, token: int) -> List[TokenizedStringEntry]:
+        """Returns the entries for a token without reading other entries."""
+        return self._token_index[token]
+
+    @property  # type: ignore[override]
+    def token_to_entries(self) -> Mapping[int, List[TokenizedStringEntry]]:
+        """Returns a mapping of tokens to TokenizedStringEntry lists."""
+        return self._token_index
+
+    def entries(self) -> ValuesView[TokenizedStringEntry]:
+        """Returns a view that decodes entries as it is iterated."""
+        return _EntryTable(self._table).values()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def _read_only(self, *_args, **_kwargs):
+        raise TypeError(
+            f'{type(self).__name__} is read-only; use Database.merged() to '
+            'create a modifiable copy')
+
+    mark_removed = _read_only
+    add = _read_only
+    purge = _read_only
+    merge = _read_only
+    filter = _read_only
@@ -434,6 +434,160 @@ class TestDatabaseFile(unittest.TestCase):
             tokens.DatabaseFile(self._path)
 
 
+class TestMappedDatabase(unittest.TestCase):
+    """Tests the MappedDatabase class."""
+    def setUp(self):
+        file = tempfile.NamedTemporaryFile(delete=False)
+        file.write(BINARY_DATABASE)
+        file.close()
+        self._path = Path(file.name)
+        self.db = tokens.MappedDatabase(self._path)
+
+    def tearDown(self):
+        self.db.close()
+        self._path.unlink()
+
+    def test_matches_parsed_database(self):
+        self.assertEqual(str(self.db), CSV_DATABASE)
+        self.assertEqual(len(self.db), 16)
+        self.assertEqual(len(self.db.token_to_entries), 16)
+
+    def test_lookup(self):
+        parsed = read_db_from_csv(CSV_DATABASE)
+
+        for token in parsed.token_to_entries:
+            self.assertIn(token, self.db.token_to_entries)
+            self.assertEqual(self.db.token_to_entries[token],
+                             parsed.token_to_entries[token])
+
+        self.assertEqual(self.db.token_to_entries[0x9999], [])
+        self.assertNotIn(0x9999, self.db.token_to_entries)
+        self.assertNotIn(0xffffffff, self.db.token_to_entries)
+
+        jello, = self.db.lookup(0x2e668cd6)
+        self.assertEqual(jello.string, 'Jello, world!')
+        self.assertEqual(jello.date_removed, datetime.datetime(2019, 6, 11))
+
+    def test_collisions(self):
+        db = tokens.Database.from_strings(['o000', '0Q1Q', 'other'])
+        with self._path.open('wb') as fd:
+            tokens.write_binary(db, fd)
+
+        with tokens.MappedDatabase(self._path) as mapped:
+            (token, entries), = mapped.collisions()
+            self.assertEqual(token, tokens.default_hash('o000'))
+            self.assertEqual([e.string for e in entries], ['0Q1Q', 'o000'])
+            self.assertEqual(len(mapped.token_to_entries), 2)
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.db.add(_entries('new'))
+
+        with self.assertRaises(TypeError):
+            self.db.purge()
+
+        copy = tokens.Database.merged(self.db)
+        copy.add(_entries('new'))
+        self.assertEqual(len(copy), 17)
+
+    def test_not_binary_database(self):
+        self._path.write_text(CSV_DATABASE)
+
+        with self.assertRaises(tokens.DatabaseFormatError):
+            tokens.MappedDatabase(self._path)
+
+    def test_truncated(self):
+        self._path.write_bytes(BINARY_DATABASE[:40])
+
+        with self.assertRaises(tokens.DatabaseFormatError):
+            tokens.MappedDatabase(self._path)
+
+    def test_write_to_file_replaces_mapped_file(self):
+        db = tokens.DatabaseFile(self._path)
+        db.add(_entries('New entry!'))
+        db.write_to_file()
+
+        self.assertEqual(str(self.db), CSV_DATABASE)
+        self.assertEqual(len(tokens.MappedDatabase(self._path)), 17)
+
+
+class TestBinaryFormatV2(unittest.TestCase):
+    """Tests the indexed (version 2) binary database format."""
+    def setUp(self):
+        self.db = read_db_from_csv(CSV_DATABASE)
+        self.db.add([
+            tokens.TokenizedStringEntry(1, 'In a domain', 'TEST_DOMAIN'),
+            tokens.TokenizedStringEntry(1, 'In another', 'OTHER'),
+        ])
+
+        file = tempfile.NamedTemporaryFile(delete=False)
+        tokens.write_binary_v2(self.db, file)
+        file.close()
+        self._path = Path(file.name)
+
+    def tearDown(self):
+        self._path.unlink()
+
+    def test_parse(self):
+        with self._path.open('rb') as fd:
+            parsed = list(tokens.parse_binary(fd))
+
+        self.assertEqual(parsed, sorted(self.db.entries()))
+
+    def test_mapped_lookup(self):
+        with tokens.MappedDatabase(self._path) as mapped:
+            self.assertEqual(len(mapped), 18)
+
+            for token, entries in self.db.token_to_entries.items():
+                self.assertEqual(mapped.token_to_entries[token],
+                                 sorted(entries))
+
+            self.assertEqual([(e.string, e.domain)
+                              for e in mapped.token_to_entries[1]],
+                             [('In a domain', 'TEST_DOMAIN'),
+                              ('In another', 'OTHER')])
+            self.assertNotIn(0x9999, mapped.token_to_entries)
+            self.assertEqual(mapped.token_to_entries[0x9999], [])
+
+    def test_mapped_lookup_many_tokens(self):
+        strings = [f'string {i}' for i in range(1000)]
+        db = tokens.Database.from_strings(strings)
+        with self._path.open('wb') as fd:
+            tokens.write_binary_v2(db, fd)
+
+        with tokens.MappedDatabase(self._path) as mapped:
+            for string in strings:
+                entry, = mapped.lookup(default_hash(string))
+                self.assertEqual(entry.string, string)
+
+            self.assertEqual(len(mapped.token_to_entries), 1000)
+
+    def test_empty(self):
+        with self._path.open('wb') as fd:
+            tokens.write_binary_v2(tokens.Database(), fd)
+
+        with tokens.MappedDatabase(self._path) as mapped:
+            self.assertEqual(len(mapped), 0)
+            self.assertEqual(mapped.lookup(0), [])
+
+    def test_database_file_keeps_format(self):
+        db = tokens.DatabaseFile(self._path)
+        self.assertEqual(sorted(db.entries()), sorted(self.db.entries()))
+
+        db.add(_entries('New entry!'))
+        db.write_to_file()
+
+        self.assertEqual(self._path.read_bytes()[:8],
+                         tokens.BINARY_FORMAT_V2.magic)
+        self.assertEqual(len(tokens.DatabaseFile(self._path)), 19)
+
+    def test_truncated(self):
+        self._path.write_bytes(self._path.read_bytes()[:-1])
+
+        with self.assertRaises(tokens.DatabaseFormatError):
+            tokens.MappedDatabase(self._path)
+
+
 class TestFilter(unittest.TestCase):
     """Tests the filtering functionality."""
     def setUp(self):
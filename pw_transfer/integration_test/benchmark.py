@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Throughput benchmark for the pw_transfer Python client.
+
+Runs write and read transfers between the Python transfer client and the
+integration test server through the integration test proxy, which simulates a
+link with limited bandwidth, latency, and data loss. Every combination of the
+swept chunk sizes, window sizes, loss rates, and payload sizes is benchmarked.
+
+One row is output for each configuration and transfer direction, with the
+throughput, the number of retransmits, and the client's CPU time per MiB
+transferred. Rows are output as CSV or as one JSON object per line.
+
+Usage:
+
+   bazel run pw_transfer/integration_test:benchmark -- \\
+       --loss-rates 0,0.01 --latency-ms 5 --output /tmp/transfer.csv
+
+"""
+
+import argparse
+import csv
+from dataclasses import dataclass
+import functools
+import itertools
+import json
+import logging
+import math
+from pathlib import Path
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Sequence,
+                    TextIO)
+
+from pigweed.pw_transfer.integration_test import config_pb2
+from pw_hdlc import rpc
+from pw_hdlc.decode import FrameDecoder
+import pw_rpc
+from pw_rpc import callback_client
+import pw_transfer
+from pw_transfer import transfer_pb2
+from rules_python.python.runfiles import runfiles
+
+_LOG = logging.getLogger('pw_transfer_benchmark')
+
+RESOURCE_ID = 12
+
+# Time for the server and proxy to start up or shut down.
+_PROCESS_TIMEOUT_S = 5
+
+# Like the integration test server and proxy, the client uses a small socket
+# send buffer so that rate limiting in the proxy blocks the client rather than
+# letting data back up in OS buffers.
+_SEND_BUFFER_SIZE = 2048
+
+# The host RPC server decodes HDLC frames of up to 512 bytes, so a chunk must
+# leave room for the RPC packet and HDLC framing. Larger chunks are dropped.
+_MAX_CHUNK_SIZE_BYTES = 448
+
+_COLUMNS = (
+    'direction',
+    'payload_size_bytes',
+    'chunk_size_bytes',
+    'window_size_bytes',
+    'loss_rate',
+    'rate_limit_bytes_per_s',
+    'latency_ms',
+    'transfers',
+    'failures',
+    'bytes_per_s',
+    'retransmits',
+    'cpu_s_per_mib',
+)
+
+
+@dataclass(frozen=True)
+class Config:
+    """A combination of swept transfer and link parameters."""
+    chunk_size_bytes: int
+    window_size_bytes: int
+    loss_rate: float
+    payload_size_bytes: int
+
+
+@dataclass
+class Result:
+    """Totals for the transfers in one direction for one Config."""
+    direction: str
+    config: Config
+    transfers: int = 0
+    failures: int = 0
+    bytes_transferred: int = 0
+    wall_time_s: float = 0.0
+    cpu_time_s: float = 0.0
+    retransmits: int = 0
+
+    def row(self, args: argparse.Namespace) -> Dict[str, Any]:
+        """Returns the result as a table row with the _COLUMNS fields."""
+        mib = self.bytes_transferred / (1024 * 1024)
+        bytes_per_s = 0
+        if self.wall_time_s:
+            bytes_per_s = round(self.bytes_transferred / self.wall_time_s)
+        cpu_s_per_mib = round(self.cpu_time_s / mib, 4) if mib else None
+
+        return {
+            'direction': self.direction,
+            'payload_size_bytes': self.config.payload_size_bytes,
+            'chunk_size_bytes': self.config.chunk_size_bytes,
+            'window_size_bytes': self.config.window_size_bytes,
+            'loss_rate': self.config.loss_rate,
+            'rate_limit_bytes_per_s': args.rate_limit,
+            'latency_ms': args.latency_ms,
+            'transfers': self.transfers,
+            'failures': self.failures,
+            'bytes_per_s': bytes_per_s,
+            'retransmits': self.retransmits,
+            'cpu_s_per_mib': cpu_s_per_mib,
+        }
+
+
+class _MonitoredProcess:
+    """A subprocess whose output is logged from a background thread."""
+    def __init__(self, name: str, command: Sequence[str], config: Any,
+                 ready_message: str):
+        _LOG.debug(f'Starting {name} with config\n{config}')
+        self._name = name
+        self._ready_message = ready_message
+        self._ready = threading.Event()
+        self._started = False
+
+        self._process = subprocess.Popen(command,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT)
+        assert self._process.stdin is not None
+        self._process.stdin.write(str(config).encode('ascii'))
+        self._process.stdin.close()
+
+        self._thread = threading.Thread(target=self._log_output, daemon=True)
+        self._thread.start()
+
+    def _log_output(self) -> None:
+        assert self._process.stdout is not None
+        for line in self._process.stdout:
+            text = line.decode(errors='replace').rstrip()
+            _LOG.debug(f'{self._name}: {text}')
+            if self._ready_message in text:
+                self._started = True
+                self._ready.set()
+
+        # Wake up wait_until_ready() if the process exits without starting.
+        self._ready.set()
+
+    def wait_until_ready(self) -> None:
+        if not self._ready.wait(_PROCESS_TIMEOUT_S) or not self._started:
+            raise RuntimeError(f'{self._name} failed to start')
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.terminate()
+
+        try:
+            self._process.wait(_PROCESS_TIMEOUT_S)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+        self._thread.join()
+
+
+class _Client:
+    """A transfer Manager connected to the proxy over a socket.
+
+    Unlike HdlcRpcClient, whose read thread never exits, the client's read
+    thread stops when the client is closed, so sweeps do not leak threads.
+    """
+    def __init__(self, config: Config, args: argparse.Namespace):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                _SEND_BUFFER_SIZE)
+        self._socket.connect(('localhost', args.client_port))
+
+        self._client = pw_rpc.Client.from_modules(
+            callback_client.Impl(), rpc.default_channels(self._socket.sendall),
+            [transfer_pb2])
+
+        self._read_thread = threading.Thread(target=self._read_from_socket,
+                                             daemon=True)
+        self._read_thread.start()
+
+        self.manager = pw_transfer.Manager(
+            self._client.channel(1).rpcs.pw.transfer.Transfer,
+            default_response_timeout_s=args.timeout_s,
+            initial_response_timeout_s=args.initial_timeout_s,
+            max_retries=args.max_retries,
+            read_window_size_bytes=config.window_size_bytes,
+            read_chunk_size_bytes=config.chunk_size_bytes)
+
+    def _read_from_socket(self) -> None:
+        decoder = FrameDecoder()
+
+        while True:
+            try:
+                data = self._socket.recv(4096)
+            except OSError:
+                return
+
+            if not data:
+                return
+
+            for frame in decoder.process_valid_frames(data):
+                if frame.address == rpc.DEFAULT_ADDRESS:
+                    self._client.process_packet(frame.data)
+
+    def close(self) -> None:
+        # Shutting down the socket wakes up the blocked recv() call. Stop the
+        # read thread first so that it does not pass chunks to a closed Manager.
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._read_thread.join()
+        self._socket.close()
+
+        self.manager.close()
+
+
+def _server_config(config: Config, args: argparse.Namespace,
+                   file: Path) -> config_pb2.ServerConfig:
+    return config_pb2.ServerConfig(
+        resource_id=RESOURCE_ID,
+        file=str(file),
+        chunk_size_bytes=config.chunk_size_bytes,
+        pending_bytes=config.window_size_bytes,
+        chunk_timeout_seconds=max(math.ceil(args.timeout_s), 1),
+        transfer_service_retries=args.max_retries,
+        extend_window_divisor=32,
+    )
+
+
+def _proxy_config(config: Config,
+                  args: argparse.Namespace) -> config_pb2.ProxyConfig:
+    """Returns a proxy config that applies the same link to both directions."""
+    proxy_config = config_pb2.ProxyConfig()
+
+    stacks = (
+        (proxy_config.client_filter_stack, args.seed),
+        (proxy_config.server_filter_stack, args.seed + 1),
+    )
+    for stack, seed in stacks:
+        if args.rate_limit:
+            stack.add(rate_limiter=config_pb2.RateLimiterConfig(
+                rate=args.rate_limit))
+
+        stack.add(hdlc_packetizer=config_pb2.HdlcPacketizerConfig())
+
+        if config.loss_rate:
+            stack.add(data_dropper=config_pb2.DataDropperConfig(
+                rate=config.loss_rate, seed=seed))
+
+        if args.latency_ms:
+            stack.add(data_delayer=config_pb2.DataDelayerConfig(
+                delay=args.latency_ms / 1000))
+
+    return proxy_config
+
+
+def _measure(result: Result, transfer: Callable[[pw_transfer.ProgressCallback],
+                                                bool]) -> None:
+    """Runs a transfer and adds its measurements to the result."""
+    progress: List[pw_transfer.ProgressStats] = []
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        ok = transfer(progress.append)
+    except pw_transfer.Error as err:
+        _LOG.warning(f'{result.direction} transfer failed: {err}')
+        ok = False
+    cpu_time_s = time.process_time() - cpu_start
+    wall_time_s = time.perf_counter() - wall_start
+
+    result.transfers += 1
+    if progress:
+        result.retransmits += progress[-1].retransmits
+
+    if not ok:
+        result.failures += 1
+        return
+
+    result.bytes_transferred += result.config.payload_size_bytes
+    result.wall_time_s += wall_time_s
+    result.cpu_time_s += cpu_time_s
+
+
+def _write(manager: pw_transfer.Manager, payload: bytes,
+           progress: pw_transfer.ProgressCallback) -> bool:
+    manager.write(RESOURCE_ID, payload, progress)
+    return True
+
+
+def _read(manager: pw_transfer.Manager, payload: bytes,
+          progress: pw_transfer.ProgressCallback) -> bool:
+    if manager.read(RESOURCE_ID, progress) != payload:
+        _LOG.warning('read transfer returned the wrong data')
+        return False
+    return True
+
+
+def _benchmark(config: Config, args: argparse.Namespace) -> List[Result]:
+    """Runs write and read transfers for one configuration."""
+    write = Result('write', config)
+    read = Result('read', config)
+
+    rng = random.Random(args.seed)
+    payload = rng.getrandbits(8 * config.payload_size_bytes).to_bytes(
+        config.payload_size_bytes, 'little')
+
+    with tempfile.TemporaryDirectory(prefix='pw_transfer_benchmark_') as tmp:
+        proxy = _MonitoredProcess('PROXY', [
+            args.proxy, '--server-port',
+            str(args.server_port), '--client-port',
+            str(args.client_port)
+        ], _proxy_config(config, args), 'Listening for client connection')
+        try:
+            proxy.wait_until_ready()
+
+            server = _MonitoredProcess(
+                'SERVER', [args.server, str(args.server_port)],
+                _server_config(config, args, Path(tmp, 'data')),
+                'Starting pw_rpc server')
+            try:
+                server.wait_until_ready()
+
+                client = _Client(config, args)
+                try:
+                    # The server reads back the data that was last written to
+                    # it, so alternate writes and reads of the payload.
+                    for _ in range(args.iterations):
+                        _measure(
+                            write,
+                            functools.partial(_write, client.manager, payload))
+                        _measure(
+                            read,
+                            functools.partial(_read, client.manager, payload))
+                finally:
+                    client.close()
+            finally:
+                server.close()
+        finally:
+            proxy.close()
+
+    return [write, read]
+
+
+class _Writer:
+    """Writes result rows as CSV or as JSON objects, one per line."""
+    def __init__(self, output: TextIO, output_format: str):
+        self._output = output
+        self._csv: Optional[csv.DictWriter] = None
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(output, _COLUMNS)
+            self._csv.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._csv is None:
+            self._output.write(json.dumps(row) + '\n')
+        else:
+            self._csv.writerow(row)
+
+        # Flush each row so results are available during long sweeps.
+        self._output.flush()
+
+
+def _configs(args: argparse.Namespace) -> Iterable[Config]:
+    for values in itertools.product(args.chunk_sizes, args.window_sizes,
+                                    args.loss_rates, args.payload_sizes):
+        yield Config(*values)
+
+
+def _run(args: argparse.Namespace, output: TextIO) -> None:
+    writer = _Writer(output, args.format)
+
+    for config in _configs(args):
+        _LOG.info(f'Benchmarking {config}')
+        for result in _benchmark(config, args):
+            writer.write(result.row(args))
+
+
+def _list_of(parse: Callable[[str], Any]) -> Callable[[str], List[Any]]:
+    return lambda arg: [parse(value) for value in arg.split(',')]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--chunk-sizes',
+                        type=_list_of(int),
+                        default=[128, 448],
+                        help=('Comma-separated max chunk sizes, in bytes; '
+                              f'at most {_MAX_CHUNK_SIZE_BYTES}'))
+    parser.add_argument('--window-sizes',
+                        type=_list_of(int),
+                        default=[8192, 32768],
+                        help='Comma-separated window sizes, in bytes')
+    parser.add_argument(
+        '--loss-rates',
+        type=_list_of(float),
+        default=[0.0, 0.01],
+        help='Comma-separated fractions of HDLC frames the proxy drops')
+    parser.add_argument('--payload-sizes',
+                        type=_list_of(int),
+                        default=[64 * 1024, 1024 * 1024],
+                        help='Comma-separated transfer sizes, in bytes')
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        default=0,
+        help='Link bandwidth in each direction, in bytes/s; 0 for no limit')
+    parser.add_argument('--latency-ms',
+                        type=float,
+                        default=0,
+                        help='Link latency in each direction, in milliseconds')
+    parser.add_argument('--iterations',
+                        type=int,
+                        default=3,
+                        help='Number of transfers in each direction')
+    parser.add_argument('--timeout-s',
+                        type=float,
+                        default=1.0,
+                        help='Time to wait for a response before retrying')
+    parser.add_argument('--initial-timeout-s',
+                        type=float,
+                        default=4.0,
+                        help='Time to wait for the first response')
+    parser.add_argument('--max-retries',
+                        type=int,
+                        default=5,
+                        help='Number of retries before a transfer fails')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=1,
+                        help='Seed for the payloads and dropped data')
+    parser.add_argument('--format',
+                        choices=('csv', 'json'),
+                        default='csv',
+                        help='Output format')
+    parser.add_argument('--output',
+                        type=Path,
+                        help='File to write results to; defaults to stdout')
+    parser.add_argument('--server-port',
+                        type=int,
+                        default=3310,
+                        help='Port of the integration test server')
+    parser.add_argument('--client-port',
+                        type=int,
+                        default=3311,
+                        help='Port of the proxy, to which the client connects')
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='store_true',
+                        help='Log the server and proxy output')
+
+    args = parser.parse_args()
+
+    if max(args.chunk_sizes) > _MAX_CHUNK_SIZE_BYTES:
+        parser.error('chunk sizes must be at most '
+                     f'{_MAX_CHUNK_SIZE_BYTES} bytes')
+
+    return args
+
+
+def main() -> None:
+    args = _parse_args()
+
+    _LOG.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s.%(msecs)03d-%(levelname)s: %(message)s',
+        datefmt='%H:%M:%S',
+        stream=sys.stderr)
+
+    r = runfiles.Create()
+    args.server = r.Rlocation('pigweed/pw_transfer/integration_test/server')
+    args.proxy = r.Rlocation('pigweed/pw_transfer/integration_test/proxy')
+
+    if args.output is None:
+        _run(args, sys.stdout)
+    else:
+        with args.output.open('w', newline='') as output:
+            _run(args, output)
+
+
+if __name__ == '__main__':
+    main()
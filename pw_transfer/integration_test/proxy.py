@@ -193,6 +193,41 @@ class DataTransposer(Filter):
         await self._data_queue.put(data)
 
 
+class DataDelayer(Filter):
+    """A filter which delays data by a fixed latency.
+
+    Data is sent in order, ``delay`` seconds after it is received. Unlike
+    ``RateLimiter``, delayed data does not hold up the data behind it, so this
+    filter models the propagation delay of a link rather than its bandwidth.
+    """
+    def __init__(self, send_data: Callable[[bytes], Awaitable[None]],
+                 name: str, delay: float):
+        super().__init__(send_data)
+        self._name = name
+        self._delay = delay
+        self._data_queue = asyncio.Queue()
+        self._delay_task = asyncio.create_task(self._delay_handler())
+
+        _LOG.info(f'{name} DataDelayer initialized with delay {delay}s')
+
+    def __del__(self):
+        _LOG.info(f'{self._name} cleaning up delay task.')
+        self._delay_task.cancel()
+
+    async def _delay_handler(self):
+        """Async task that sends data once its delay has elapsed."""
+        loop = asyncio.get_running_loop()
+        while True:
+            send_time, data = await self._data_queue.get()
+            await asyncio.sleep(max(send_time - loop.time(), 0.0))
+            await self.send_data(data)
+
+    async def process(self, data: bytes) -> None:
+        # Queue data with the time at which to send it.
+        send_time = asyncio.get_running_loop().time() + self._delay
+        await self._data_queue.put((send_time, data))
+
+
 async def _handle_simplex_connection(name: str, filter_stack_config: List[
     config_pb2.FilterConfig], reader: asyncio.StreamReader,
                                      writer: asyncio.StreamWriter) -> None:
@@ -219,6 +254,9 @@ async def _handle_simplex_connection(name: str, filter_stack_config: List[
             transposer = config.data_transposer
             filter_stack = DataTransposer(filter_stack, name, transposer.rate,
                                           transposer.timeout, transposer.seed)
+        elif filter_name == "data_delayer":
+            filter_stack = DataDelayer(filter_stack, name,
+                                       config.data_delayer.delay)
         else:
             sys.exit(f'Unknown filter {filter_name}')
 
@@ -83,6 +83,28 @@ class ProxyTest(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(sent_packets, [b'aaaaaaaaaa', b'bbbbbbbbbb'])
 
+    async def test_delayer(self):
+        sent_packets: List[bytes] = []
+
+        # Async helper so DataDelayer can await on it.
+        async def append(list: List[bytes], data: bytes):
+            list.append(data)
+
+        delayer = proxy.DataDelayer(lambda data: append(sent_packets, data),
+                                    name="test",
+                                    delay=0.100)
+        await delayer.process(b'aaaaaaaaaa')
+        await delayer.process(b'bbbbbbbbbb')
+
+        # Nothing is sent until the delay has elapsed.
+        await asyncio.sleep(0.05)
+        self.assertEqual(sent_packets, [])
+
+        # Both packets are delayed by the same amount rather than one after the
+        # other, so they are sent together.
+        await asyncio.sleep(0.1)
+        self.assertEqual(sent_packets, [b'aaaaaaaaaa', b'bbbbbbbbbb'])
+
 
 if __name__ == '__main__':
     unittest.main()
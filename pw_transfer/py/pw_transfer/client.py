@@ -14,15 +14,17 @@
 """Client for the pw_transfer service, which transmits data over pw_rpc."""
 
 import asyncio
+import bisect
+import itertools
 import logging
 import threading
-from typing import Any, Dict, Optional, Union
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple, Union
 
 from pw_rpc.callback_client import BidirectionalStreamingCall
 from pw_status import Status
 
 from pw_transfer.transfer import (ProgressCallback, ReadTransfer, Transfer,
-                                  WriteTransfer)
+                                  WriteSource, WriteTransfer)
 from pw_transfer.transfer_pb2 import Chunk
 
 _LOG = logging.getLogger(__package__)
@@ -39,13 +41,23 @@ class Manager:  # pylint: disable=too-many-instance-attributes
 
     When created, a Manager starts a separate thread in which transfer
     communications and events are handled.
+
+    Transfers are scheduled in the transfer thread. Up to
+    max_concurrent_transfers transfers run at once, sharing the RPC streams
+    chunk by chunk. Additional transfers wait in a queue and start in order of
+    priority, then submission. Transfers with the same session ID and type run
+    one at a time.
     """
     def __init__(self,
                  rpc_transfer_service,
                  *,
                  default_response_timeout_s: float = 2.0,
                  initial_response_timeout_s: float = 4.0,
-                 max_retries: int = 3):
+                 max_retries: int = 3,
+                 read_window_size_bytes: int = 8192,
+                 read_chunk_size_bytes: int = 1024,
+                 adaptive_read_window: bool = False,
+                 max_concurrent_transfers: int = 8):
         """Initializes a Manager on top of a TransferService.
 
         Args:
@@ -54,11 +66,31 @@ class Manager:  # pylint: disable=too-many-instance-attributes
           initial_response_timeout_s: timeout for the first packet; may be
               longer to account for transfer handler initialization
           max_retires: number of times to retry after a timeout
+          read_window_size_bytes: bytes requested at once in read transfers;
+              the initial window size if adaptive_read_window is set
+          read_chunk_size_bytes: max size of chunks sent by the server in read
+              transfers
+          adaptive_read_window: whether read transfers grow their window while
+              data arrives in order and shrink it when data is lost
+          max_concurrent_transfers: max number of transfers to run at once
         """
+        if max_concurrent_transfers < 1:
+            raise ValueError('max_concurrent_transfers must be at least 1')
+
         self._service: Any = rpc_transfer_service
         self._default_response_timeout_s = default_response_timeout_s
         self._initial_response_timeout_s = initial_response_timeout_s
         self.max_retries = max_retries
+        self.read_window_size_bytes = read_window_size_bytes
+        self.read_chunk_size_bytes = read_chunk_size_bytes
+        self.adaptive_read_window = adaptive_read_window
+        self.max_concurrent_transfers = max_concurrent_transfers
+
+        # Transfers waiting to start, sorted by priority and submission order,
+        # and transfers that have started. Only used in the transfer thread.
+        self._queued_transfers: List[Tuple[int, int, Transfer]] = []
+        self._queue_order = itertools.count()
+        self._active_transfers: Set[Transfer] = set()
 
         # Ongoing transfers in the service by ID.
         self._read_transfers: _TransferDict = {}
@@ -86,6 +118,10 @@ class Manager:  # pylint: disable=too-many-instance-attributes
     def __del__(self):
         # Notify the thread that the transfer manager is being destroyed and
         # wait for it to exit.
+        self.close()
+
+    def close(self) -> None:
+        """Stops the transfer thread. The Manager cannot be used afterwards."""
         if self._thread.is_alive():
             self._loop.call_soon_threadsafe(self._quit_event.set)
             self._thread.join()
@@ -98,26 +134,78 @@ class Manager:  # pylint: disable=too-many-instance-attributes
         Raises:
           Error: the transfer failed to complete
         """
+        transfer = self._read_transfer(session_id, progress_callback)
+        self._wait(transfer)
+        return transfer.data
 
-        if session_id in self._read_transfers:
-            raise ValueError(f'Read transfer {session_id} already exists')
+    def read_to(self,
+                session_id: int,
+                sink: BinaryIO,
+                progress_callback: ProgressCallback = None) -> None:
+        """Receives ("downloads") data from the server into a file.
 
-        transfer = ReadTransfer(session_id,
-                                self._send_read_chunk,
-                                self._end_read_transfer,
-                                self._default_response_timeout_s,
-                                self._initial_response_timeout_s,
-                                self.max_retries,
-                                progress_callback=progress_callback)
-        self._start_read_transfer(transfer)
+        Data is written to the sink as it arrives rather than stored in memory,
+        so this can be used to read data of any size. If the transfer fails,
+        the sink may contain part of the data.
 
-        transfer.done.wait()
+        Args:
+          session_id: ID of the read transfer
+          sink: writable binary file to which to write the data
+          progress_callback: Optional callback periodically invoked throughout
+              the transfer with the transfer state.
 
-        if not transfer.status.ok():
-            raise Error(transfer.id, transfer.status)
+        Raises:
+          Error: the transfer failed to complete
+        """
+        self._wait(self._read_transfer(session_id, progress_callback, sink))
+
+    async def read_async(self,
+                         session_id: int,
+                         progress_callback: ProgressCallback = None,
+                         *,
+                         sink: Optional[BinaryIO] = None,
+                         priority: int = 0) -> bytes:
+        """Receives ("downloads") data from the server without blocking.
+
+        This can be awaited from any event loop. Many transfers can be started
+        at once, for example with asyncio.gather(); the Manager runs up to
+        max_concurrent_transfers of them concurrently. Cancelling the awaiting
+        task cancels the transfer.
 
+        Args:
+          session_id: ID of the read transfer
+          progress_callback: Optional callback periodically invoked throughout
+              the transfer with the transfer state.
+          sink: if provided, the data is written to this file instead of
+              returned
+          priority: queued transfers with higher priorities start first
+
+        Returns:
+          the data read, or empty bytes if a sink was provided
+
+        Raises:
+          Error: the transfer failed to complete
+        """
+        transfer = self._read_transfer(session_id, progress_callback, sink)
+        await self._wait_async(transfer, priority)
         return transfer.data
 
+    def _read_transfer(self,
+                       session_id: int,
+                       progress_callback: ProgressCallback,
+                       sink: Optional[BinaryIO] = None) -> ReadTransfer:
+        return ReadTransfer(session_id,
+                            self._send_read_chunk,
+                            self._end_read_transfer,
+                            self._default_response_timeout_s,
+                            self._initial_response_timeout_s,
+                            self.max_retries,
+                            self.read_window_size_bytes,
+                            self.read_chunk_size_bytes,
+                            progress_callback=progress_callback,
+                            sink=sink,
+                            adaptive_window=self.adaptive_read_window)
+
     def write(self,
               session_id: int,
               data: Union[bytes, str],
@@ -138,24 +226,157 @@ class Manager:  # pylint: disable=too-many-instance-attributes
         if isinstance(data, str):
             data = data.encode()
 
-        if session_id in self._write_transfers:
-            raise ValueError(f'Write transfer {session_id} already exists')
+        self._wait(self._write_transfer(session_id, data, progress_callback))
+
+    def write_from(self,
+                   session_id: int,
+                   source: WriteSource,
+                   progress_callback: ProgressCallback = None) -> None:
+        """Transmits ("uploads") data from a file or async iterable.
+
+        Data is read from the source as the server requests it, so only about
+        one transfer window of data is held in memory. Files are read from
+        their current position. If the server requests data again after a
+        retransmission, seekable files are read again, while transfers from
+        other sources fail with DATA_LOSS if the data was already discarded.
+
+        Async iterables are iterated in the transfer manager's thread, so they
+        must not depend on another event loop.
 
-        transfer = WriteTransfer(session_id,
-                                 data,
-                                 self._send_write_chunk,
-                                 self._end_write_transfer,
-                                 self._default_response_timeout_s,
-                                 self._initial_response_timeout_s,
-                                 self.max_retries,
-                                 progress_callback=progress_callback)
-        self._start_write_transfer(transfer)
+        Args:
+          session_id: ID of the write transfer
+          source: readable binary file or async iterable of bytes to send
+          progress_callback: Optional callback periodically invoked throughout
+              the transfer with the transfer state.
 
+        Raises:
+          Error: the transfer failed to complete
+        """
+        self._wait(self._write_transfer(session_id, source, progress_callback))
+
+    async def write_async(self,
+                          session_id: int,
+                          data: Union[WriteSource, str],
+                          progress_callback: ProgressCallback = None,
+                          *,
+                          priority: int = 0) -> None:
+        """Transmits ("uploads") data to the server without blocking.
+
+        The data may be anything accepted by write() or write_from(). This can
+        be awaited from any event loop, like read_async().
+
+        Args:
+          session_id: ID of the write transfer
+          data: data, file, or async iterable of bytes to send
+          progress_callback: Optional callback periodically invoked throughout
+              the transfer with the transfer state.
+          priority: queued transfers with higher priorities start first
+
+        Raises:
+          Error: the transfer failed to complete
+        """
+        if isinstance(data, str):
+            data = data.encode()
+
+        await self._wait_async(
+            self._write_transfer(session_id, data, progress_callback),
+            priority)
+
+    def _write_transfer(self, session_id: int, data: WriteSource,
+                        progress_callback: ProgressCallback) -> WriteTransfer:
+        return WriteTransfer(session_id,
+                             data,
+                             self._send_write_chunk,
+                             self._end_write_transfer,
+                             self._default_response_timeout_s,
+                             self._initial_response_timeout_s,
+                             self.max_retries,
+                             progress_callback=progress_callback)
+
+    def _wait(self, transfer: Transfer) -> None:
+        """Schedules a transfer and blocks until it finishes."""
+        self._submit(transfer, priority=0)
         transfer.done.wait()
 
         if not transfer.status.ok():
             raise Error(transfer.id, transfer.status)
 
+    async def _wait_async(self, transfer: Transfer, priority: int) -> None:
+        """Schedules a transfer and waits for it in the caller's event loop."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def set_result(_: Transfer) -> None:
+            if not done.done():
+                done.set_result(None)
+
+        def set_done(transfer: Transfer) -> None:
+            try:
+                loop.call_soon_threadsafe(set_result, transfer)
+            except RuntimeError:  # The caller's event loop is closed.
+                pass
+
+        transfer.add_done_callback(set_done)
+        self._submit(transfer, priority)
+
+        try:
+            await done
+        except asyncio.CancelledError:
+            self._loop.call_soon_threadsafe(self._cancel_transfer, transfer)
+            raise
+
+        if not transfer.status.ok():
+            raise Error(transfer.id, transfer.status)
+
+    def _submit(self, transfer: Transfer, priority: int) -> None:
+        """Queues a transfer to start in the transfer thread."""
+        transfer.add_done_callback(lambda _: self._loop.call_soon_threadsafe(
+            self._on_transfer_done, transfer))
+        self._loop.call_soon_threadsafe(self._queue_transfer, transfer,
+                                        priority)
+
+    def _queue_transfer(self, transfer: Transfer, priority: int) -> None:
+        # Higher priorities sort first; the counter keeps submission order and
+        # prevents comparing transfers.
+        bisect.insort(self._queued_transfers,
+                      (-priority, next(self._queue_order), transfer))
+        self._start_queued_transfers()
+
+    def _start_queued_transfers(self) -> None:
+        """Starts queued transfers in priority order, up to the limit."""
+        position = 0
+        while (len(self._active_transfers) < self.max_concurrent_transfers
+               and position < len(self._queued_transfers)):
+            transfer = self._queued_transfers[position][2]
+
+            # Only one transfer of each type may use a session ID at a time.
+            if any(active.id == transfer.id and type(active) is type(transfer)
+                   for active in self._active_transfers):
+                position += 1
+                continue
+
+            del self._queued_transfers[position]
+            self._active_transfers.add(transfer)
+
+            if isinstance(transfer, ReadTransfer):
+                self._start_read_transfer(transfer)
+            else:
+                self._start_write_transfer(transfer)
+
+    def _on_transfer_done(self, transfer: Transfer) -> None:
+        if transfer in self._active_transfers:
+            self._active_transfers.remove(transfer)
+            self._start_queued_transfers()
+
+    def _cancel_transfer(self, transfer: Transfer) -> None:
+        for i, (_, _, queued) in enumerate(self._queued_transfers):
+            if queued is transfer:
+                del self._queued_transfers[i]
+                transfer.finish(Status.CANCELLED, skip_callback=True)
+                return
+
+        transfer.cancel()
+
     def _send_read_chunk(self, chunk: Chunk) -> None:
         assert self._read_stream is not None
         self._read_stream.send(chunk)
@@ -178,6 +399,16 @@ class Manager:  # pylint: disable=too-many-instance-attributes
         self._loop.create_task(self._transfer_event_loop())
         self._loop.run_forever()
 
+        # Cancel the remaining tasks, such as transfer timers, so that none are
+        # left pending when the loop is closed.
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+
+        self._loop.run_until_complete(
+            asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
     async def _transfer_event_loop(self):
         """Main async event loop."""
         exit_thread = self._loop.create_task(self._quit_event.wait())
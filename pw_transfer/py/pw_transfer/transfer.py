@@ -15,11 +15,14 @@
 
 import abc
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import io
 import logging
 import math
 import threading
-from typing import Any, Callable, Optional
+import time
+from typing import (Any, AsyncIterable, AsyncIterator, BinaryIO, Callable,
+                    List, Optional, Union)
 
 from pw_status import Status
 from pw_transfer.transfer_pb2 import Chunk
@@ -32,6 +35,12 @@ class ProgressStats:
     bytes_sent: int
     bytes_confirmed_received: int
     total_size_bytes: Optional[int]
+    # Average rate at which data was confirmed received since the transfer
+    # started. Not compared, since it depends on timing.
+    bytes_per_second: Optional[float] = field(default=None, compare=False)
+    # Number of times data was requested or sent again after it was lost or
+    # timed out.
+    retransmits: int = field(default=0, compare=False)
 
     def percent_received(self) -> float:
         if self.total_size_bytes is None:
@@ -42,12 +51,114 @@ class ProgressStats:
     def __str__(self) -> str:
         total = str(
             self.total_size_bytes) if self.total_size_bytes else 'unknown'
+        rate = '' if self.bytes_per_second is None else (
+            f', {self.bytes_per_second:.0f} B/s')
         return (f'{self.percent_received():5.1f}% ({self.bytes_sent} B sent, '
-                f'{self.bytes_confirmed_received} B received of {total} B)')
+                f'{self.bytes_confirmed_received} B received of {total} B'
+                f'{rate})')
 
 
 ProgressCallback = Callable[[ProgressStats], Any]
 
+# Data sent in a write transfer: the data itself, a readable binary file, or an
+# async iterable of byte strings.
+WriteSource = Union[bytes, BinaryIO, AsyncIterable[bytes]]
+
+
+class _WriteData:
+    """Provides the data for a write transfer from a bytes object."""
+    def __init__(self, data: bytes):
+        self._view = memoryview(data)
+
+        # The total size of the data, if it is known.
+        self.size: Optional[int] = len(data)
+
+    async def fill(self, start: int, end: int) -> None:
+        """Prepares the data in [start, end) or up to the end of the data."""
+
+    def get(self, offset: int, size: int) -> bytes:
+        """Returns up to size bytes starting at a filled offset."""
+        return bytes(self._view[offset:offset + size])
+
+    def discard(self, offset: int) -> None:
+        """Indicates that the data before offset will not be sent again."""
+
+
+class _StreamWriteData(_WriteData):
+    """Reads the data for a write transfer from a file or async iterable.
+
+    Only the data from the last offset acknowledged by the server to the end of
+    the transfer window is kept in memory. If the server requests data that was
+    already discarded, seekable files are read again; other sources fail.
+    """
+    def __init__(self, source: Union[BinaryIO, AsyncIterable[bytes]]):
+        super().__init__(b'')
+        self.size = None
+
+        self._file: Optional[BinaryIO] = None
+        self._iterator: Optional[AsyncIterator[bytes]] = None
+        if hasattr(source, '__aiter__'):
+            self._iterator = source.__aiter__()  # type: ignore[union-attr]
+        else:
+            self._file = source  # type: ignore[assignment]
+
+        # The file position at transfer offset 0, if the file is seekable.
+        self._start_position: Optional[int] = None
+        if self._file is not None and self._file.seekable():
+            self._start_position = self._file.tell()
+            self.size = self._file.seek(0, io.SEEK_END) - self._start_position
+            self._file.seek(self._start_position)
+
+        self._buffer = bytearray()
+        self._buffer_offset = 0  # Transfer offset of self._buffer[0]
+        self._end_of_data = False
+
+    def _buffer_end(self) -> int:
+        return self._buffer_offset + len(self._buffer)
+
+    async def fill(self, start: int, end: int) -> None:
+        if start < self._buffer_offset:
+            if self._start_position is None:
+                raise ValueError(
+                    f'Data at offset {start} was already discarded')
+
+            assert self._file is not None
+            self._file.seek(self._start_position + start)
+            self._buffer.clear()
+            self._buffer_offset = start
+            self._end_of_data = False
+
+        while self._buffer_end() < end and not self._end_of_data:
+            data = await self._read(end - self._buffer_end())
+            if data is None:
+                self._end_of_data = True
+                self.size = self._buffer_end()
+            else:
+                self._buffer += data
+
+    async def _read(self, size: int) -> Optional[bytes]:
+        """Reads more data from the source; returns None at the end."""
+        if self._file is not None:
+            return self._file.read(size) or None
+
+        assert self._iterator is not None
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def get(self, offset: int, size: int) -> bytes:
+        start = offset - self._buffer_offset
+        with memoryview(self._buffer) as view:
+            with view[start:start + size] as data:
+                return bytes(data)
+
+    def discard(self, offset: int) -> None:
+        if offset > self._buffer_offset:
+            offset = min(offset, self._buffer_end())
+            del self._buffer[:offset - self._buffer_offset]
+            self._buffer_offset = offset
+
 
 class _Timer:
     """A timer which invokes a callback after a certain timeout."""
@@ -103,16 +214,33 @@ class Transfer(abc.ABC):
 
         self._retries = 0
         self._max_retries = max_retries
+        self._retransmits = 0
         self._response_timer = _Timer(response_timeout_s, self._on_timeout)
         self._initial_response_timeout_s = initial_response_timeout_s
 
         self._progress_callback = progress_callback
+        self._start_time: Optional[float] = None
+        self._done_callbacks: List[Callable[['Transfer'], Any]] = []
 
     async def begin(self) -> None:
         """Sends the initial chunk of the transfer."""
+        self._start_time = time.monotonic()
         self._send_chunk(self._initial_chunk())
         self._response_timer.start(self._initial_response_timeout_s)
 
+    def add_done_callback(self, callback: Callable[['Transfer'], Any]) -> None:
+        """Adds a function to call when the transfer finishes.
+
+        Callbacks may be invoked from any thread. Add them before starting the
+        transfer.
+        """
+        self._done_callbacks.append(callback)
+
+    def cancel(self) -> None:
+        """Terminates the transfer and notifies the server."""
+        if not self.done.is_set():
+            self._send_error(Status.CANCELLED)
+
     @property
     @abc.abstractmethod
     def data(self) -> bytes:
@@ -122,6 +250,10 @@ class Transfer(abc.ABC):
     def _initial_chunk(self) -> Chunk:
         """Returns the initial chunk to notify the sever of the transfer."""
 
+    @abc.abstractmethod
+    def _size_bytes(self) -> int:
+        """Returns the size of the transferred data."""
+
     async def handle_chunk(self, chunk: Chunk) -> None:
         """Processes an incoming chunk from the server.
 
@@ -165,6 +297,7 @@ class Transfer(abc.ABC):
         _LOG.debug('Received no responses for %.3fs; retrying %d/%d',
                    self._response_timer.timeout_s, self._retries,
                    self._max_retries)
+        self._retransmits += 1
         self._retry_after_timeout()
         self._response_timer.start()
 
@@ -174,7 +307,7 @@ class Transfer(abc.ABC):
         self.status = status
 
         if status.ok():
-            total_size = len(self.data)
+            total_size = self._size_bytes()
             self._update_progress(total_size, total_size, total_size)
 
         if not skip_callback:
@@ -183,12 +316,22 @@ class Transfer(abc.ABC):
         # Set done last so that the transfer has been fully cleaned up.
         self.done.set()
 
+        for callback in self._done_callbacks:
+            callback(self)
+
     def _update_progress(self, bytes_sent: int, bytes_confirmed_received: int,
                          total_size_bytes: Optional[int]) -> None:
         """Invokes the provided progress callback, if any, with the progress."""
 
+        bytes_per_second: Optional[float] = None
+        if self._start_time is not None:
+            elapsed_s = time.monotonic() - self._start_time
+            if elapsed_s > 0:
+                bytes_per_second = bytes_confirmed_received / elapsed_s
+
         stats = ProgressStats(bytes_sent, bytes_confirmed_received,
-                              total_size_bytes)
+                              total_size_bytes, bytes_per_second,
+                              self._retransmits)
         _LOG.debug('Transfer %d progress: %s', self.id, stats)
 
         if self._progress_callback:
@@ -204,11 +347,17 @@ class Transfer(abc.ABC):
 
 
 class WriteTransfer(Transfer):
-    """A client -> server write transfer."""
+    """A client -> server write transfer.
+
+    The data may be a bytes object, a readable binary file, or an async iterable
+    of byte strings. Files and async iterables are read as the server requests
+    data, so only about one transfer window of data is held in memory. Async
+    iterables are iterated in the transfer manager's event loop.
+    """
     def __init__(
         self,
         session_id: int,
-        data: bytes,
+        data: WriteSource,
         send_chunk: Callable[[Chunk], None],
         end_transfer: Callable[[Transfer], None],
         response_timeout_s: float,
@@ -219,7 +368,13 @@ class WriteTransfer(Transfer):
         super().__init__(session_id, send_chunk, end_transfer,
                          response_timeout_s, initial_response_timeout_s,
                          max_retries, progress_callback)
-        self._data = data
+        self._write_data: _WriteData
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self._data = bytes(data)
+            self._write_data = _WriteData(self._data)
+        else:
+            self._data = b''
+            self._write_data = _StreamWriteData(data)
 
         # Guard this class with a lock since a transfer parameters update might
         # arrive while responding to a prior update.
@@ -236,8 +391,13 @@ class WriteTransfer(Transfer):
 
     @property
     def data(self) -> bytes:
+        """Returns the data to write; empty if it is read from a stream."""
         return self._data
 
+    def _size_bytes(self) -> int:
+        size = self._write_data.size
+        return self._offset if size is None else size
+
     def _initial_chunk(self) -> Chunk:
         # TODO(frolv): session_id should not be set here, but assigned by the
         # server during an initial handshake.
@@ -257,14 +417,15 @@ class WriteTransfer(Transfer):
             self._window_id += 1
             window_id = self._window_id
 
-            if not self._handle_parameters_update(chunk):
+            if not await self._handle_parameters_update(chunk):
                 return
 
             bytes_acknowledged = chunk.offset
 
         while True:
-            if self._chunk_delay_us:
-                await asyncio.sleep(self._chunk_delay_us / 1e6)
+            # Sleep between chunks, even without a delay, so that chunks from
+            # concurrent transfers are interleaved.
+            await asyncio.sleep((self._chunk_delay_us or 0) / 1e6)
 
             async with self._lock:
                 if self.done.is_set():
@@ -281,14 +442,14 @@ class WriteTransfer(Transfer):
             self._send_chunk(write_chunk)
 
             self._update_progress(self._offset, bytes_acknowledged,
-                                  len(self.data))
+                                  self._write_data.size)
 
             if sent_requested_bytes:
                 break
 
         self._last_chunk = write_chunk
 
-    def _handle_parameters_update(self, chunk: Chunk) -> bool:
+    async def _handle_parameters_update(self, chunk: Chunk) -> bool:
         """Updates transfer state based on a transfer parameters update."""
 
         retransmit = True
@@ -296,11 +457,31 @@ class WriteTransfer(Transfer):
             retransmit = (chunk.type == Chunk.Type.PARAMETERS_RETRANSMIT
                           or chunk.type == Chunk.Type.TRANSFER_START)
 
-        if chunk.offset > len(self.data):
+        # The server has received all data before its offset, so it does not
+        # need to be kept. Prepare the data for the window, plus one byte to
+        # find out if the window reaches the end of the data.
+        if retransmit:
+            window_start = chunk.offset
+            window_end = chunk.offset + chunk.pending_bytes
+        else:
+            window_start = self._offset
+            window_end = chunk.window_end_offset
+
+        try:
+            self._write_data.discard(chunk.offset)
+            await self._write_data.fill(window_start, window_end + 1)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.error('Transfer %d: failed to read data at offset %d: %s',
+                       self.id, window_start, err)
+            self._send_error(Status.DATA_LOSS)
+            return False
+
+        size = self._write_data.size
+        if size is not None and chunk.offset > size:
             # Bad offset; terminate the transfer.
             _LOG.error(
                 'Transfer %d: server requested invalid offset %d (size %d)',
-                self.id, chunk.offset, len(self.data))
+                self.id, chunk.offset, size)
 
             self._send_error(Status.OUT_OF_RANGE)
             return False
@@ -318,21 +499,22 @@ class WriteTransfer(Transfer):
             if chunk.offset < self._offset:
                 _LOG.debug('Write transfer %d rolling back: offset %d from %d',
                            self.id, chunk.offset, self._offset)
+                self._retransmits += 1
 
             self._offset = chunk.offset
 
             # Retransmit is the default behavior for older versions of the
             # transfer protocol. The window_end_offset field is not guaranteed
             # to be set in these version, so it must be calculated.
-            max_bytes_to_send = min(chunk.pending_bytes,
-                                    len(self.data) - self._offset)
-            self._window_end_offset = self._offset + max_bytes_to_send
+            self._window_end_offset = window_end
         else:
             assert chunk.type == Chunk.Type.PARAMETERS_CONTINUE
 
             # Extend the window to the new end offset specified by the server.
-            self._window_end_offset = min(chunk.window_end_offset,
-                                          len(self.data))
+            self._window_end_offset = window_end
+
+        if size is not None:
+            self._window_end_offset = min(self._window_end_offset, size)
 
         if chunk.HasField('max_chunk_size_bytes'):
             self._max_chunk_size = chunk.max_chunk_size_bytes
@@ -353,10 +535,11 @@ class WriteTransfer(Transfer):
         max_bytes_in_chunk = min(self._max_chunk_size,
                                  self._window_end_offset - self._offset)
 
-        chunk.data = self.data[self._offset:self._offset + max_bytes_in_chunk]
+        chunk.data = self._write_data.get(self._offset, max_bytes_in_chunk)
 
         # Mark the final chunk of the transfer.
-        if len(self.data) - self._offset <= max_bytes_in_chunk:
+        size = self._write_data.size
+        if size is not None and size - self._offset <= max_bytes_in_chunk:
             chunk.remaining_bytes = 0
 
         return chunk
@@ -368,6 +551,16 @@ class ReadTransfer(Transfer):
     Although Python can effectively handle an unlimited transfer window, this
     client sets a conservative window and chunk size to avoid overloading the
     device. These are configurable in the constructor.
+
+    If a sink is provided, received data is written to it as it arrives instead
+    of being stored in the transfer.
+
+    With an adaptive window, max_bytes_to_receive is only the initial window
+    size. The window doubles each time a full window of data arrives in order,
+    up to max_window_size_bytes. When data is lost, the window is halved and
+    from then on grows by one chunk per window. A timeout shrinks the window to
+    a single chunk. If the server sends smaller chunks than requested, the
+    chunk size is reduced to match.
     """
 
     # The fractional position within a window at which a receive transfer should
@@ -379,6 +572,9 @@ class ReadTransfer(Transfer):
     # third of the window, and so on.
     EXTEND_WINDOW_DIVISOR = 2
 
+    # Default largest window size for adaptive windows.
+    DEFAULT_MAX_WINDOW_SIZE_BYTES = 1024 * 1024
+
     def __init__(  # pylint: disable=too-many-arguments
             self,
             session_id: int,
@@ -390,14 +586,29 @@ class ReadTransfer(Transfer):
             max_bytes_to_receive: int = 8192,
             max_chunk_size: int = 1024,
             chunk_delay_us: int = None,
-            progress_callback: ProgressCallback = None):
+            progress_callback: ProgressCallback = None,
+            sink: Optional[BinaryIO] = None,
+            adaptive_window: bool = False,
+            max_window_size_bytes: int = DEFAULT_MAX_WINDOW_SIZE_BYTES):
         super().__init__(session_id, send_chunk, end_transfer,
                          response_timeout_s, initial_response_timeout_s,
                          max_retries, progress_callback)
+        self._sink = sink
         self._max_bytes_to_receive = max_bytes_to_receive
         self._max_chunk_size = max_chunk_size
         self._chunk_delay_us = chunk_delay_us
 
+        # Adaptive window state. The window grows exponentially up to the
+        # threshold, and linearly after it.
+        self._adaptive_window = adaptive_window
+        self._max_window_size = max(max_window_size_bytes,
+                                    max_bytes_to_receive)
+        self._window_growth_threshold = self._max_window_size
+        self._bytes_received_in_order = 0
+        self._largest_chunk_size = 0
+        # Offset of the last retransmit request sent for out-of-order data.
+        self._retransmit_offset: Optional[int] = None
+
         self._remaining_transfer_size: Optional[int] = None
         self._data = bytearray()
         self._offset = 0
@@ -406,9 +617,15 @@ class ReadTransfer(Transfer):
 
     @property
     def data(self) -> bytes:
-        """Returns an immutable copy of the data that has been read."""
+        """Returns an immutable copy of the data that has been read.
+
+        The data is empty if it was written to a sink.
+        """
         return bytes(self._data)
 
+    def _size_bytes(self) -> int:
+        return self._offset
+
     def _initial_chunk(self) -> Chunk:
         return self._transfer_parameters(Chunk.Type.TRANSFER_START)
 
@@ -420,17 +637,46 @@ class ReadTransfer(Transfer):
         """
 
         if chunk.offset != self._offset:
+            if self._adaptive_window:
+                # The rest of the chunks in flight are out of order too, so
+                # only back off and request a retransmit once.
+                if self._retransmit_offset == self._offset:
+                    return
+
+                self._retransmit_offset = self._offset
+                self._shrink_window(to_one_chunk=False)
+
             # Initially, the transfer service only supports in-order transfers.
             # If data is received out of order, request that the server
             # retransmit from the previous offset.
+            self._retransmits += 1
             self._send_chunk(
                 self._transfer_parameters(Chunk.Type.PARAMETERS_RETRANSMIT))
             return
 
-        self._data += chunk.data
+        if self._sink is None:
+            self._data += chunk.data
+        else:
+            try:
+                self._sink.write(chunk.data)
+            except Exception as err:  # pylint: disable=broad-except
+                _LOG.error(
+                    'Transfer %d: failed to write data at offset %d: %s',
+                    self.id, self._offset, err)
+                self._send_error(Status.DATA_LOSS)
+                return
+
         self._pending_bytes -= len(chunk.data)
         self._offset += len(chunk.data)
 
+        if self._adaptive_window:
+            self._retransmit_offset = None
+            self._largest_chunk_size = max(self._largest_chunk_size,
+                                           len(chunk.data))
+            self._bytes_received_in_order += len(chunk.data)
+            if self._bytes_received_in_order >= self._max_bytes_to_receive:
+                self._grow_window()
+
         if chunk.HasField('remaining_bytes'):
             if chunk.remaining_bytes == 0:
                 # No more data to read. Acknowledge receipt and finish.
@@ -489,9 +735,42 @@ class ReadTransfer(Transfer):
                 self._transfer_parameters(Chunk.Type.PARAMETERS_CONTINUE))
 
     def _retry_after_timeout(self) -> None:
+        if self._adaptive_window:
+            self._shrink_window(to_one_chunk=True)
+
         self._send_chunk(
             self._transfer_parameters(Chunk.Type.PARAMETERS_RETRANSMIT))
 
+    def _grow_window(self) -> None:
+        """Grows the window after a full window of data arrived in order."""
+        self._bytes_received_in_order = 0
+
+        # The server may send smaller chunks than requested. Match its chunk
+        # size so that windows don't end with a partial chunk.
+        if 0 < self._largest_chunk_size < min(self._max_chunk_size,
+                                              self._max_bytes_to_receive):
+            self._max_chunk_size = self._largest_chunk_size
+
+        if self._max_bytes_to_receive < self._window_growth_threshold:
+            self._max_bytes_to_receive *= 2
+        else:
+            self._max_bytes_to_receive += self._max_chunk_size
+
+        self._max_bytes_to_receive = min(self._max_bytes_to_receive,
+                                         self._max_window_size)
+        _LOG.debug('Transfer %d: window grew to %d B', self.id,
+                   self._max_bytes_to_receive)
+
+    def _shrink_window(self, to_one_chunk: bool) -> None:
+        """Shrinks the window after data was lost or a timeout occurred."""
+        self._bytes_received_in_order = 0
+        self._window_growth_threshold = max(self._max_bytes_to_receive // 2,
+                                            self._max_chunk_size)
+        self._max_bytes_to_receive = (self._max_chunk_size if to_one_chunk else
+                                      self._window_growth_threshold)
+        _LOG.debug('Transfer %d: window shrank to %d B', self.id,
+                   self._max_bytes_to_receive)
+
     def _transfer_parameters(self, chunk_type: Any) -> Chunk:
         """Sends an updated transfer parameters chunk to the server."""
 
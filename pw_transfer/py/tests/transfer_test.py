@@ -14,16 +14,21 @@
 # the License.
 """Tests for the transfer service client."""
 
+import asyncio
 import enum
+import io
 import math
+import os
+import threading
 import unittest
-from typing import Iterable, List
+from typing import AsyncIterator, Callable, Iterable, List
 
 from pw_status import Status
 from pw_rpc import callback_client, client, ids, packets
 from pw_rpc.internal import packet_pb2
 
 import pw_transfer
+from pw_transfer.transfer import ReadTransfer
 from pw_transfer.transfer_pb2 import Chunk
 
 _TRANSFER_SERVICE_ID = ids.calculate('pw.transfer.Transfer')
@@ -47,23 +52,24 @@ class TransferManagerTest(unittest.TestCase):
 
         self._sent_chunks: List[Chunk] = []
         self._packets_to_send: List[List[bytes]] = []
+        self._chunk_sent = threading.Condition()
+
+    @staticmethod
+    def _server_packet(method: _Method, response: Chunk) -> bytes:
+        return packet_pb2.RpcPacket(
+            type=packet_pb2.PacketType.SERVER_STREAM,
+            channel_id=1,
+            service_id=_TRANSFER_SERVICE_ID,
+            method_id=method.value,
+            status=Status.OK.value,
+            payload=response.SerializeToString()).SerializeToString()
 
     def _enqueue_server_responses(
             self, method: _Method,
             responses: Iterable[Iterable[Chunk]]) -> None:
         for group in responses:
-            serialized_group = []
-            for response in group:
-                serialized_group.append(
-                    packet_pb2.RpcPacket(
-                        type=packet_pb2.PacketType.SERVER_STREAM,
-                        channel_id=1,
-                        service_id=_TRANSFER_SERVICE_ID,
-                        method_id=method.value,
-                        status=Status.OK.value,
-                        payload=response.SerializeToString()).
-                    SerializeToString())
-            self._packets_to_send.append(serialized_group)
+            self._packets_to_send.append(
+                [self._server_packet(method, response) for response in group])
 
     def _enqueue_server_error(self, method: _Method, error: Status) -> None:
         self._packets_to_send.append([
@@ -81,7 +87,9 @@ class TransferManagerTest(unittest.TestCase):
 
         chunk = Chunk()
         chunk.MergeFromString(packet.payload)
-        self._sent_chunks.append(chunk)
+        with self._chunk_sent:
+            self._sent_chunks.append(chunk)
+            self._chunk_sent.notify_all()
 
         if self._packets_to_send:
             responses = self._packets_to_send.pop(0)
@@ -110,6 +118,14 @@ class TransferManagerTest(unittest.TestCase):
         self.assertTrue(self._sent_chunks[-1].HasField('status'))
         self.assertEqual(self._sent_chunks[-1].status, 0)
 
+    def test_close_stops_transfer_thread(self) -> None:
+        manager = pw_transfer.Manager(self._service)
+        manager.close()
+
+        # pylint: disable=protected-access
+        self.assertFalse(manager._thread.is_alive())
+        # pylint: enable=protected-access
+
     def test_read_transfer_multichunk(self) -> None:
         manager = pw_transfer.Manager(
             self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
@@ -152,6 +168,30 @@ class TransferManagerTest(unittest.TestCase):
             pw_transfer.ProgressStats(6, 6, 6),
         ])
 
+    def test_read_transfer_to_sink(self) -> None:
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_server_responses(
+            _Method.READ,
+            ((
+                Chunk(session_id=3, offset=0, data=b'abc', remaining_bytes=3),
+                Chunk(session_id=3, offset=3, data=b'def', remaining_bytes=0),
+            ), ),
+        )
+
+        progress: List[pw_transfer.ProgressStats] = []
+        sink = io.BytesIO()
+
+        manager.read_to(3, sink, progress.append)
+        self.assertEqual(sink.getvalue(), b'abcdef')
+        self.assertEqual(len(self._sent_chunks), 2)
+        self.assertEqual(self._sent_chunks[-1].status, 0)
+        self.assertEqual(progress, [
+            pw_transfer.ProgressStats(3, 3, 6),
+            pw_transfer.ProgressStats(6, 6, 6),
+        ])
+
     def test_read_transfer_retry_bad_offset(self) -> None:
         """Server responds with an unexpected offset in a read transfer."""
         manager = pw_transfer.Manager(
@@ -180,13 +220,16 @@ class TransferManagerTest(unittest.TestCase):
                 ),
             ))
 
-        data = manager.read(3)
+        progress: List[pw_transfer.ProgressStats] = []
+
+        data = manager.read(3, progress.append)
         self.assertEqual(data, b'123456789')
 
         # Two transfer parameter requests should have been sent.
         self.assertEqual(len(self._sent_chunks), 3)
         self.assertTrue(self._sent_chunks[-1].HasField('status'))
         self.assertEqual(self._sent_chunks[-1].status, 0)
+        self.assertEqual(progress[-1].retransmits, 1)
 
     def test_read_transfer_retry_timeout(self) -> None:
         """Server doesn't respond to read transfer parameters."""
@@ -201,13 +244,34 @@ class TransferManagerTest(unittest.TestCase):
                        remaining_bytes=0), ),
             ))
 
-        data = manager.read(3)
+        progress: List[pw_transfer.ProgressStats] = []
+
+        data = manager.read(3, progress.append)
         self.assertEqual(data, b'xyz')
 
         # Two transfer parameter requests should have been sent.
         self.assertEqual(len(self._sent_chunks), 3)
         self.assertTrue(self._sent_chunks[-1].HasField('status'))
         self.assertEqual(self._sent_chunks[-1].status, 0)
+        self.assertEqual(progress[-1].retransmits, 1)
+
+    def test_read_transfer_window_size(self) -> None:
+        manager = pw_transfer.Manager(
+            self._service,
+            default_response_timeout_s=DEFAULT_TIMEOUT_S,
+            read_window_size_bytes=64,
+            read_chunk_size_bytes=16)
+
+        self._enqueue_server_responses(
+            _Method.READ,
+            ((Chunk(session_id=3, offset=0, data=b'abc',
+                    remaining_bytes=0), ), ),
+        )
+
+        self.assertEqual(manager.read(3), b'abc')
+        self.assertEqual(self._sent_chunks[0].pending_bytes, 64)
+        self.assertEqual(self._sent_chunks[0].window_end_offset, 64)
+        self.assertEqual(self._sent_chunks[0].max_chunk_size_bytes, 16)
 
     def test_read_transfer_timeout(self) -> None:
         manager = pw_transfer.Manager(
@@ -351,11 +415,7 @@ class TransferManagerTest(unittest.TestCase):
             pw_transfer.ProgressStats(13, 13, 13)
         ])
 
-    def test_write_transfer_rewind(self) -> None:
-        """Write transfer in which the server re-requests an earlier offset."""
-        manager = pw_transfer.Manager(
-            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
-
+    def _enqueue_rewind_responses(self) -> None:
         self._enqueue_server_responses(
             _Method.WRITE,
             (
@@ -383,12 +443,124 @@ class TransferManagerTest(unittest.TestCase):
             ),
         )
 
-        manager.write(4, b'pigweed data transfer')
+    def test_write_transfer_rewind(self) -> None:
+        """Write transfer in which the server re-requests an earlier offset."""
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_rewind_responses()
+
+        progress: List[pw_transfer.ProgressStats] = []
+
+        manager.write(4, b'pigweed data transfer', progress.append)
+        self.assertEqual(len(self._sent_chunks), 5)
+        self.assertEqual(self._sent_chunks[1].data, b'pigweed ')
+        self.assertEqual(self._sent_chunks[2].data, b'data tra')
+        self.assertEqual(self._sent_chunks[3].data, b'eed data')
+        self.assertEqual(self._sent_chunks[4].data, b' transfer')
+        self.assertEqual(progress[-1].retransmits, 1)
+
+    def test_write_transfer_from_file(self) -> None:
+        """Write transfer from a seekable file, which is reread on rewind."""
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_rewind_responses()
+
+        progress: List[pw_transfer.ProgressStats] = []
+        source = io.BytesIO(b'--pigweed data transfer')
+        source.seek(2)  # Transfers start from the current position.
+
+        manager.write_from(4, source, progress.append)
         self.assertEqual(len(self._sent_chunks), 5)
         self.assertEqual(self._sent_chunks[1].data, b'pigweed ')
         self.assertEqual(self._sent_chunks[2].data, b'data tra')
         self.assertEqual(self._sent_chunks[3].data, b'eed data')
         self.assertEqual(self._sent_chunks[4].data, b' transfer')
+        self.assertEqual(self._sent_chunks[4].remaining_bytes, 0)
+        self.assertEqual(progress[0], pw_transfer.ProgressStats(8, 0, 21))
+
+    def test_write_transfer_from_pipe(self) -> None:
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_server_responses(
+            _Method.WRITE,
+            (
+                (Chunk(session_id=4,
+                       offset=0,
+                       pending_bytes=8,
+                       max_chunk_size_bytes=8), ),
+                (Chunk(session_id=4,
+                       offset=8,
+                       pending_bytes=8,
+                       max_chunk_size_bytes=8), ),
+                (Chunk(session_id=4, status=Status.OK.value), ),
+            ),
+        )
+
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b'data to write')
+        os.close(write_fd)
+
+        with os.fdopen(read_fd, 'rb') as source:
+            manager.write_from(4, source)
+
+        self.assertEqual(len(self._sent_chunks), 3)
+        self.assertEqual(self._sent_chunks[1].data, b'data to ')
+        self.assertFalse(self._sent_chunks[1].HasField('remaining_bytes'))
+        self.assertEqual(self._sent_chunks[2].data, b'write')
+        self.assertEqual(self._sent_chunks[2].remaining_bytes, 0)
+
+    def test_write_transfer_from_async_iterable(self) -> None:
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_server_responses(
+            _Method.WRITE,
+            (
+                (Chunk(session_id=4,
+                       offset=0,
+                       pending_bytes=8,
+                       max_chunk_size_bytes=8), ),
+                (Chunk(session_id=4,
+                       offset=8,
+                       pending_bytes=8,
+                       max_chunk_size_bytes=8), ),
+                (Chunk(session_id=4, status=Status.OK.value), ),
+            ),
+        )
+
+        async def source() -> AsyncIterator[bytes]:
+            for data in (b'data ', b'to ', b'write'):
+                yield data
+
+        progress: List[pw_transfer.ProgressStats] = []
+
+        manager.write_from(4, source(), progress.append)
+        self.assertEqual(len(self._sent_chunks), 3)
+        self.assertEqual(self._received_data(), b'data to write')
+        self.assertEqual(self._sent_chunks[2].remaining_bytes, 0)
+        self.assertEqual(progress, [
+            pw_transfer.ProgressStats(8, 0, None),
+            pw_transfer.ProgressStats(13, 8, 13),
+            pw_transfer.ProgressStats(13, 13, 13)
+        ])
+
+    def test_write_transfer_from_async_iterable_rewind(self) -> None:
+        """Data acknowledged by the server is not kept for async iterables."""
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_rewind_responses()
+
+        async def source() -> AsyncIterator[bytes]:
+            yield b'pigweed data transfer'
+
+        with self.assertRaises(pw_transfer.Error) as context:
+            manager.write_from(4, source())
+
+        self.assertEqual(context.exception.status, Status.DATA_LOSS)
 
     def test_write_transfer_bad_offset(self) -> None:
         manager = pw_transfer.Manager(
@@ -527,6 +699,295 @@ class TransferManagerTest(unittest.TestCase):
         self.assertEqual(exception.session_id, 23)
         self.assertEqual(exception.status, Status.INTERNAL)
 
+    async def _wait_for_chunks(self, condition: Callable[[], bool]) -> None:
+        """Waits until the chunks sent by the transfer thread meet a condition.
+
+        The wait runs in an executor so that the calling event loop keeps
+        running the tasks that start and cancel transfers.
+        """
+        def wait() -> bool:
+            with self._chunk_sent:
+                return self._chunk_sent.wait_for(condition, timeout=5)
+
+        loop = asyncio.get_running_loop()
+        self.assertTrue(await loop.run_in_executor(None, wait),
+                        'Timed out waiting for the transfer thread')
+
+    def _started_sessions(self) -> List[int]:
+        return [
+            chunk.session_id for chunk in self._sent_chunks
+            if chunk.type == Chunk.Type.TRANSFER_START
+        ]
+
+    def _finish_read(self, session_id: int, data: bytes) -> None:
+        self._client.process_packet(
+            self._server_packet(
+                _Method.READ,
+                Chunk(session_id=session_id,
+                      offset=0,
+                      data=data,
+                      remaining_bytes=0)))
+
+    def test_read_async_concurrent(self) -> None:
+        manager = pw_transfer.Manager(self._service,
+                                      default_response_timeout_s=5,
+                                      initial_response_timeout_s=5)
+
+        async def read_all() -> List[bytes]:
+            reads = asyncio.gather(manager.read_async(1),
+                                   manager.read_async(2))
+
+            # Both transfers start before either finishes.
+            await self._wait_for_chunks(
+                lambda: sorted(self._started_sessions()) == [1, 2])
+            self._finish_read(2, b'two')
+            self._finish_read(1, b'one')
+            return await reads
+
+        self.assertEqual(asyncio.run(read_all()), [b'one', b'two'])
+
+    def test_read_async_priority(self) -> None:
+        manager = pw_transfer.Manager(self._service,
+                                      default_response_timeout_s=5,
+                                      initial_response_timeout_s=5,
+                                      max_concurrent_transfers=1)
+
+        # The first transfer waits for a response; the rest finish right away.
+        self._enqueue_server_responses(
+            _Method.READ,
+            (
+                (),
+                (Chunk(session_id=3, offset=0, data=b'3',
+                       remaining_bytes=0), ),
+                (),  # Completion chunk
+                (Chunk(session_id=2, offset=0, data=b'2',
+                       remaining_bytes=0), ),
+            ))
+
+        async def read_all() -> List[bytes]:
+            first = asyncio.ensure_future(manager.read_async(1))
+            await self._wait_for_chunks(
+                lambda: self._started_sessions() == [1])
+
+            # Yield once so both reads are queued before the first finishes.
+            others = asyncio.gather(manager.read_async(2, priority=0),
+                                    manager.read_async(3, priority=5))
+            await asyncio.sleep(0)
+            self.assertEqual(self._started_sessions(), [1])
+
+            self._finish_read(1, b'1')
+            return [await first, *await others]
+
+        self.assertEqual(asyncio.run(read_all()), [b'1', b'2', b'3'])
+        self.assertEqual(self._started_sessions(), [1, 3, 2])
+
+    def test_read_async_same_session_runs_sequentially(self) -> None:
+        manager = pw_transfer.Manager(self._service,
+                                      default_response_timeout_s=5,
+                                      initial_response_timeout_s=5)
+
+        async def read_all() -> List[bytes]:
+            reads = asyncio.gather(manager.read_async(1),
+                                   manager.read_async(1))
+            await self._wait_for_chunks(
+                lambda: self._started_sessions() == [1])
+
+            self._finish_read(1, b'first')
+            await self._wait_for_chunks(
+                lambda: self._started_sessions() == [1, 1])
+
+            self._finish_read(1, b'second')
+            return await reads
+
+        self.assertEqual(asyncio.run(read_all()), [b'first', b'second'])
+
+    def test_read_async_cancel(self) -> None:
+        manager = pw_transfer.Manager(self._service,
+                                      default_response_timeout_s=5,
+                                      initial_response_timeout_s=5,
+                                      max_concurrent_transfers=1)
+
+        async def cancel_reads() -> None:
+            active = asyncio.ensure_future(manager.read_async(1))
+            await self._wait_for_chunks(
+                lambda: self._started_sessions() == [1])
+
+            # Yield once so the second read is queued before it is cancelled.
+            queued = asyncio.ensure_future(manager.read_async(2))
+            await asyncio.sleep(0)
+
+            queued.cancel()
+            active.cancel()
+            await asyncio.gather(active, queued, return_exceptions=True)
+            await self._wait_for_chunks(
+                lambda: self._sent_chunks[-1].HasField('status'))
+
+        asyncio.run(cancel_reads())
+
+        # The queued transfer never started; the active one was terminated.
+        self.assertEqual(self._started_sessions(), [1])
+        self.assertEqual(self._sent_chunks[-1].session_id, 1)
+        self.assertEqual(self._sent_chunks[-1].status, Status.CANCELLED.value)
+
+    def test_write_async_interleaves_chunks(self) -> None:
+        manager = pw_transfer.Manager(self._service,
+                                      default_response_timeout_s=5,
+                                      initial_response_timeout_s=5)
+
+        # Send the parameters for both transfers at once, after both start, so
+        # neither transfer can send its whole window before the other begins.
+        self._enqueue_server_responses(_Method.WRITE, (
+            (),
+            [
+                Chunk(session_id=session_id,
+                      offset=0,
+                      pending_bytes=64,
+                      max_chunk_size_bytes=2) for session_id in (1, 2)
+            ],
+        ))
+
+        def data_chunks() -> List[int]:
+            return [
+                chunk.session_id for chunk in self._sent_chunks
+                if chunk.type == Chunk.Type.TRANSFER_DATA
+            ]
+
+        async def write_all() -> None:
+            writes = asyncio.gather(manager.write_async(1, b'a' * 64),
+                                    manager.write_async(2, b'b' * 64))
+            await self._wait_for_chunks(lambda: len(data_chunks()) == 64)
+
+            for session_id in (1, 2):
+                self._client.process_packet(
+                    self._server_packet(
+                        _Method.WRITE,
+                        Chunk(session_id=session_id, status=Status.OK.value)))
+            await writes
+
+        asyncio.run(write_all())
+
+        # Once both transfers are sending, their chunks alternate rather than
+        # one transfer sending its whole window first.
+        sessions = data_chunks()
+        self.assertEqual(sorted(sessions), [1] * 32 + [2] * 32)
+        self.assertIn(2, sessions[:32])
+        self.assertIn(1, sessions[32:])
+
+    def test_write_async_error(self) -> None:
+        manager = pw_transfer.Manager(
+            self._service, default_response_timeout_s=DEFAULT_TIMEOUT_S)
+
+        self._enqueue_server_responses(
+            _Method.WRITE,
+            ((Chunk(session_id=21, status=Status.UNAVAILABLE.value), ), ),
+        )
+
+        with self.assertRaises(pw_transfer.Error) as context:
+            asyncio.run(manager.write_async(21, b'no write'))
+
+        self.assertEqual(context.exception.status, Status.UNAVAILABLE)
+
+
+class ReadTransferAdaptiveWindowTest(unittest.TestCase):
+    """Tests adaptive windows in read transfers."""
+    def setUp(self) -> None:
+        self._sent_chunks: List[Chunk] = []
+
+    def _transfer(self, **kwargs) -> ReadTransfer:
+        args = dict(session_id=3,
+                    send_chunk=self._sent_chunks.append,
+                    end_transfer=lambda _: None,
+                    response_timeout_s=60,
+                    initial_response_timeout_s=60,
+                    max_retries=3,
+                    max_bytes_to_receive=8,
+                    max_chunk_size=4,
+                    adaptive_window=True,
+                    max_window_size_bytes=32)
+        args.update(kwargs)
+        return ReadTransfer(**args)  # type: ignore[arg-type]
+
+    @staticmethod
+    def _data(offset: int, size: int = 4) -> Chunk:
+        return Chunk(session_id=3,
+                     offset=offset,
+                     data=b'x' * size,
+                     type=Chunk.Type.TRANSFER_DATA)
+
+    def test_grows_exponentially_then_backs_off(self) -> None:
+        async def run() -> None:
+            transfer = self._transfer()
+            await transfer.begin()
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 8)
+
+            # Each full window received in order doubles the window.
+            for offset in range(0, 24, 4):
+                await transfer.handle_chunk(self._data(offset))
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 32)
+
+            # Out of order data halves the window. Only one retransmit is
+            # requested for the chunks that were already in flight.
+            sent = len(self._sent_chunks)
+            await transfer.handle_chunk(self._data(28))
+            await transfer.handle_chunk(self._data(32))
+            self.assertEqual(len(self._sent_chunks), sent + 1)
+            self.assertEqual(self._sent_chunks[-1].type,
+                             Chunk.Type.PARAMETERS_RETRANSMIT)
+            self.assertEqual(self._sent_chunks[-1].offset, 24)
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 16)
+
+            # After data loss, the window grows by one chunk per window.
+            for offset in range(24, 40, 4):
+                await transfer.handle_chunk(self._data(offset))
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 20)
+
+            transfer.finish(Status.CANCELLED)
+
+        asyncio.run(run())
+
+    def test_timeout_shrinks_window_to_one_chunk(self) -> None:
+        async def run() -> None:
+            transfer = self._transfer(response_timeout_s=0.01)
+            await transfer.begin()
+            for offset in range(0, 8, 4):
+                await transfer.handle_chunk(self._data(offset))
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 16)
+
+            await asyncio.sleep(0.05)
+            self.assertEqual(self._sent_chunks[-1].type,
+                             Chunk.Type.PARAMETERS_RETRANSMIT)
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 4)
+
+            transfer.finish(Status.CANCELLED)
+
+        asyncio.run(run())
+
+    def test_matches_server_chunk_size(self) -> None:
+        async def run() -> None:
+            transfer = self._transfer()
+            await transfer.begin()
+            self.assertEqual(self._sent_chunks[-1].max_chunk_size_bytes, 4)
+
+            for offset in range(0, 8, 2):
+                await transfer.handle_chunk(self._data(offset, size=2))
+            self.assertEqual(self._sent_chunks[-1].max_chunk_size_bytes, 2)
+
+            transfer.finish(Status.CANCELLED)
+
+        asyncio.run(run())
+
+    def test_fixed_window(self) -> None:
+        async def run() -> None:
+            transfer = self._transfer(adaptive_window=False)
+            await transfer.begin()
+            for offset in range(0, 24, 4):
+                await transfer.handle_chunk(self._data(offset))
+            self.assertEqual(self._sent_chunks[-1].pending_bytes, 8)
+
+            transfer.finish(Status.CANCELLED)
+
+        asyncio.run(run())
+
 
 class ProgressStatsTest(unittest.TestCase):
     def test_received_percent_known_total(self) -> None:
@@ -551,6 +1012,11 @@ class ProgressStatsTest(unittest.TestCase):
         self.assertIn('50', stats)
         self.assertIn('100', stats)
 
+    def test_str_rate(self) -> None:
+        stats = pw_transfer.ProgressStats(75, 50, 100, bytes_per_second=1500)
+        self.assertIn('1500 B/s', str(stats))
+        self.assertEqual(stats, pw_transfer.ProgressStats(75, 50, 100))
+
     def test_str_unknown_total(self) -> None:
         stats = str(pw_transfer.ProgressStats(75, 50, None))
         self.assertIn('75', stats)